@@ -1,9 +1,10 @@
 import os
-from flask import Flask, render_template
+from flask import Flask, render_template, g
 from extensions import db, bcrypt, login_manager, migrate, csrf
 from models import Funcionario, Role, Cargo, Aplicacion
+from utils import rescatar_auditoria_pendiente
 from dotenv import load_dotenv
-from datetime import date
+from datetime import date, timedelta
 import click
 
 # Importar Blueprints
@@ -13,7 +14,8 @@ load_dotenv()
 
 app = Flask(__name__, template_folder='templates', static_folder='static', static_url_path='/static')
 app.secret_key = os.getenv("SECRET_KEY", "inmobiliaria_yeizon")
-app.config["SQLALCHEMY_DATABASE_URI"] = f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+# DATABASE_URL (opcional) reemplaza la conexión armada con DB_*; la usan las pruebas con una BD descartable
+app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL") or f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Inicializar Extensiones
@@ -40,6 +42,27 @@ app.register_blueprint(reportes.bp)
 app.register_blueprint(audit.bp)
 app.register_blueprint(search.bp)
 
+# Tareas diarias en segundo plano (barrido de cuotas vencidas). Activas por
+# defecto; TAREAS_PROGRAMADAS=0 las desactiva (p. ej. si el comando CLI corre
+# desde cron). Arrancan con la primera petición: los comandos CLI no las inician.
+if os.getenv("TAREAS_PROGRAMADAS", "1") == "1":
+    import tareas
+
+    @app.before_request
+    def iniciar_tareas():
+        tareas.iniciar(app)
+
+# Auditoría registrada después del último commit de la petición: se guarda por lotes
+# si la respuesta fue exitosa (ver rescatar_auditoria_pendiente)
+@app.after_request
+def anotar_estado_respuesta(response):
+    g.estado_respuesta = response.status_code
+    return response
+
+@app.teardown_request
+def guardar_auditoria_pendiente(exc):
+    rescatar_auditoria_pendiente(exc, g.get("estado_respuesta"))
+
 # Manejo de Errores
 @app.errorhandler(404)
 def not_found(error): return render_template('errors/404.html'), 404
@@ -297,6 +320,151 @@ def sembrar_datos_command():
         db.session.rollback()
         print(f"X ERROR DURANTE LA CARGA: {e}")
 
+@app.cli.command("recalcular-geometrias")
+def recalcular_geometrias_command():
+    """Recalcula las columnas derivadas de la geometría (simplificaciones por zoom, área, centroide y bbox)."""
+    from models import Fraccionamiento, Lote
+    from geometria import asignar_geometria
+    from sqlalchemy import func
+
+    try:
+        total = 0
+        for modelo in (Fraccionamiento, Lote):
+            for obj in modelo.query.order_by(modelo.id).yield_per(500):
+                asignar_geometria(obj, obj.geojson)
+                total += 1
+            db.session.commit()
+            print(f" [OK] {modelo.__tablename__}")
+        print(f">>> {total} geometrías recalculadas <<<")
+
+        # Control: superficie declarada vs. área del polígono (más de 10% de diferencia)
+        dudosos = Lote.query.filter(Lote.activo == True, Lote.area_m2 != None,
+                                    func.abs(Lote.area_m2 - Lote.metros_cuadrados) > Lote.metros_cuadrados * 0.1).all()
+        for l in dudosos:
+            print(f" [!] Lote {l.numero_lote} Mz {l.manzana} (Fracc ID {l.fraccionamiento_id}): declarado {l.metros_cuadrados} m², polígono {l.area_m2:,.0f} m²")
+    except Exception as e:
+        db.session.rollback()
+        print(f"X ERROR AL RECALCULAR: {e}")
+
+@app.cli.command("importar-lotes")
+@click.argument("fraccionamiento_id", type=int)
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+def importar_lotes_command(fraccionamiento_id, archivo):
+    """Importa los lotes de un archivo GeoJSON (FeatureCollection) a un fraccionamiento."""
+    import json
+    from models import Fraccionamiento
+    from routes.inventario import importar_lotes
+
+    frac = Fraccionamiento.query.get(fraccionamiento_id)
+    if not frac:
+        print(f"X No existe el fraccionamiento {fraccionamiento_id}")
+        return
+    try:
+        with open(archivo, encoding='utf-8') as fh:
+            fc = json.load(fh)
+        cantidad, errores = importar_lotes(frac.id, fc.get('features') or [])
+        if errores:
+            print("X No se importó ningún lote:")
+            for e in errores: print(f"   - {e}")
+            return
+        print(f">>> {cantidad} lotes importados en {frac.nombre} <<<")
+    except Exception as e:
+        db.session.rollback()
+        print(f"X ERROR AL IMPORTAR: {e}")
+
+@app.cli.command("marcar-cuotas-vencidas")
+@click.option("--fecha", default=None, help="Fecha de corte AAAA-MM-DD (por defecto hoy)")
+@click.option("--tam-bloque", default=1000, show_default=True, help="Cuotas por UPDATE")
+def marcar_cuotas_vencidas_command(fecha, tam_bloque):
+    """Marca como 'vencida' las cuotas pendientes con vencimiento anterior a la fecha de corte."""
+    from datetime import datetime
+    import mora
+
+    try:
+        corte = datetime.strptime(fecha, "%Y-%m-%d").date() if fecha else date.today()
+        total = mora.marcar_vencidas(corte, tam_bloque)
+        print(f">>> {total} cuotas marcadas como vencidas (corte {corte.isoformat()}) <<<")
+    except ValueError:
+        print("X Fecha inválida, formato AAAA-MM-DD")
+    except Exception as e:
+        db.session.rollback()
+        print(f"X ERROR AL MARCAR VENCIDAS: {e}")
+
+@app.cli.command("verificar-saldos")
+@click.option("--reparar", is_flag=True, help="Recalcula los saldos de los contratos con diferencias")
+@click.option("--todos", is_flag=True, help="Con --reparar, recalcula todos los contratos")
+def verificar_saldos_command(reparar, todos):
+    """Compara los saldos materializados de cada contrato con sus cuotas y pagos."""
+    import saldos
+
+    try:
+        if reparar and todos:
+            print(f">>> {saldos.reconstruir()} contratos recalculados <<<")
+            return
+        diferencias = saldos.verificar()
+        for contrato_id, campo, guardado, calculado in diferencias[:50]:
+            print(f"   - Contrato {contrato_id}: {campo} guardado={guardado} calculado={calculado}")
+        afectados = sorted({d[0] for d in diferencias})
+        if not afectados:
+            print(">>> Saldos de contratos consistentes <<<")
+        elif reparar:
+            saldos.reconstruir(afectados)
+            print(f">>> {len(afectados)} contratos recalculados <<<")
+        else:
+            print(f"X {len(afectados)} contratos con saldos desactualizados (use --reparar)")
+    except Exception as e:
+        db.session.rollback()
+        print(f"X ERROR AL VERIFICAR SALDOS: {e}")
+
+@app.cli.command("reconstruir-resumenes")
+@click.option("--tabla", type=click.Choice(["cobros", "caja", "gastos", "servicios"]), multiple=True, help="Tablas a reconstruir (por defecto todas)")
+@click.option("--desde", default=None, help="Primer día AAAA-MM-DD (por defecto el más antiguo del detalle)")
+@click.option("--hasta", default=None, help="Último día AAAA-MM-DD (por defecto el más reciente del detalle)")
+def reconstruir_resumenes_command(tabla, desde, hasta):
+    """Recalcula los resúmenes diarios de cobros, caja, gastos y servicios desde el detalle."""
+    import time
+    from datetime import datetime
+    import resumenes
+
+    try:
+        desde = datetime.strptime(desde, "%Y-%m-%d").date() if desde else None
+        hasta = datetime.strptime(hasta, "%Y-%m-%d").date() if hasta else None
+        for nombre in tabla or resumenes.TABLAS:
+            inicio = time.perf_counter()
+            filas = resumenes.reconstruir(nombre, desde, hasta)
+            print(f">>> Resumen de {nombre}: {filas} filas ({time.perf_counter() - inicio:.2f}s) <<<")
+    except ValueError:
+        print("X Fecha inválida, formato AAAA-MM-DD")
+    except Exception as e:
+        db.session.rollback()
+        print(f"X ERROR AL RECONSTRUIR RESÚMENES: {e}")
+
+@app.cli.command("generar-liquidaciones")
+@click.option("--mes", default=None, help="Mes a liquidar AAAA-MM (por defecto el mes anterior)")
+@click.option("--destino", default="liquidaciones", show_default=True, type=click.Path(file_okay=False), help="Carpeta de salida")
+def generar_liquidaciones_command(mes, destino):
+    """Genera la liquidación del mes de cada fraccionamiento (un PDF por propietario) y el resumen consolidado."""
+    import time
+    import liquidaciones
+
+    try:
+        if mes:
+            anio, nro_mes = (int(x) for x in mes.split("-"))
+        else:
+            anterior = date.today().replace(day=1) - timedelta(days=1)
+            anio, nro_mes = anterior.year, anterior.month
+        inicio = time.perf_counter()
+        archivos = liquidaciones.generar_mes(anio, nro_mes)
+        os.makedirs(destino, exist_ok=True)
+        for nombre, contenido in archivos:
+            with open(os.path.join(destino, nombre), "wb") as f: f.write(contenido)
+        print(f">>> {len(archivos) - 1} liquidaciones y resumen de {anio}-{nro_mes:02d} en {destino} ({time.perf_counter() - inicio:.2f}s) <<<")
+    except ValueError:
+        print("X Mes inválido, formato AAAA-MM")
+    except Exception as e:
+        db.session.rollback()
+        print(f"X ERROR AL GENERAR LIQUIDACIONES: {e}")
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
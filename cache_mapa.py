@@ -0,0 +1,115 @@
+from flask import request, Response, stream_with_context
+import brotli
+import gzip
+import hashlib
+import json
+import threading
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Fraccionamiento, LoteCambio
+
+# Caché en memoria (por proceso) de las FeatureCollection públicas del mapa.
+# La versión de cada colección se lee de la BD en cada petición (ver version()),
+# así un cambio confirmado por cualquier worker deja obsoleta la caché de todos.
+# El ETag se deriva de esa versión: es el mismo en todos los workers y se envía
+# también cuando la respuesta se transmite sin caché.
+_lock = threading.Lock()
+_payloads = {}
+
+# Colecciones más grandes que esto se transmiten siempre en streaming sin cachear,
+# para que la memoria no crezca con el tamaño del fraccionamiento.
+LIMITE_CACHE = 16 * 1024 * 1024
+TAM_BLOQUE = 64 * 1024
+
+def version(clave):
+    """Versión vigente de la colección según la BD.
+
+    Lotes: la bitácora LoteCambio (toda alta, edición, venta, rescisión o baja
+    agrega un registro en la misma transacción). Fraccionamientos: cantidad,
+    último id y suma de revisiones (cada UPDATE incrementa la revisión).
+    """
+    tipo, frac_id = clave
+    if tipo == 'lotes':
+        return LoteCambio.secuencia(frac_id)
+    return tuple(db.session.query(func.count(Fraccionamiento.id), func.max(Fraccionamiento.id),
+                                  func.sum(Fraccionamiento.revision)).one())
+
+def respuesta_geojson(clave, variante, features, extra=None):
+    """Responde con la colección cacheada si su versión está vigente.
+
+    Si no, `features()` (un iterable de Features, idealmente con yield_per) se
+    serializa y transmite de a una feature; el resultado se guarda en la caché
+    al terminar, salvo que supere LIMITE_CACHE. `extra` son miembros adicionales
+    de la FeatureCollection (p. ej. los parámetros del formato compacto).
+    """
+    v = version(clave)
+    etag = _etag(clave, variante, v)
+    if request.if_none_match.contains_weak(etag):
+        return _cabeceras(Response(status=304), etag)
+    entrada = _payloads.get((clave, variante))
+    if entrada is not None and entrada['version'] == v:
+        return _responder(entrada, etag)
+    cuerpo = stream_with_context(_transmitir(clave, variante, v, features, extra))
+    return _cabeceras(Response(cuerpo, mimetype='application/json'), etag)
+
+def iterar_feature_collection(features, extra=None):
+    """Serializa una FeatureCollection en bloques de texto sin armarla completa en memoria."""
+    bloque = ['{"type":"FeatureCollection",']
+    for k, valor in (extra or {}).items():
+        bloque.append(f'{json.dumps(k)}:{json.dumps(valor, separators=(",", ":"))},')
+    bloque.append('"features":[')
+    tam = 0
+    for i, feature in enumerate(features):
+        texto = json.dumps(feature, separators=(',', ':'))
+        bloque.append(texto if i == 0 else ',' + texto)
+        tam += len(texto)
+        if tam >= TAM_BLOQUE:
+            yield ''.join(bloque)
+            bloque, tam = [], 0
+    bloque.append(']}')
+    yield ''.join(bloque)
+
+def _transmitir(clave, variante, v, features, extra):
+    partes, tam = [], 0
+    for texto in iterar_feature_collection(features(), extra):
+        datos = texto.encode('utf-8')
+        if partes is not None:
+            partes.append(datos)
+            tam += len(datos)
+            if tam > LIMITE_CACHE: partes = None # Demasiado grande: solo streaming
+        yield datos
+    if partes is not None:
+        _guardar(clave, variante, v, b''.join(partes))
+
+def _guardar(clave, variante, v, cuerpo):
+    entrada = {
+        'version': v,
+        'identity': cuerpo,
+        'gzip': gzip.compress(cuerpo, 6),
+        'br': brotli.compress(cuerpo),
+    }
+    with _lock:
+        _payloads[(clave, variante)] = entrada
+
+def _etag(clave, variante, v):
+    return hashlib.sha1(repr((clave, variante, v)).encode()).hexdigest()
+
+def _responder(entrada, etag):
+    codificacion = 'identity'
+    if request.accept_encodings['br']:
+        codificacion = 'br'
+    elif request.accept_encodings['gzip']:
+        codificacion = 'gzip'
+    resp = Response(entrada[codificacion], mimetype='application/json')
+    if codificacion != 'identity':
+        resp.headers['Content-Encoding'] = codificacion
+    return _cabeceras(resp, etag)
+
+def _cabeceras(resp, etag):
+    # ETag débil: el mismo para todas las codificaciones de una versión
+    resp.set_etag(etag, weak=True)
+    resp.headers['Cache-Control'] = 'public, no-cache'
+    resp.vary.add('Accept-Encoding')
+    return resp
@@ -0,0 +1,199 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, func, case, and_, event, extract
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Cuota, Contrato, Cliente, Funcionario, Lote, Fraccionamiento
+
+# --- ANTIGÜEDAD DE LA CARTERA ---
+# Deuda vencida e impaga por tramos de días de atraso, agrupada por
+# fraccionamiento, vendedor y cliente. Sale de un único GROUP BY sobre cuotas
+# (con el índice estado/vencimiento); los totales por dimensión se suman en
+# Python sobre esas filas. El resultado se cachea por día y se descarta cuando se
+# confirma una transacción que tocó saldos de contratos (pagos, altas,
+# rescisiones). El TTL cubre los cambios hechos desde otro proceso.
+TRAMOS = ("0-30", "31-60", "61-90", "90+")
+TTL_ANTIGUEDAD = 300
+
+_lock = threading.Lock()
+_version = 0
+_cache = {} # fecha -> (version, expira, resultado)
+
+def marcar_modificada():
+    """Llamar dentro de la transacción que cambia la deuda; la caché se descarta al hacer commit."""
+    db.session.info["cartera_modificada"] = True
+
+def invalidar():
+    global _version
+    with _lock:
+        _version += 1
+        _cache.clear()
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(sesion):
+    if sesion.info.pop("cartera_modificada", False):
+        invalidar()
+
+@event.listens_for(Session, "after_soft_rollback")
+def _al_deshacer(sesion, transaccion_previa):
+    sesion.info.pop("cartera_modificada", None)
+
+def antiguedad(fecha=None):
+    """Antigüedad de la deuda vencida a `fecha` (hoy por defecto), desde la caché del día si está vigente."""
+    fecha = fecha or date.today()
+    entrada = _cache.get(fecha)
+    if entrada and entrada[0] == _version and entrada[1] > time.monotonic():
+        return entrada[2]
+    version = _version
+    resultado = calcular_antiguedad(fecha)
+    with _lock:
+        if version == _version: # Si hubo un pago mientras se calculaba, no se guarda
+            _cache[fecha] = (version, time.monotonic() + TTL_ANTIGUEDAD, resultado)
+    return resultado
+
+def calcular_antiguedad(fecha):
+    venc = Cuota.fecha_vencimiento
+    limite_30, limite_60, limite_90 = (fecha - timedelta(days=d) for d in (30, 60, 90))
+    condiciones = (
+        venc >= limite_30,
+        and_(venc < limite_30, venc >= limite_60),
+        and_(venc < limite_60, venc >= limite_90),
+        venc < limite_90,
+    )
+    q = (
+        select(
+            Fraccionamiento.id.label("fraccionamiento_id"), Fraccionamiento.nombre.label("fraccionamiento"),
+            Contrato.vendedor_id, Funcionario.nombre.label("vendedor_nombre"), Funcionario.apellido.label("vendedor_apellido"),
+            Cliente.id.label("cliente_id"), Cliente.nombre, Cliente.apellido, Cliente.documento,
+            *[func.sum(case((cond, Cuota.valor_cuota), else_=0)).label(f"t{i}") for i, cond in enumerate(condiciones)],
+            func.count(Cuota.id).label("cuotas"),
+        )
+        .select_from(Cuota)
+        .join(Contrato, Cuota.contrato_id == Contrato.id)
+        .join(Cliente, Contrato.cliente_id == Cliente.id)
+        .join(Lote, Contrato.lote_id == Lote.id)
+        .join(Fraccionamiento, Lote.fraccionamiento_id == Fraccionamiento.id)
+        .outerjoin(Funcionario, Contrato.vendedor_id == Funcionario.id)
+        .where(Cuota.estado.in_(('pendiente', 'vencida')), venc < fecha, Contrato.estado != 'rescindido')
+        .group_by(Fraccionamiento.id, Fraccionamiento.nombre, Contrato.vendedor_id, Funcionario.nombre, Funcionario.apellido,
+                  Cliente.id, Cliente.nombre, Cliente.apellido, Cliente.documento)
+    )
+    filas = db.session.execute(q).all()
+
+    total = _acumulador()
+    por_frac, por_vendedor, por_cliente, detalle = {}, {}, {}, []
+    for f in filas:
+        montos = [float(getattr(f, f"t{i}") or 0) for i in range(len(TRAMOS))]
+        vendedor = f"{f.vendedor_nombre} {f.vendedor_apellido}" if f.vendedor_id else "Sin vendedor"
+        cliente = f"{f.nombre} {f.apellido}"
+        for grupos, clave, datos in (
+            (por_frac, f.fraccionamiento_id, {"fraccionamiento_id": f.fraccionamiento_id, "nombre": f.fraccionamiento}),
+            (por_vendedor, f.vendedor_id, {"vendedor_id": f.vendedor_id, "nombre": vendedor}),
+            (por_cliente, f.cliente_id, {"cliente_id": f.cliente_id, "nombre": cliente, "documento": f.documento}),
+        ):
+            if clave not in grupos: grupos[clave] = {**datos, **_acumulador()}
+            _sumar(grupos[clave], montos, f.cuotas)
+        _sumar(total, montos, f.cuotas)
+        detalle.append({"fraccionamiento": f.fraccionamiento, "vendedor": vendedor, "cliente": cliente,
+                        "documento": f.documento, **_sumar(_acumulador(), montos, f.cuotas)})
+
+    def ordenar(grupos): return sorted(grupos.values(), key=lambda g: g["total"], reverse=True)
+    return {
+        "fecha": fecha.isoformat(),
+        "tramos": list(TRAMOS),
+        "total": total,
+        "por_fraccionamiento": ordenar(por_frac),
+        "por_vendedor": ordenar(por_vendedor),
+        "por_cliente": ordenar(por_cliente),
+        "detalle": detalle,
+    }
+
+def _acumulador():
+    return {**dict.fromkeys(TRAMOS, 0.0), "total": 0.0, "cuotas": 0}
+
+def _sumar(acum, montos, cuotas):
+    for tramo, monto in zip(TRAMOS, montos):
+        acum[tramo] += monto
+    acum["total"] += sum(montos)
+    acum["cuotas"] += cuotas
+    return acum
+
+# --- PROYECCIÓN DE FLUJO DE CAJA ---
+# Cobros esperados por mes según el cronograma de cuotas impagas. La BD devuelve
+# una fila por (moneda, fraccionamiento, año, mes) y con eso se arma una matriz
+# NumPy [moneda, fraccionamiento, mes]; la columna 0 junta lo ya vencido. Los
+# repartos inmobiliaria/propietario usan los mismos porcentajes que la
+# liquidación (cada uno aplicado sobre el monto cobrado).
+MAX_MESES_PROYECCION = 120
+
+def proyeccion_flujo(meses=36, desde=None, fraccionamiento_id=None):
+    """Flujo mensual esperado desde el mes de `desde` (hoy por defecto) durante `meses` meses."""
+    inicio = (desde or date.today()).replace(day=1)
+    fin = inicio + relativedelta(months=meses)
+    venc = Cuota.fecha_vencimiento
+    anio, mes = extract('year', venc), extract('month', venc)
+    moneda = func.coalesce(Contrato.moneda, 'GS')
+    q = (
+        select(moneda, Lote.fraccionamiento_id, anio, mes, func.sum(Cuota.valor_cuota))
+        .select_from(Cuota)
+        .join(Contrato, Cuota.contrato_id == Contrato.id)
+        .join(Lote, Contrato.lote_id == Lote.id)
+        .where(Cuota.estado.in_(('pendiente', 'vencida')), venc < fin, Contrato.estado != 'rescindido')
+        .group_by(moneda, Lote.fraccionamiento_id, anio, mes)
+    )
+    if fraccionamiento_id:
+        q = q.where(Lote.fraccionamiento_id == fraccionamiento_id)
+    filas = db.session.execute(q).all()
+
+    etiquetas = [(inicio + relativedelta(months=i)).strftime("%Y-%m") for i in range(meses)]
+    if not filas:
+        return {"desde": etiquetas[0] if etiquetas else None, "meses": etiquetas, "monedas": [], "por_moneda": {}, "por_fraccionamiento": []}
+
+    columnas = list(zip(*filas))
+    monedas, i_moneda = np.unique(np.array(columnas[0], dtype=str), return_inverse=True)
+    fracs, i_frac = np.unique(np.array(columnas[1], dtype=np.int64), return_inverse=True)
+    # Mes relativo al inicio (+1: la columna 0 es lo vencido antes del inicio)
+    i_mes = (np.array(columnas[2], dtype=np.int64) - inicio.year) * 12 + np.array(columnas[3], dtype=np.int64) - inicio.month + 1
+    i_mes = np.clip(i_mes, 0, meses)
+    matriz = np.zeros((len(monedas), len(fracs), meses + 1))
+    np.add.at(matriz, (i_moneda, i_frac, i_mes), np.array(columnas[4], dtype=float))
+
+    datos_frac = {f.id: f for f in db.session.execute(
+        select(Fraccionamiento.id, Fraccionamiento.nombre, Fraccionamiento.comision_inmobiliaria, Fraccionamiento.comision_propietario)
+        .where(Fraccionamiento.id.in_(fracs.tolist()))
+    )}
+    pct_inmob = np.array([float(datos_frac[i].comision_inmobiliaria or 0) if i in datos_frac else 0.0 for i in fracs.tolist()]) / 100
+    pct_prop = np.array([float(datos_frac[i].comision_propietario or 0) if i in datos_frac else 0.0 for i in fracs.tolist()]) / 100
+    inmobiliaria = matriz * pct_inmob[None, :, None]
+    propietario = matriz * pct_prop[None, :, None]
+
+    por_moneda = {}
+    for m, nombre_moneda in enumerate(monedas.tolist()):
+        por_moneda[nombre_moneda] = {
+            "vencido": float(matriz[m, :, 0].sum()),
+            "mensual": matriz[m, :, 1:].sum(axis=0).tolist(),
+            "inmobiliaria": inmobiliaria[m, :, 1:].sum(axis=0).tolist(),
+            "propietario": propietario[m, :, 1:].sum(axis=0).tolist(),
+            "total": float(matriz[m].sum()),
+        }
+    por_frac = []
+    for m, nombre_moneda in enumerate(monedas.tolist()):
+        for f, frac_id in enumerate(fracs.tolist()):
+            if not matriz[m, f].any(): continue
+            por_frac.append({
+                "fraccionamiento_id": frac_id,
+                "nombre": datos_frac[frac_id].nombre if frac_id in datos_frac else str(frac_id),
+                "moneda": nombre_moneda,
+                "vencido": float(matriz[m, f, 0]),
+                "mensual": matriz[m, f, 1:].tolist(),
+                "total": float(matriz[m, f].sum()),
+                "total_inmobiliaria": float(inmobiliaria[m, f].sum()),
+                "total_propietario": float(propietario[m, f].sum()),
+            })
+    return {"desde": etiquetas[0], "meses": etiquetas, "monedas": monedas.tolist(),
+            "por_moneda": por_moneda, "por_fraccionamiento": por_frac}
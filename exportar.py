@@ -0,0 +1,85 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+import xlsxwriter
+from flask import Response, stream_with_context
+
+from extensions import db
+
+# --- EXPORTACIÓN DE REPORTES (CSV / XLSX) ---
+# Las filas se consumen de a una desde un iterable (normalmente filas() sobre una
+# consulta con yield_per) y se escriben por bloques, así la memoria no crece con
+# el tamaño del reporte. El CSV empieza a descargarse con el primer bloque. El
+# XLSX se arma con xlsxwriter en modo constant_memory sobre un archivo temporal
+# (el formato zip no permite enviarlo antes de cerrarlo) y después se envía por
+# partes.
+FORMATOS = ("csv", "xlsx")
+FILAS_POR_BLOQUE = 1000
+_MIMETYPES = {
+    "csv": "text/csv", # Werkzeug agrega "; charset=utf-8"
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def filas(consulta):
+    """Ejecuta la consulta a medida que se consumen las filas, de a FILAS_POR_BLOQUE (cursor del lado del servidor en MySQL)."""
+    yield from db.session.execute(consulta.execution_options(yield_per=FILAS_POR_BLOQUE))
+
+def respuesta(nombre, columnas, filas, formato):
+    """Response en streaming con `filas` exportadas como `nombre`.csv o `nombre`.xlsx."""
+    generador = generar_xlsx(columnas, filas, nombre) if formato == "xlsx" else generar_csv(columnas, filas)
+    return Response(stream_with_context(generador), mimetype=_MIMETYPES.get(formato, _MIMETYPES["csv"]),
+                    headers={"Content-Disposition": f"attachment;filename={nombre}.{'xlsx' if formato == 'xlsx' else 'csv'}"})
+
+def generar_csv(columnas, filas):
+    buf = io.StringIO()
+    buf.write("\ufeff") # BOM: Excel abre el archivo como UTF-8 (acentos, ñ)
+    w = csv.writer(buf, delimiter=';')
+    w.writerow(columnas)
+    for i, fila in enumerate(filas, 1):
+        w.writerow([_texto(v) for v in fila])
+        if i % FILAS_POR_BLOQUE == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+def generar_xlsx(columnas, filas, hoja="Reporte"):
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        libro = xlsxwriter.Workbook(ruta, {"constant_memory": True})
+        ws = libro.add_worksheet(hoja[:31])
+        negrita = libro.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+        f_fecha = libro.add_format({"num_format": "dd/mm/yyyy"})
+        f_fecha_hora = libro.add_format({"num_format": "dd/mm/yyyy hh:mm"})
+        f_numero = libro.add_format({"num_format": "#,##0"})
+        ws.set_column(0, len(columnas) - 1, 16)
+        ws.write_row(0, 0, columnas, negrita) # constant_memory: las filas se escriben en orden
+        ws.freeze_panes(1, 0)
+        for r, fila in enumerate(filas, 1):
+            for c, v in enumerate(fila):
+                if v is None: continue
+                if isinstance(v, datetime): ws.write_datetime(r, c, v, f_fecha_hora)
+                elif isinstance(v, date): ws.write_datetime(r, c, datetime.combine(v, datetime.min.time()), f_fecha)
+                elif isinstance(v, (Decimal, float)): ws.write_number(r, c, float(v), f_numero)
+                elif isinstance(v, int): ws.write_number(r, c, v)
+                else: ws.write_string(r, c, str(v))
+        libro.close()
+        with open(ruta, "rb") as f:
+            while True:
+                bloque = f.read(64 * 1024)
+                if not bloque: break
+                yield bloque
+    finally:
+        os.remove(ruta)
+
+def _texto(v):
+    if v is None: return ""
+    if isinstance(v, datetime): return v.strftime("%d/%m/%Y %H:%M")
+    if isinstance(v, date): return v.strftime("%d/%m/%Y")
+    if isinstance(v, float): v = Decimal(repr(v))
+    if isinstance(v, Decimal): return format(v, "f").replace(".", ",") # Coma decimal, como Excel con ';'
+    return v
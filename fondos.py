@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import attributes
+from sqlalchemy.orm.util import identity_key
+
+from extensions import db
+from models import Caja, CuentaBancaria
+
+# --- SALDOS DE CAJAS Y CUENTAS BANCARIAS ---
+# Los saldos se modifican con UPDATE ... SET saldo = saldo + :delta en la BD y el
+# valor nuevo se relee de la BD; nunca se lee el saldo en Python para escribirlo
+# de vuelta, así varios cajeros sobre la misma caja no se pisan. El UPDATE bloquea
+# la fila hasta el commit: llamar a estas funciones como último paso antes de
+# confirmar, para que el bloqueo dure solo lo que tarda el commit.
+
+def mover_caja(caja_id, delta, permitir_negativo=True):
+    """Suma `delta` al saldo de la caja. Devuelve el saldo nuevo, o None si quedaría negativo."""
+    return _mover(Caja, Caja.saldo_actual, caja_id, delta, permitir_negativo)
+
+def mover_cuenta(cuenta_id, delta, permitir_negativo=True):
+    """Suma `delta` al saldo de la cuenta bancaria. Devuelve el saldo nuevo, o None si quedaría negativo."""
+    return _mover(CuentaBancaria, CuentaBancaria.saldo, cuenta_id, delta, permitir_negativo)
+
+def vaciar_caja(caja_id):
+    """Retira todo el saldo de la caja (cierre). Devuelve el monto retirado, o None si la caja no existe.
+
+    El saldo se lee bloqueando la fila y se descuenta como delta: un cobro
+    simultáneo espera al commit, y aunque la BD no bloquee, queda en la caja en
+    lugar de perderse.
+    """
+    saldo = db.session.execute(select(func.coalesce(Caja.saldo_actual, 0)).where(Caja.id == caja_id).with_for_update()).scalar()
+    if saldo is None:
+        return None
+    mover_caja(caja_id, -saldo)
+    return saldo
+
+def mover_cuentas(movimientos, permitir_negativo=False):
+    """Aplica [(cuenta_id, delta)] en orden de id (evita interbloqueos entre transferencias cruzadas).
+
+    Devuelve {cuenta_id: saldo nuevo}, o None si alguna cuenta quedaría negativa;
+    en ese caso el llamador debe hacer rollback.
+    """
+    saldos = {}
+    for cuenta_id, delta in sorted(movimientos, key=lambda m: m[0]):
+        nuevo = mover_cuenta(cuenta_id, delta, permitir_negativo)
+        if nuevo is None:
+            return None
+        saldos[cuenta_id] = nuevo
+    return saldos
+
+def _mover(modelo, columna, id_, delta, permitir_negativo):
+    delta = Decimal(str(delta))
+    nuevo_valor = func.coalesce(columna, 0) + delta
+    q = update(modelo).where(modelo.id == id_).values({columna.key: nuevo_valor})
+    if not permitir_negativo and delta < 0:
+        q = q.where(nuevo_valor >= 0) # El control de saldo va en el mismo UPDATE, sin leer antes
+    if db.session.execute(q.execution_options(synchronize_session=False)).rowcount == 0:
+        return None
+    nuevo = db.session.execute(select(columna).where(modelo.id == id_)).scalar()
+    # El objeto ya cargado en la sesión refleja el saldo de la BD sin quedar marcado como modificado
+    obj = db.session.identity_map.get(identity_key(modelo, id_))
+    if obj is not None:
+        attributes.set_committed_value(obj, columna.key, nuevo)
+    return nuevo
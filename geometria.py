@@ -0,0 +1,272 @@
+import base64
+import shapely
+from shapely.geometry import shape, mapping, box, Point
+from shapely.ops import nearest_points
+from shapely.strtree import STRtree
+from pyproj import Geod
+import math
+import threading
+
+# --- SIMPLIFICACIÓN POR ZOOM ---
+# Cada banda cubre los zooms de Leaflet hasta el valor indicado y usa como
+# tolerancia (en grados) aproximadamente un píxel del zoom más bajo de la banda.
+# Por encima de la última banda se envía la geometría original.
+BANDAS_ZOOM = (
+    (11, 0.0007),
+    (13, 0.00017),
+    (15, 0.00004),
+)
+
+def banda_para(zoom=None, tolerancia=None):
+    """Devuelve la clave de la banda precalculada a usar, o None para la geometría completa."""
+    if zoom is not None:
+        for zoom_max, _ in BANDAS_ZOOM:
+            if zoom <= zoom_max:
+                return str(zoom_max)
+        return None
+    if tolerancia is not None:
+        # La banda más simplificada que no supere la tolerancia pedida
+        for zoom_max, tol in BANDAS_ZOOM:
+            if tol <= tolerancia:
+                return str(zoom_max)
+    return None
+
+def simplificar(geojson, tolerancia):
+    """Simplifica una geometría GeoJSON conservando su topología (sin auto-intersecciones)."""
+    geom = shape(geojson).simplify(tolerancia, preserve_topology=True)
+    return mapping(geom)
+
+def calcular_simplificaciones(geojson):
+    """Precalcula la geometría simplificada de cada banda de zoom. None si la geometría es inválida."""
+    if not geojson:
+        return None
+    try:
+        return {str(zoom_max): simplificar(geojson, tol) for zoom_max, tol in BANDAS_ZOOM}
+    except Exception as e:
+        print(f"No se pudo simplificar la geometría: {e}")
+        return None
+
+# --- MÉTRICAS PRECALCULADAS ---
+_GEOD = Geod(ellps="WGS84")
+CAMPOS_METRICAS = ("area_m2", "centroide_lat", "centroide_lng", "bbox_minx", "bbox_miny", "bbox_maxx", "bbox_maxy")
+
+def calcular_metricas(geojson):
+    """Área geodésica (m²), centroide y rectángulo envolvente de una geometría en lon/lat."""
+    geom = a_shape(geojson)
+    if geom is None or geom.is_empty:
+        return dict.fromkeys(CAMPOS_METRICAS)
+    area, _ = _GEOD.geometry_area_perimeter(geom)
+    centro = geom.centroid
+    minx, miny, maxx, maxy = geom.bounds
+    return {"area_m2": abs(area), "centroide_lat": centro.y, "centroide_lng": centro.x,
+            "bbox_minx": minx, "bbox_miny": miny, "bbox_maxx": maxx, "bbox_maxy": maxy}
+
+def derivados_geometria(geojson):
+    """Columnas que se recalculan cada vez que se guarda una geometría (simplificaciones y métricas)."""
+    d = {"geojson_simplificado": calcular_simplificaciones(geojson)}
+    d.update(calcular_metricas(geojson))
+    return d
+
+def asignar_geometria(obj, geojson):
+    """Asigna la geometría a un Lote/Fraccionamiento junto con sus columnas derivadas."""
+    obj.geojson = geojson
+    for campo, valor in derivados_geometria(geojson).items():
+        setattr(obj, campo, valor)
+
+# --- FORMATO COMPACTO (CUANTIZADO) ---
+# Coordenadas redondeadas a una grilla de 1e-7 grados (~1 cm), codificadas como
+# diferencias respecto del punto anterior (zigzag + varint) y empaquetadas en
+# base64. Los anillos se envían sin el punto de cierre; "n" lleva la cantidad de
+# puntos de cada anillo para rearmar la geometría (ver decodificarGeometria en map.js).
+ESCALA_CUANTIZACION = 10 ** 7
+
+def codificar_geometria(geojson):
+    """Polygon/MultiPolygon GeoJSON -> {"type", "q": base64, "n": puntos por anillo}. Otros tipos quedan igual."""
+    if not geojson or geojson.get("type") not in ("Polygon", "MultiPolygon"):
+        return geojson
+    poligonos = [geojson["coordinates"]] if geojson["type"] == "Polygon" else geojson["coordinates"]
+    buf = bytearray()
+    px = py = 0
+    tamanos = []
+    for poligono in poligonos:
+        anillos = []
+        for anillo in poligono:
+            puntos = anillo[:-1] if len(anillo) > 1 and anillo[0] == anillo[-1] else anillo
+            for x, y in (p[:2] for p in puntos):
+                qx, qy = round(x * ESCALA_CUANTIZACION), round(y * ESCALA_CUANTIZACION)
+                _varint(buf, qx - px)
+                _varint(buf, qy - py)
+                px, py = qx, qy
+            anillos.append(len(puntos))
+        tamanos.append(anillos)
+    return {"type": geojson["type"], "q": base64.b64encode(bytes(buf)).decode("ascii"),
+            "n": tamanos[0] if geojson["type"] == "Polygon" else tamanos}
+
+def _varint(buf, valor):
+    valor = valor * 2 if valor >= 0 else -valor * 2 - 1 # zigzag: el signo va en el bit menos significativo
+    while valor >= 0x80:
+        buf.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    buf.append(valor)
+
+# --- ÍNDICE ESPACIAL DE LOTES ---
+class IndiceLotes:
+    """Índice espacial en memoria (un STRtree por fraccionamiento) sobre los lotes activos.
+
+    Se carga de la BD en la primera consulta y guarda la secuencia de LoteCambio
+    a la que corresponde. Cada consulta compara esa secuencia con la de la BD;
+    si avanzó (un alta, edición o baja confirmada por este u otro proceso) se
+    releen solo los lotes cambiados y se reconstruye, en la siguiente consulta,
+    el árbol de sus fraccionamientos.
+    """
+    # Con más lotes cambiados que esto se recarga el índice completo
+    MAX_PARCIAL = 5000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._secuencia = None
+        self._vistos = set()  # ids de LoteCambio ya aplicados dentro de la ventana
+        self._geometrias = {} # fraccionamiento_id -> {lote_id: geometría shapely}
+        self._frac_de = {}    # lote_id -> fraccionamiento_id
+        self._arboles = {}    # fraccionamiento_id -> (STRtree, [lote_id])
+
+    def _cargar(self):
+        from extensions import db
+        from models import Lote, LoteCambio
+        # La secuencia se lee antes que los lotes: lo que se confirme en el medio se vuelve a aplicar después
+        self._secuencia = LoteCambio.secuencia()
+        self._vistos = set(self._cambios_desde(self._secuencia[0] - LoteCambio.VENTANA))
+        self._geometrias, self._frac_de = {}, {}
+        filas = db.session.query(Lote.id, Lote.fraccionamiento_id, Lote.geojson).filter(Lote.activo == True).all()
+        for lote_id, frac_id, geojson in filas:
+            self._poner(lote_id, frac_id, geojson)
+        self._arboles = {}
+        self._cargado = True
+
+    def _sincronizar(self):
+        """Carga el índice o aplica los cambios de lotes confirmados desde la última consulta."""
+        from extensions import db
+        from models import Lote, LoteCambio
+        if not self._cargado:
+            return self._cargar()
+        secuencia = LoteCambio.secuencia()
+        if secuencia == self._secuencia: return
+        cambios = self._cambios_desde(self._secuencia[0] - LoteCambio.VENTANA)
+        nuevos = {cid: lote_id for cid, lote_id in cambios.items() if cid not in self._vistos}
+        lote_ids = set(nuevos.values())
+        if len(lote_ids) > self.MAX_PARCIAL:
+            return self._cargar()
+        filas = db.session.query(Lote.id, Lote.fraccionamiento_id, Lote.geojson, Lote.activo).filter(Lote.id.in_(lote_ids)).all() if lote_ids else []
+        encontrados = set()
+        for lote_id, frac_id, geojson, activo in filas:
+            encontrados.add(lote_id)
+            self._quitar(lote_id)
+            if activo: self._poner(lote_id, frac_id, geojson)
+        for lote_id in lote_ids - encontrados: # Borrados de la tabla
+            self._quitar(lote_id)
+        self._secuencia = secuencia
+        self._vistos = {cid for cid in cambios if cid > secuencia[0] - LoteCambio.VENTANA}
+
+    def _cambios_desde(self, desde):
+        from extensions import db
+        from models import LoteCambio
+        return dict(db.session.query(LoteCambio.id, LoteCambio.lote_id).filter(LoteCambio.id > desde).all())
+
+    def _poner(self, lote_id, fraccionamiento_id, geojson):
+        geom = a_shape(geojson)
+        if geom is None: return
+        self._geometrias.setdefault(fraccionamiento_id, {})[lote_id] = geom
+        self._frac_de[lote_id] = fraccionamiento_id
+        self._arboles.pop(fraccionamiento_id, None)
+
+    def _quitar(self, lote_id):
+        frac_id = self._frac_de.pop(lote_id, None)
+        if frac_id is not None:
+            self._geometrias.get(frac_id, {}).pop(lote_id, None)
+            self._arboles.pop(frac_id, None)
+
+    def invalidar(self):
+        """Descarta todo el índice; se recarga de la BD en la próxima consulta."""
+        with self._lock:
+            self._cargado = False
+            self._geometrias = {}
+            self._frac_de = {}
+            self._arboles = {}
+
+    def _arbol(self, fraccionamiento_id):
+        arbol = self._arboles.get(fraccionamiento_id)
+        if arbol is None:
+            lotes = self._geometrias.get(fraccionamiento_id, {})
+            ids = list(lotes.keys())
+            geoms = [lotes[i] for i in ids]
+            shapely.prepare(geoms) # Geometrías preparadas para las pruebas punto-en-polígono
+            arbol = (STRtree(geoms), ids)
+            self._arboles[fraccionamiento_id] = arbol
+        return arbol
+
+    def consultar_bbox(self, minx, miny, maxx, maxy, fraccionamiento_id=None):
+        """IDs de los lotes cuyo rectángulo envolvente intersecta el bbox dado."""
+        with self._lock:
+            self._sincronizar()
+            area = box(minx, miny, maxx, maxy)
+            resultado = []
+            for frac_id in self._fracs(fraccionamiento_id):
+                arbol, ids = self._arbol(frac_id)
+                resultado.extend(ids[i] for i in arbol.query(area))
+            return resultado
+
+    def consultar_punto(self, lng, lat, fraccionamiento_id=None):
+        """IDs de los lotes que contienen el punto."""
+        with self._lock:
+            self._sincronizar()
+            punto = Point(lng, lat)
+            resultado = []
+            for frac_id in self._fracs(fraccionamiento_id):
+                arbol, ids = self._arbol(frac_id)
+                for i in arbol.query(punto):
+                    if shapely.intersects_xy(arbol.geometries[i], lng, lat): # incluye el borde
+                        resultado.append(ids[i])
+            return resultado
+
+    def consultar_cercanos(self, lng, lat, radio_m, limite=10, fraccionamiento_id=None):
+        """[(lote_id, distancia_m)] de los lotes a menos de `radio_m` metros, del más cercano al más lejano."""
+        with self._lock:
+            self._sincronizar()
+            punto = Point(lng, lat)
+            # Rectángulo de búsqueda en grados (aprox. 111.32 km por grado de latitud)
+            d_lat = radio_m / 111320.0
+            d_lng = radio_m / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+            area = box(lng - d_lng, lat - d_lat, lng + d_lng, lat + d_lat)
+            resultado = []
+            for frac_id in self._fracs(fraccionamiento_id):
+                arbol, ids = self._arbol(frac_id)
+                for i in arbol.query(area):
+                    geom = arbol.geometries[i]
+                    if shapely.intersects_xy(geom, lng, lat):
+                        distancia = 0.0
+                    else:
+                        cercano = nearest_points(geom, punto)[0]
+                        distancia = _GEOD.inv(lng, lat, cercano.x, cercano.y)[2]
+                    if distancia <= radio_m:
+                        resultado.append((ids[i], distancia))
+            resultado.sort(key=lambda r: r[1])
+            return resultado[:limite]
+
+    def _fracs(self, fraccionamiento_id):
+        return [fraccionamiento_id] if fraccionamiento_id else list(self._geometrias.keys())
+
+def a_shape(geojson):
+    try:
+        return shape(geojson) if geojson else None
+    except Exception:
+        return None
+
+def parsear_bbox(valor):
+    """'minx,miny,maxx,maxy' -> tupla de floats. Lanza ValueError si el formato es inválido."""
+    partes = [float(v) for v in valor.split(',')]
+    if len(partes) != 4 or partes[0] > partes[2] or partes[1] > partes[3]:
+        raise ValueError("bbox inválido")
+    return tuple(partes)
+
+indice_lotes = IndiceLotes()
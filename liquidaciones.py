@@ -0,0 +1,228 @@
+import io
+import zipfile
+from datetime import datetime, timedelta, date
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from fpdf import FPDF
+from sqlalchemy import select
+
+from extensions import db
+from models import Pago, Contrato, Cliente, Lote, Cuota, Fraccionamiento
+from utils import clean, mapear_en_procesos
+
+# --- LIQUIDACIÓN DE PROPIETARIOS ---
+# Cada fraccionamiento se liquida a su propietario con los porcentajes de
+# comisión configurados en él. Los pagos del período salen de una sola consulta
+# plana (pago + cliente + lote + cuota) y los repartos se calculan de una vez con
+# NumPy. El armado del PDF no toca la BD, así que la liquidación mensual de todos
+# los fraccionamientos se renderiza en un pool de procesos, como los recibos.
+MIN_PARALELO = 3 # Con menos fraccionamientos no compensa levantar procesos
+
+def datos_liquidacion(desde, hasta, fraccionamiento_ids=None):
+    """Datos planos (serializables) de la liquidación de cada fraccionamiento, pagos entre `desde` y `hasta` inclusive.
+
+    Devuelve una lista ordenada por nombre; solo incluye fraccionamientos con pagos,
+    salvo los pedidos explícitamente en `fraccionamiento_ids`.
+    """
+    q = (
+        select(Lote.fraccionamiento_id, Pago.fecha_pago, Pago.monto, Cliente.nombre, Cliente.apellido,
+               Lote.manzana, Lote.numero_lote, Cuota.numero_cuota)
+        .select_from(Pago)
+        .join(Contrato, Pago.contrato_id == Contrato.id)
+        .join(Cliente, Contrato.cliente_id == Cliente.id)
+        .join(Lote, Contrato.lote_id == Lote.id)
+        .outerjoin(Cuota, Pago.cuota_id == Cuota.id)
+        .where(Pago.fecha_pago >= datetime.combine(desde, datetime.min.time()),
+               Pago.fecha_pago < datetime.combine(hasta + timedelta(days=1), datetime.min.time())) # Incluir todo el día final
+        .order_by(Lote.fraccionamiento_id, Pago.fecha_pago, Pago.id)
+    )
+    if fraccionamiento_ids is not None:
+        q = q.where(Lote.fraccionamiento_id.in_(fraccionamiento_ids))
+    filas = db.session.execute(q).all()
+
+    ids = set(fraccionamiento_ids or ()) | {f.fraccionamiento_id for f in filas}
+    fracs = {f.id: f for f in db.session.execute(
+        select(Fraccionamiento.id, Fraccionamiento.nombre, Fraccionamiento.comision_inmobiliaria, Fraccionamiento.comision_propietario)
+        .where(Fraccionamiento.id.in_(ids))
+    )}
+
+    # Repartos de todos los pagos a la vez: cada pago con los porcentajes de su fraccionamiento
+    frac_pago = np.array([f.fraccionamiento_id for f in filas], dtype=np.int64)
+    montos = np.array([float(f.monto) for f in filas])
+    pct_inmob = np.array([float(fracs[i].comision_inmobiliaria or 0) for i in frac_pago.tolist()]) / 100
+    pct_prop = np.array([float(fracs[i].comision_propietario or 0) for i in frac_pago.tolist()]) / 100
+    inmobiliaria, propietario = montos * pct_inmob, montos * pct_prop
+    # Filas ordenadas por fraccionamiento: cada uno es un tramo contiguo
+    cortes = np.flatnonzero(np.diff(frac_pago)) + 1
+    inicios = np.concatenate(([0], cortes)).tolist() if len(filas) else []
+    finales = np.concatenate((cortes, [len(filas)])).tolist() if len(filas) else []
+    tramos = {int(frac_pago[i]): (i, j) for i, j in zip(inicios, finales)}
+
+    resultado = []
+    for frac_id, frac in fracs.items():
+        i, j = tramos.get(frac_id, (0, 0))
+        resultado.append({
+            "fraccionamiento_id": frac_id,
+            "fraccionamiento": frac.nombre,
+            "comision_inmobiliaria": float(frac.comision_inmobiliaria or 0),
+            "comision_propietario": float(frac.comision_propietario or 0),
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "pagos": [{
+                "fecha": f.fecha_pago.strftime("%d/%m/%Y"),
+                "cliente": f"{f.nombre} {f.apellido}",
+                "lote": f"Mz{f.manzana}-L{f.numero_lote}",
+                "cuota": str(f.numero_cuota) if f.numero_cuota is not None else "Ent", # Ent = Entrega inicial
+            } for f in filas[i:j]],
+            "montos": montos[i:j].tolist(),
+            "inmobiliaria": inmobiliaria[i:j].tolist(),
+            "propietario": propietario[i:j].tolist(),
+            "total_recaudado": float(montos[i:j].sum()),
+            "total_inmobiliaria": float(inmobiliaria[i:j].sum()),
+            "total_propietario": float(propietario[i:j].sum()),
+        })
+    return sorted(resultado, key=lambda d: d["fraccionamiento"])
+
+def _gs(valor):
+    return f"{int(valor):,}".replace(',', '.')
+
+class _PDF(FPDF):
+    titulo = 'LIQUIDACIÓN DE PROPIETARIO'
+
+    def header(self):
+        self.set_font('Arial', 'B', 14)
+        self.cell(0, 10, clean(self.titulo), 0, 1, 'C')
+        self.set_font('Arial', '', 10)
+        self.cell(0, 10, f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 0, 1, 'R')
+        self.line(10, 30, 200, 30)
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, clean(f'Página {self.page_no()}'), 0, 0, 'C')
+
+def renderizar(datos):
+    """PDF de liquidación de un fraccionamiento a partir de un elemento de datos_liquidacion()."""
+    pdf = _PDF('L', 'mm', 'A4') # Horizontal para que quepan las columnas
+    pdf.add_page()
+
+    # Datos del Encabezado
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(40, 10, "Fraccionamiento:", 0, 0)
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(0, 10, clean(datos['fraccionamiento'].upper()), 0, 1)
+
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(40, 8, clean("Período:"), 0, 0)
+    pdf.set_font('Arial', '', 11)
+    pdf.cell(0, 8, f"Del {datos['desde']} al {datos['hasta']}", 0, 1)
+
+    pdf.cell(0, 5, "", 0, 1) # Espacio
+
+    # Tabla de Detalles
+    pdf.set_fill_color(200, 220, 255)
+    pdf.set_font('Arial', 'B', 9)
+    w_fecha, w_cliente, w_lote, w_cuota, w_monto, w_inmob, w_prop = 25, 50, 25, 15, 30, 35, 35
+
+    pdf.cell(w_fecha, 8, "Fecha", 1, 0, 'C', 1)
+    pdf.cell(w_cliente, 8, "Cliente", 1, 0, 'C', 1)
+    pdf.cell(w_lote, 8, "Lote", 1, 0, 'C', 1)
+    pdf.cell(w_cuota, 8, "N.Cuota", 1, 0, 'C', 1)
+    pdf.cell(w_monto, 8, "Monto Pagado", 1, 0, 'C', 1)
+    pdf.cell(w_inmob, 8, f"Inmob. ({datos['comision_inmobiliaria']:g}%)", 1, 0, 'C', 1)
+    pdf.cell(w_prop, 8, f"Prop. ({datos['comision_propietario']:g}%)", 1, 1, 'C', 1)
+
+    pdf.set_font('Arial', '', 9)
+    for p, monto, inmob, prop in zip(datos['pagos'], datos['montos'], datos['inmobiliaria'], datos['propietario']):
+        pdf.cell(w_fecha, 7, p['fecha'], 1)
+        pdf.cell(w_cliente, 7, clean(p['cliente'][:23]), 1) # Cortar nombres largos
+        pdf.cell(w_lote, 7, clean(p['lote']), 1, 0, 'C')
+        pdf.cell(w_cuota, 7, p['cuota'], 1, 0, 'C')
+        pdf.cell(w_monto, 7, _gs(monto), 1, 0, 'R')
+        pdf.cell(w_inmob, 7, _gs(inmob), 1, 0, 'R')
+        pdf.cell(w_prop, 7, _gs(prop), 1, 1, 'R')
+
+    # Totales Finales
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 10)
+    pdf.cell(w_fecha + w_cliente + w_lote + w_cuota, 8, "TOTALES GENERALES:", 0, 0, 'R')
+    pdf.cell(w_monto, 8, _gs(datos['total_recaudado']), 1, 0, 'R')
+    pdf.cell(w_inmob, 8, _gs(datos['total_inmobiliaria']), 1, 0, 'R')
+    pdf.cell(w_prop, 8, _gs(datos['total_propietario']), 1, 1, 'R')
+
+    # Resumen de Liquidación
+    pdf.ln(10)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(0, 10, "RESUMEN A LIQUIDAR", 1, 1, 'C', 1)
+
+    pdf.cell(100, 10, "A FAVOR DE LA INMOBILIARIA:", 1)
+    pdf.cell(0, 10, f"Gs. {_gs(datos['total_inmobiliaria'])}", 1, 1, 'R')
+
+    pdf.cell(100, 10, "A FAVOR DEL PROPIETARIO:", 1)
+    pdf.cell(0, 10, f"Gs. {_gs(datos['total_propietario'])}", 1, 1, 'R')
+
+    return pdf.output(dest='S').encode('latin-1')
+
+def renderizar_resumen(lista, desde, hasta):
+    """PDF consolidado: una fila por fraccionamiento con lo recaudado y lo que corresponde a cada parte."""
+    pdf = _PDF('L', 'mm', 'A4')
+    pdf.titulo = 'RESUMEN DE LIQUIDACIONES'
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(40, 8, clean("Período:"), 0, 0)
+    pdf.set_font('Arial', '', 11)
+    pdf.cell(0, 8, f"Del {desde.isoformat()} al {hasta.isoformat()}", 0, 1)
+    pdf.cell(0, 5, "", 0, 1)
+
+    anchos = (80, 20, 45, 45, 45)
+    pdf.set_fill_color(200, 220, 255)
+    pdf.set_font('Arial', 'B', 9)
+    for ancho, titulo in zip(anchos, ("Fraccionamiento", "Pagos", "Recaudado", "Inmobiliaria", "Propietario")):
+        pdf.cell(ancho, 8, titulo, 1, 0, 'C', 1)
+    pdf.ln()
+
+    pdf.set_font('Arial', '', 9)
+    for d in lista:
+        pdf.cell(anchos[0], 7, clean(d['fraccionamiento'][:40]), 1)
+        pdf.cell(anchos[1], 7, str(len(d['pagos'])), 1, 0, 'C')
+        pdf.cell(anchos[2], 7, _gs(d['total_recaudado']), 1, 0, 'R')
+        pdf.cell(anchos[3], 7, _gs(d['total_inmobiliaria']), 1, 0, 'R')
+        pdf.cell(anchos[4], 7, _gs(d['total_propietario']), 1, 1, 'R')
+
+    pdf.set_font('Arial', 'B', 10)
+    pdf.cell(anchos[0], 8, "TOTALES:", 1, 0, 'R')
+    pdf.cell(anchos[1], 8, str(sum(len(d['pagos']) for d in lista)), 1, 0, 'C')
+    for ancho, clave in zip(anchos[2:], ("total_recaudado", "total_inmobiliaria", "total_propietario")):
+        pdf.cell(ancho, 8, _gs(sum(d[clave] for d in lista)), 1, 0, 'R')
+    pdf.ln()
+    return pdf.output(dest='S').encode('latin-1')
+
+def rango_mes(anio, mes):
+    desde = date(anio, mes, 1)
+    return desde, desde + relativedelta(months=1) - timedelta(days=1)
+
+def generar_mes(anio, mes, progreso=None):
+    """Liquidaciones del mes de todos los fraccionamientos con pagos.
+
+    Devuelve [(nombre_archivo, pdf)]: un PDF por fraccionamiento y el resumen consolidado al final.
+    """
+    desde, hasta = rango_mes(anio, mes)
+    lista = datos_liquidacion(desde, hasta)
+    pdfs = mapear_en_procesos(renderizar, lista, MIN_PARALELO)
+
+    archivos = []
+    for i, (datos, pdf) in enumerate(zip(lista, pdfs)):
+        archivos.append((f"liquidacion_{anio}-{mes:02d}_{datos['fraccionamiento_id']}.pdf", pdf))
+        if progreso: progreso((i + 1) * 100 / (len(lista) + 1))
+    archivos.append((f"resumen_liquidaciones_{anio}-{mes:02d}.pdf", renderizar_resumen(lista, desde, hasta)))
+    return archivos
+
+def empaquetar(archivos):
+    """Zip con los PDF generados (los PDF ya vienen comprimidos)."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as z:
+        for nombre, contenido in archivos:
+            z.writestr(nombre, contenido)
+    return buf.getvalue()
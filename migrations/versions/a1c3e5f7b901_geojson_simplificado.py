@@ -0,0 +1,32 @@
+"""geometrias simplificadas por banda de zoom
+
+Revision ID: a1c3e5f7b901
+Revises: 40f3fda60952
+Create Date: 2026-10-18 09:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b901'
+down_revision = '40f3fda60952'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('fraccionamientos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geojson_simplificado', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('lotes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geojson_simplificado', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('lotes', schema=None) as batch_op:
+        batch_op.drop_column('geojson_simplificado')
+
+    with op.batch_alter_table('fraccionamientos', schema=None) as batch_op:
+        batch_op.drop_column('geojson_simplificado')
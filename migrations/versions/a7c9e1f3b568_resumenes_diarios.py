@@ -0,0 +1,103 @@
+"""resumenes diarios de cobros, caja, gastos y servicios
+
+Revision ID: a7c9e1f3b568
+Revises: f6b8d0e2a457
+Create Date: 2026-10-18 17:20:14.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1f3b568'
+down_revision = 'f6b8d0e2a457'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumen_diario_cobros',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('fraccionamiento_id', sa.Integer(), nullable=True),
+        sa.Column('vendedor_id', sa.Integer(), nullable=True),
+        sa.Column('forma_pago_id', sa.Integer(), nullable=True),
+        sa.Column('moneda', sa.String(length=10), nullable=True),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('monto', sa.Numeric(precision=16, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_resumen_cobros_fecha_frac', 'resumen_diario_cobros', ['fecha', 'fraccionamiento_id'], unique=False)
+
+    op.create_table('resumen_diario_caja',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('caja_id', sa.Integer(), nullable=False),
+        sa.Column('tipo_movimiento', sa.String(length=20), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('monto', sa.Numeric(precision=16, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_resumen_caja_caja_fecha', 'resumen_diario_caja', ['caja_id', 'fecha'], unique=False)
+    op.create_index('ix_resumen_caja_fecha', 'resumen_diario_caja', ['fecha'], unique=False)
+
+    op.create_table('resumen_diario_gastos',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('categoria_gasto_id', sa.Integer(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('monto', sa.Numeric(precision=16, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_resumen_gastos_fecha', 'resumen_diario_gastos', ['fecha'], unique=False)
+
+    op.create_table('resumen_diario_servicios',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('servicio', sa.Text(), nullable=True),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('monto', sa.Numeric(precision=16, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_resumen_servicios_fecha', 'resumen_diario_servicios', ['fecha'], unique=False)
+
+    # Carga inicial desde el detalle (equivale a flask reconstruir-resumenes)
+    op.execute("""
+        INSERT INTO resumen_diario_cobros (fecha, fraccionamiento_id, vendedor_id, forma_pago_id, moneda, cantidad, monto)
+        SELECT DATE(p.fecha_pago), l.fraccionamiento_id, c.vendedor_id, p.forma_pago_id, COALESCE(c.moneda, 'GS'), COUNT(p.id), SUM(p.monto)
+        FROM pagos p JOIN contratos c ON p.contrato_id = c.id JOIN lotes l ON c.lote_id = l.id
+        GROUP BY DATE(p.fecha_pago), l.fraccionamiento_id, c.vendedor_id, p.forma_pago_id, COALESCE(c.moneda, 'GS')
+    """)
+    op.execute("""
+        INSERT INTO resumen_diario_caja (fecha, caja_id, tipo_movimiento, cantidad, monto)
+        SELECT DATE(fecha_hora), caja_id, tipo_movimiento, COUNT(id), SUM(monto)
+        FROM movimientos_caja
+        GROUP BY DATE(fecha_hora), caja_id, tipo_movimiento
+    """)
+    op.execute("""
+        INSERT INTO resumen_diario_gastos (fecha, categoria_gasto_id, estado, cantidad, monto)
+        SELECT fecha_factura, categoria_gasto_id, estado, COUNT(id), SUM(monto)
+        FROM gastos
+        GROUP BY fecha_factura, categoria_gasto_id, estado
+    """)
+    op.execute("""
+        INSERT INTO resumen_diario_servicios (fecha, servicio, estado, cantidad, monto)
+        SELECT fecha_vencimiento, observaciones, estado, COUNT(id), SUM(valor_cuota)
+        FROM cuotas WHERE tipo = 'servicio'
+        GROUP BY fecha_vencimiento, observaciones, estado
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_resumen_servicios_fecha', table_name='resumen_diario_servicios')
+    op.drop_table('resumen_diario_servicios')
+    op.drop_index('ix_resumen_gastos_fecha', table_name='resumen_diario_gastos')
+    op.drop_table('resumen_diario_gastos')
+    op.drop_index('ix_resumen_caja_fecha', table_name='resumen_diario_caja')
+    op.drop_index('ix_resumen_caja_caja_fecha', table_name='resumen_diario_caja')
+    op.drop_table('resumen_diario_caja')
+    op.drop_index('ix_resumen_cobros_fecha_frac', table_name='resumen_diario_cobros')
+    op.drop_table('resumen_diario_cobros')
@@ -0,0 +1,39 @@
+"""bitacora de cambios de lotes
+
+Revision ID: b2d4f6a8c013
+Revises: a1c3e5f7b901
+Create Date: 2026-10-18 10:02:17.553960
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a8c013'
+down_revision = 'a1c3e5f7b901'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lotes_cambios',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('lote_id', sa.Integer(), nullable=False),
+    sa.Column('fraccionamiento_id', sa.Integer(), nullable=False),
+    sa.Column('propiedades', sa.JSON(), nullable=False),
+    sa.Column('geometria', sa.JSON(), nullable=True),
+    sa.Column('fecha', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['fraccionamiento_id'], ['fraccionamientos.id'], ),
+    sa.ForeignKeyConstraint(['lote_id'], ['lotes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('lotes_cambios', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_lotes_cambios_fraccionamiento_id'), ['fraccionamiento_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('lotes_cambios', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_lotes_cambios_fraccionamiento_id'))
+
+    op.drop_table('lotes_cambios')
@@ -0,0 +1,26 @@
+"""indice de contratos por fecha e id
+
+Revision ID: b8d0f2a4c679
+Revises: a7c9e1f3b568
+Create Date: 2026-10-18 18:05:42.118367
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a4c679'
+down_revision = 'a7c9e1f3b568'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contratos', schema=None) as batch_op:
+        batch_op.create_index('ix_contratos_fecha_id', ['fecha_contrato', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('contratos', schema=None) as batch_op:
+        batch_op.drop_index('ix_contratos_fecha_id')
@@ -0,0 +1,38 @@
+"""metricas precalculadas de geometria
+
+Revision ID: c3e5a7b9d124
+Revises: b2d4f6a8c013
+Create Date: 2026-10-18 11:24:05.310772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e5a7b9d124'
+down_revision = 'b2d4f6a8c013'
+branch_labels = None
+depends_on = None
+
+COLUMNAS = ('area_m2', 'centroide_lat', 'centroide_lng', 'bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy')
+
+
+def upgrade():
+    for tabla in ('fraccionamientos', 'lotes'):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            for columna in COLUMNAS:
+                batch_op.add_column(sa.Column(columna, sa.Float(), nullable=True))
+
+    with op.batch_alter_table('lotes', schema=None) as batch_op:
+        batch_op.create_index('ix_lotes_bbox', ['bbox_minx', 'bbox_maxx', 'bbox_miny', 'bbox_maxy'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('lotes', schema=None) as batch_op:
+        batch_op.drop_index('ix_lotes_bbox')
+
+    for tabla in ('lotes', 'fraccionamientos'):
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            for columna in reversed(COLUMNAS):
+                batch_op.drop_column(columna)
@@ -0,0 +1,26 @@
+"""revision de fraccionamientos para la cache del mapa
+
+Revision ID: c9e1a3b5d780
+Revises: b8d0f2a4c679
+Create Date: 2026-10-18 19:12:08.530411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1a3b5d780'
+down_revision = 'b8d0f2a4c679'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('fraccionamientos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('fraccionamientos', schema=None) as batch_op:
+        batch_op.drop_column('revision')
@@ -0,0 +1,53 @@
+"""clave unica de los resumenes diarios (upsert de deltas)
+
+Revision ID: d0f2b4c6e891
+Revises: c9e1a3b5d780
+Create Date: 2026-10-18 20:41:37.118204
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0f2b4c6e891'
+down_revision = 'c9e1a3b5d780'
+branch_labels = None
+depends_on = None
+
+# tabla -> (índice único, dimensiones en el orden de resumenes.TABLAS)
+RESUMENES = {
+    'resumen_diario_cobros': ('uq_resumen_cobros_clave', ['fecha', 'fraccionamiento_id', 'vendedor_id', 'forma_pago_id', 'moneda']),
+    'resumen_diario_caja': ('uq_resumen_caja_clave', ['fecha', 'caja_id', 'tipo_movimiento']),
+    'resumen_diario_gastos': ('uq_resumen_gastos_clave', ['fecha', 'categoria_gasto_id', 'estado']),
+    'resumen_diario_servicios': ('uq_resumen_servicios_clave', ['fecha', 'servicio', 'estado']),
+}
+
+
+def _clave(valores):
+    # Igual que resumenes._clave (la fecha como AAAA-MM-DD)
+    valores = (str(valores[0])[:10], *valores[1:])
+    return hashlib.sha1(repr(tuple(None if v is None else str(v) for v in valores)).encode()).hexdigest()
+
+
+def upgrade():
+    conexion = op.get_bind()
+    for tabla, (indice, dimensiones) in RESUMENES.items():
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('clave', sa.String(length=40), nullable=True))
+        filas = conexion.execute(sa.text(f"SELECT id, {', '.join(dimensiones)} FROM {tabla}")).all()
+        if filas:
+            conexion.execute(sa.text(f"UPDATE {tabla} SET clave = :clave WHERE id = :id"),
+                             [{"id": f[0], "clave": _clave(f[1:])} for f in filas])
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.alter_column('clave', existing_type=sa.String(length=40), nullable=False)
+            batch_op.create_index(indice, ['clave'], unique=True)
+
+
+def downgrade():
+    for tabla, (indice, _) in RESUMENES.items():
+        with op.batch_alter_table(tabla, schema=None) as batch_op:
+            batch_op.drop_index(indice)
+            batch_op.drop_column('clave')
@@ -0,0 +1,26 @@
+"""indice de cuotas por estado y vencimiento
+
+Revision ID: d4f6b8c0e235
+Revises: c3e5a7b9d124
+Create Date: 2026-10-18 12:02:41.905117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6b8c0e235'
+down_revision = 'c3e5a7b9d124'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('cuotas', schema=None) as batch_op:
+        batch_op.create_index('ix_cuotas_estado_vencimiento', ['estado', 'fecha_vencimiento'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cuotas', schema=None) as batch_op:
+        batch_op.drop_index('ix_cuotas_estado_vencimiento')
@@ -0,0 +1,44 @@
+"""saldos materializados en contratos
+
+Revision ID: f6b8d0e2a457
+Revises: e5a7c9d1f346
+Create Date: 2026-10-18 14:02:51.173305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b8d0e2a457'
+down_revision = 'e5a7c9d1f346'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contratos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_cuotas', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_pagado', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('saldo', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('cuotas_vencidas', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('proxima_cuota', sa.Date(), nullable=True))
+
+    # Carga inicial de los saldos de los contratos existentes
+    op.execute("""
+        UPDATE contratos SET
+            total_cuotas = COALESCE((SELECT SUM(valor_cuota) FROM cuotas WHERE cuotas.contrato_id = contratos.id), 0),
+            total_pagado = COALESCE((SELECT SUM(monto) FROM pagos WHERE pagos.contrato_id = contratos.id), 0),
+            saldo = COALESCE((SELECT SUM(valor_cuota) FROM cuotas WHERE cuotas.contrato_id = contratos.id AND cuotas.estado != 'pagada'), 0),
+            cuotas_vencidas = (SELECT COUNT(id) FROM cuotas WHERE cuotas.contrato_id = contratos.id AND cuotas.estado = 'vencida'),
+            proxima_cuota = (SELECT MIN(fecha_vencimiento) FROM cuotas WHERE cuotas.contrato_id = contratos.id AND cuotas.estado != 'pagada')
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('contratos', schema=None) as batch_op:
+        batch_op.drop_column('proxima_cuota')
+        batch_op.drop_column('cuotas_vencidas')
+        batch_op.drop_column('saldo')
+        batch_op.drop_column('total_pagado')
+        batch_op.drop_column('total_cuotas')
@@ -0,0 +1,103 @@
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+
+import matplotlib
+matplotlib.use("Agg") # Sin display: solo se renderiza a archivo
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+from PIL import Image
+from sqlalchemy import func
+
+from extensions import db
+from geometria import a_shape
+from models import Fraccionamiento, Lote, LoteCambio
+from utils import directorio_instancia, escribir_atomico, borrar_versiones
+
+# --- MINIATURAS DEL PLANO POR ESTADO ---
+# PNG de los lotes de un fraccionamiento coloreados por estado (mismos colores
+# que el mapa). Se guardan en disco con la versión de estados en el nombre: la
+# secuencia del último LoteCambio del fraccionamiento más la cantidad de lotes
+# activos, así cualquier venta, rescisión, alta o baja genera un archivo nuevo.
+COLORES_ESTADO = {"disponible": "#2ECC71", "reservado": "#F1C40F", "vendido": "#E74C3C"}
+COLOR_RESALTADO = "#2e7dff"
+BANDA_MINIATURA = "13" # Geometría simplificada suficiente para ~800 px
+
+_lock = threading.Lock()
+
+def directorio():
+    return directorio_instancia("miniaturas", "MINIATURAS_DIR")
+
+def version_estados(fraccionamiento_id):
+    seq = db.session.query(func.max(LoteCambio.id)).filter(LoteCambio.fraccionamiento_id == fraccionamiento_id).scalar() or 0
+    n = db.session.query(func.count(Lote.id)).filter(Lote.fraccionamiento_id == fraccionamiento_id, Lote.activo == True).scalar()
+    return f"{seq}-{n}"
+
+def ruta_miniatura(fraccionamiento_id, resaltar_lote_id=None, ancho_px=800):
+    """Ruta del PNG vigente del fraccionamiento; lo dibuja solo si no existe para la versión actual.
+
+    Con `resaltar_lote_id` se marca ese lote con un borde (usado en el contrato).
+    None si el fraccionamiento no tiene lotes con geometría o si el lote a
+    resaltar no es suyo (cada lote válido genera su propio archivo; un id
+    cualquiera no debe crear uno nuevo).
+    """
+    frac = Fraccionamiento.query.get(fraccionamiento_id)
+    if frac is None: return None
+    if resaltar_lote_id and not db.session.query(Lote.query.filter_by(id=resaltar_lote_id, fraccionamiento_id=fraccionamiento_id).exists()).scalar():
+        return None
+    # El contorno del fraccionamiento también se dibuja: su geometría entra en la clave
+    huella = hashlib.sha1(json.dumps(frac.geojson, sort_keys=True).encode()).hexdigest()[:8] if frac.geojson else "0"
+    prefijo = f"frac{fraccionamiento_id}" + (f"_l{resaltar_lote_id}" if resaltar_lote_id else "") + f"_{ancho_px}"
+    ruta = os.path.join(directorio(), f"{prefijo}_{version_estados(fraccionamiento_id)}_{huella}.png")
+    if os.path.exists(ruta): return ruta
+
+    with _lock:
+        if os.path.exists(ruta): return ruta
+        png = dibujar(frac, resaltar_lote_id, ancho_px)
+        if png is None: return None
+        escribir_atomico(ruta, png)
+        # Las versiones anteriores de esta misma miniatura ya no se usan
+        borrar_versiones(os.path.join(directorio(), f"{prefijo}_*.png"), ruta)
+    return ruta
+
+def dibujar(frac, resaltar_lote_id=None, ancho_px=800):
+    """Dibuja el plano y devuelve los bytes PNG (RGB, sin canal alfa, para que FPDF lo acepte)."""
+    lotes = (db.session.query(Lote.id, Lote.estado, Lote.geojson, Lote.geojson_simplificado)
+             .filter(Lote.fraccionamiento_id == frac.id, Lote.activo == True).all())
+    poligonos, colores, resaltados = [], [], []
+    for lote_id, estado, geojson, simplificado in lotes:
+        geom = a_shape((simplificado or {}).get(BANDA_MINIATURA, geojson))
+        for anillo in _anillos(geom):
+            poligonos.append(anillo)
+            colores.append(COLORES_ESTADO.get(estado, COLORES_ESTADO["vendido"]))
+            if lote_id == resaltar_lote_id: resaltados.append(anillo)
+    if not poligonos: return None
+
+    fig = plt.figure(figsize=(ancho_px / 100, ancho_px / 100), dpi=100)
+    ax = fig.add_axes([0, 0, 1, 1])
+    contorno = _anillos(a_shape(frac.geojson))
+    if contorno:
+        ax.add_collection(PolyCollection(contorno, facecolors="#2e7dff10", edgecolors=COLOR_RESALTADO, linewidths=1))
+    ax.add_collection(PolyCollection(poligonos, facecolors=colores, edgecolors="#555555", linewidths=0.3, alpha=0.85))
+    if resaltados:
+        ax.add_collection(PolyCollection(resaltados, facecolors="none", edgecolors=COLOR_RESALTADO, linewidths=2.5))
+    ax.autoscale_view()
+    lat = frac.centroide_lat if frac.centroide_lat is not None else 0
+    ax.set_aspect(1 / max(math.cos(math.radians(lat)), 0.01)) # Corrige la escala de la longitud
+    ax.axis("off")
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", facecolor="white")
+    plt.close(fig)
+    buf.seek(0)
+    salida = io.BytesIO()
+    Image.open(buf).convert("RGB").save(salida, format="PNG", optimize=True)
+    return salida.getvalue()
+
+def _anillos(geom):
+    if geom is None or geom.is_empty: return []
+    partes = getattr(geom, "geoms", [geom])
+    return [list(p.exterior.coords) for p in partes if p.geom_type == "Polygon"]
@@ -1,6 +1,6 @@
 from extensions import db, bcrypt
 from flask_login import UserMixin
-from sqlalchemy import Enum
+from sqlalchemy import Enum, func, literal_column
 from datetime import datetime, date
 
 # --- DEFINICIONES BASE ---
@@ -117,7 +117,17 @@ class Funcionario(db.Model, UserMixin):
     def to_dict(self): return {"id": self.id, "nombre_completo": f"{self.nombre} {self.apellido}", "nombre": self.nombre, "apellido": self.apellido, "documento": self.documento, "usuario": self.usuario, "cargo_id": self.cargo_id, "cargo_nombre": self.cargo.nombre if self.cargo else "N/A", "estado": self.estado, "roles": [role.name for role in self.roles]}
 
 # --- INMOBILIARIA ---
-class Fraccionamiento(db.Model):
+class MetricasGeometria:
+    # Calculadas al guardar la geometría (geometria.derivados_geometria), evitan parsear el GeoJSON
+    area_m2 = db.Column(db.Float, nullable=True)
+    centroide_lat = db.Column(db.Float, nullable=True)
+    centroide_lng = db.Column(db.Float, nullable=True)
+    bbox_minx = db.Column(db.Float, nullable=True)
+    bbox_miny = db.Column(db.Float, nullable=True)
+    bbox_maxx = db.Column(db.Float, nullable=True)
+    bbox_maxy = db.Column(db.Float, nullable=True)
+
+class Fraccionamiento(MetricasGeometria, db.Model):
     __tablename__ = "fraccionamientos"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     ciudad_id = db.Column(db.Integer, db.ForeignKey('ciudades.id'), nullable=True)
@@ -127,12 +137,18 @@ class Fraccionamiento(db.Model):
     comision_inmobiliaria = db.Column(db.Numeric(5, 2), default=0.00)
     comision_propietario = db.Column(db.Numeric(5, 2), default=0.00)
     geojson = db.Column(db.JSON, nullable=False)
-    def to_feature(self): 
-        return {"type": "Feature", "geometry": self.geojson, "properties": {"id": self.id, "nombre": self.nombre, "descripcion": self.descripcion or "", "ciudad_id": self.ciudad_id, "ciudad_nombre": self.ciudad.nombre if self.ciudad else ""}}
+    geojson_simplificado = db.Column(db.JSON, nullable=True) # {banda_zoom: geometría simplificada}
+    # Se incrementa en cada UPDATE (versión de la caché del mapa, ver cache_mapa.version)
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("revision") + 1)
+    def geometria(self, banda=None):
+        if banda and self.geojson_simplificado: return self.geojson_simplificado.get(banda, self.geojson)
+        return self.geojson
+    def to_feature(self, banda=None): 
+        return {"type": "Feature", "geometry": self.geometria(banda), "properties": {"id": self.id, "nombre": self.nombre, "descripcion": self.descripcion or "", "ciudad_id": self.ciudad_id, "ciudad_nombre": self.ciudad.nombre if self.ciudad else ""}}
     def to_dict(self):
         return {"id": self.id, "nombre": self.nombre, "descripcion": self.descripcion or "", "ciudad_id": self.ciudad_id, "ciudad_nombre": self.ciudad.nombre if self.ciudad else "", "comision_inmobiliaria": float(self.comision_inmobiliaria or 0.0), "comision_propietario": float(self.comision_propietario or 0.0)}
 
-class Lote(db.Model):
+class Lote(MetricasGeometria, db.Model):
     __tablename__ = "lotes"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     numero_lote = db.Column(db.String(50), nullable=False)
@@ -143,14 +159,19 @@ class Lote(db.Model):
     metros_cuadrados = db.Column(db.Integer, nullable=False)
     estado = db.Column(Enum("disponible", "reservado", "vendido", name="estado_enum"), nullable=False, default="disponible")
     geojson = db.Column(db.JSON, nullable=False)
+    geojson_simplificado = db.Column(db.JSON, nullable=True) # {banda_zoom: geometría simplificada}
     fraccionamiento_id = db.Column(db.Integer, db.ForeignKey("fraccionamientos.id"), nullable=False)
     activo = db.Column(db.Boolean, default=True, nullable=False)
     fraccionamiento = db.relationship("Fraccionamiento", backref=db.backref("lotes", lazy=True, cascade="all, delete-orphan"))
     contratos = db.relationship("Contrato", backref="lote", lazy=True)
     lista_precios = db.relationship("ListaPrecioLote", backref="lote", lazy=True, cascade="all, delete-orphan")
-    def to_feature(self): return {"type": "Feature", "geometry": self.geojson, "properties": {"id": self.id, "numero_lote": self.numero_lote, "manzana": self.manzana, "precio": float(self.precio), "precio_financiado_130": float(self.precio_financiado_130) if self.precio_financiado_130 else None, "precio_cuota_130": float(self.precio_cuota_130) if self.precio_cuota_130 else None, "metros_cuadrados": self.metros_cuadrados, "estado": self.estado, "fraccionamiento_id": self.fraccionamiento_id}}
+    def geometria(self, banda=None):
+        if banda and self.geojson_simplificado: return self.geojson_simplificado.get(banda, self.geojson)
+        return self.geojson
+    def to_feature(self, banda=None): return {"type": "Feature", "geometry": self.geometria(banda), "properties": {"id": self.id, "numero_lote": self.numero_lote, "manzana": self.manzana, "precio": float(self.precio), "precio_financiado_130": float(self.precio_financiado_130) if self.precio_financiado_130 else None, "precio_cuota_130": float(self.precio_cuota_130) if self.precio_cuota_130 else None, "metros_cuadrados": self.metros_cuadrados, "estado": self.estado, "fraccionamiento_id": self.fraccionamiento_id}}
     __table_args__ = (
         db.UniqueConstraint('fraccionamiento_id', 'manzana', 'numero_lote', name='uq_lote_manzana_fracc'),
+        db.Index('ix_lotes_bbox', 'bbox_minx', 'bbox_maxx', 'bbox_miny', 'bbox_maxy'),
     )
     def to_dict(self):
         return {
@@ -162,6 +183,31 @@ class Lote(db.Model):
             'estado': self.estado
         }
 
+class LoteCambio(db.Model):
+    # Bitácora de cambios de lotes para el feed incremental del mapa (id = secuencia)
+    __tablename__ = "lotes_cambios"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    lote_id = db.Column(db.Integer, db.ForeignKey("lotes.id"), nullable=False)
+    fraccionamiento_id = db.Column(db.Integer, db.ForeignKey("fraccionamientos.id"), nullable=False, index=True)
+    propiedades = db.Column(db.JSON, nullable=False) # Solo las propiedades que cambiaron
+    geometria = db.Column(db.JSON, nullable=True)    # Solo si cambió la geometría
+    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Ids recientes que se vuelven a revisar: una transacción puede confirmar un id
+    # menor después de que otra ya confirmó uno mayor
+    VENTANA = 1000
+
+    @classmethod
+    def secuencia(cls, fraccionamiento_id=None):
+        """(último id, cambios con id dentro de la VENTANA) de la bitácora, de un fraccionamiento o de todos.
+
+        Sirve de versión de los datos de lotes compartida por todos los procesos.
+        """
+        filtro = [cls.fraccionamiento_id == fraccionamiento_id] if fraccionamiento_id else []
+        ultimo = db.session.query(func.max(cls.id)).filter(*filtro).scalar() or 0
+        recientes = db.session.query(func.count(cls.id)).filter(*filtro, cls.id > ultimo - cls.VENTANA).scalar()
+        return (ultimo, recientes)
+
 class ListaPrecioLote(db.Model):
     __tablename__ = 'lista_precio_lote'
     id = db.Column(db.Integer, primary_key=True)
@@ -225,9 +271,19 @@ class Contrato(db.Model):
     estado = db.Column(Enum("activo", "cancelado", "finalizado", "rescindido", "inactivo", name="estado_contrato_enum"), nullable=False, default="activo")
     observaciones = db.Column(db.Text, nullable=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    # Saldos materializados: los mantiene saldos.actualizar() en la misma transacción
+    # que cada alta, pago o rescisión (ver también `flask verificar-saldos`)
+    total_cuotas = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_pagado = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    saldo = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    cuotas_vencidas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_cuota = db.Column(db.Date, nullable=True)
     cuotas = db.relationship("Cuota", backref="contrato", lazy=True, cascade="all, delete-orphan")
     pagos = db.relationship("Pago", backref="contrato", lazy=True, cascade="all, delete-orphan")
     vendedor = db.relationship("Funcionario")
+    __table_args__ = (
+        db.Index('ix_contratos_fecha_id', 'fecha_contrato', 'id'),
+    )
 
     def to_dict(self): 
         return {
@@ -246,6 +302,11 @@ class Contrato(db.Model):
             "uso": self.uso,
             "moneda": self.moneda,
             "doc_identidad": self.doc_identidad,
+            "total_cuotas": float(self.total_cuotas or 0),
+            "total_pagado": float(self.total_pagado or 0),
+            "saldo": float(self.saldo or 0),
+            "cuotas_vencidas": self.cuotas_vencidas or 0,
+            "proxima_cuota": self.proxima_cuota.isoformat() if self.proxima_cuota else None,
             "cliente_nombre": f"{self.cliente.nombre} {self.cliente.apellido}", 
             "lote_info": f"{self.lote.manzana} - {self.lote.numero_lote}", 
             "fraccionamiento": self.lote.fraccionamiento.nombre
@@ -264,6 +325,9 @@ class Cuota(db.Model):
     tipo = db.Column(db.String(20), default='cuota')
     observaciones = db.Column(db.Text, nullable=True)
     pagos = db.relationship("Pago", backref="cuota", lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (
+        db.Index('ix_cuotas_estado_vencimiento', 'estado', 'fecha_vencimiento'),
+    )
     def to_dict(self): 
         return {
             "id": self.id, 
@@ -294,6 +358,9 @@ class Pago(db.Model):
     usuario_id = db.Column(db.Integer, db.ForeignKey('funcionarios.id'), nullable=True)
     cuenta_bancaria_id = db.Column(db.Integer, db.ForeignKey('cuentas_bancarias.id'), nullable=True)
     cuenta_bancaria = db.relationship('CuentaBancaria')
+    __table_args__ = (
+        db.Index('ix_pagos_fecha_id', 'fecha_pago', 'id'),
+    )
     def to_dict(self): return {"id": self.id, "contrato_id": self.contrato_id, "cuota_id": self.cuota_id, "fecha_pago": self.fecha_pago.isoformat() if self.fecha_pago else None, "monto": float(self.monto), "forma_pago_id": self.forma_pago_id, "forma_pago": self.forma_pago_rel.nombre if self.forma_pago_rel else "N/A", "referencia": self.referencia, "observaciones": self.observaciones, "cuenta_bancaria_id": self.cuenta_bancaria_id, "usuario_id": self.usuario_id}
 
 class Caja(db.Model):
@@ -469,4 +536,55 @@ class AuditLog(db.Model):
             "tabla": self.tabla,
             "detalle": self.detalle,
             "ip_address": self.ip_address
-        }
\ No newline at end of file
+        }
+# --- RESÚMENES DIARIOS ---
+# Totales por día y dimensión, mantenidos por resumenes.py dentro de la misma
+# transacción que modifica el detalle. `clave` es el hash del día y las
+# dimensiones (única: las deltas se aplican con INSERT ... ON DUPLICATE KEY
+# UPDATE). Sin claves foráneas: se reconstruyen desde las tablas de origen
+# (flask reconstruir-resumenes).
+class ResumenDiarioCobro(db.Model):
+    __tablename__ = 'resumen_diario_cobros'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    clave = db.Column(db.String(40), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+    fraccionamiento_id = db.Column(db.Integer, nullable=True)
+    vendedor_id = db.Column(db.Integer, nullable=True)
+    forma_pago_id = db.Column(db.Integer, nullable=True)
+    moneda = db.Column(db.String(10), nullable=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    monto = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    __table_args__ = (db.Index('uq_resumen_cobros_clave', 'clave', unique=True), db.Index('ix_resumen_cobros_fecha_frac', 'fecha', 'fraccionamiento_id'))
+
+class ResumenDiarioCaja(db.Model):
+    __tablename__ = 'resumen_diario_caja'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    clave = db.Column(db.String(40), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+    caja_id = db.Column(db.Integer, nullable=False)
+    tipo_movimiento = db.Column(db.String(20), nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    monto = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    __table_args__ = (db.Index('uq_resumen_caja_clave', 'clave', unique=True), db.Index('ix_resumen_caja_caja_fecha', 'caja_id', 'fecha'), db.Index('ix_resumen_caja_fecha', 'fecha'))
+
+class ResumenDiarioGasto(db.Model):
+    __tablename__ = 'resumen_diario_gastos'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    clave = db.Column(db.String(40), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+    categoria_gasto_id = db.Column(db.Integer, nullable=False)
+    estado = db.Column(db.String(20), nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    monto = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    __table_args__ = (db.Index('uq_resumen_gastos_clave', 'clave', unique=True), db.Index('ix_resumen_gastos_fecha', 'fecha'))
+
+class ResumenDiarioServicio(db.Model):
+    __tablename__ = 'resumen_diario_servicios'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    clave = db.Column(db.String(40), nullable=False)
+    fecha = db.Column(db.Date, nullable=False) # Vencimiento de la cuota de servicio
+    servicio = db.Column(db.Text, nullable=True)
+    estado = db.Column(db.String(20), nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    monto = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    __table_args__ = (db.Index('uq_resumen_servicios_clave', 'clave', unique=True), db.Index('ix_resumen_servicios_fecha', 'fecha'))
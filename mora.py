@@ -0,0 +1,106 @@
+import numpy as np
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, update
+
+from extensions import db
+from models import Cuota, Contrato, Cliente, Lote, Fraccionamiento
+from utils import get_param
+import saldos
+import resumenes
+
+# --- MOTOR DE MORA ---
+# Interés diario sobre el valor de la cuota, solo para cuotas tipo 'cuota' con
+# más de DIAS_GRACIA días de atraso (se cobra por todos los días, no solo por
+# los posteriores a la gracia). La tasa sale del parámetro INTERES_MORA_DIARIO.
+# Los cálculos son vectoriales: un arreglo NumPy por columna, sin bucles por cuota.
+DIAS_GRACIA = 90
+TASA_DEFECTO = "0.0275"
+
+def tasa_diaria():
+    try:
+        return float(str(get_param('INTERES_MORA_DIARIO', TASA_DEFECTO)).replace(',', '.'))
+    except ValueError:
+        return float(TASA_DEFECTO)
+
+def calcular(valores, vencimientos, tipos, fecha=None, tasa=None):
+    """Mora de un conjunto de cuotas en una sola pasada.
+
+    `valores`, `vencimientos` (date) y `tipos` son secuencias paralelas.
+    Devuelve un dict de arreglos: dias_atraso (>= 0), interes y total.
+    """
+    fecha = np.datetime64(fecha or date.today(), 'D')
+    tasa = tasa_diaria() if tasa is None else tasa
+    valores = np.asarray(valores, dtype=float)
+    vencimientos = np.asarray(vencimientos, dtype='datetime64[D]')
+    tipos = np.asarray(tipos, dtype=object)
+    dias = (fecha - vencimientos).astype(np.int64)
+    con_mora = (dias > DIAS_GRACIA) & (tipos == 'cuota')
+    interes = np.round(np.where(con_mora, valores * tasa * dias, 0.0), 2)
+    return {"dias_atraso": np.maximum(dias, 0), "interes": interes, "total": valores + interes}
+
+def calcular_cuotas(cuotas, fecha=None, tasa=None):
+    """Igual que calcular() pero a partir de objetos Cuota ya cargados."""
+    return calcular([c.valor_cuota for c in cuotas], [c.fecha_vencimiento for c in cuotas],
+                    [c.tipo for c in cuotas], fecha, tasa)
+
+def a_decimal(valor):
+    """Float del motor -> Decimal con 2 decimales, para montos que se guardan en la BD."""
+    return Decimal(str(round(float(valor), 2)))
+
+def cartera_vencida(fecha=None, cliente_id=None, fraccionamiento_id=None):
+    """Cuotas impagas vencidas a `fecha` con su mora, leídas con una sola consulta de columnas.
+
+    Devuelve (filas, mora): filas son Row con los datos de cuota, contrato, cliente
+    y lote; mora es el dict de arreglos de calcular(), en el mismo orden.
+    """
+    fecha = fecha or date.today()
+    q = (select(Cuota.id, Cuota.numero_cuota, Cuota.tipo, Cuota.fecha_vencimiento, Cuota.valor_cuota,
+                Contrato.id.label('contrato_id'), Contrato.numero_contrato, Contrato.moneda,
+                Cliente.id.label('cliente_id'), Cliente.documento, Cliente.nombre, Cliente.apellido, Cliente.telefono,
+                Fraccionamiento.nombre.label('fraccionamiento'), Lote.manzana, Lote.numero_lote)
+         .join(Contrato, Cuota.contrato_id == Contrato.id)
+         .join(Cliente, Contrato.cliente_id == Cliente.id)
+         .join(Lote, Contrato.lote_id == Lote.id)
+         .join(Fraccionamiento, Lote.fraccionamiento_id == Fraccionamiento.id)
+         .where(Cuota.estado.in_(['pendiente', 'vencida']), Cuota.fecha_vencimiento < fecha)
+         .order_by(Cliente.apellido, Cliente.nombre, Contrato.numero_contrato, Cuota.fecha_vencimiento))
+    if cliente_id:
+        q = q.where(Contrato.cliente_id == cliente_id)
+    if fraccionamiento_id:
+        q = q.where(Lote.fraccionamiento_id == fraccionamiento_id)
+    filas = db.session.execute(q).all()
+    mora = calcular([f.valor_cuota for f in filas], [f.fecha_vencimiento for f in filas], [f.tipo for f in filas], fecha)
+    return filas, mora
+
+# --- BARRIDO DE CUOTAS VENCIDAS ---
+def marcar_vencidas(fecha=None, tam_bloque=1000):
+    """Pasa a 'vencida' las cuotas pendientes con vencimiento anterior a `fecha`, por bloques.
+
+    Cada bloque se confirma por separado: si el proceso se corta, la próxima
+    ejecución sigue donde quedó (las ya marcadas no vuelven a cumplir el filtro).
+    Devuelve la cantidad de cuotas marcadas.
+    """
+    fecha = fecha or date.today()
+    total, ultimo_id = 0, 0
+    while True:
+        filas = db.session.execute(
+            select(Cuota.id, Cuota.contrato_id, Cuota.fecha_vencimiento, Cuota.tipo)
+            .where(Cuota.estado == 'pendiente', Cuota.fecha_vencimiento < fecha, Cuota.id > ultimo_id)
+            .order_by(Cuota.id).limit(tam_bloque)
+        ).all()
+        if not filas:
+            break
+        ids = [f.id for f in filas]
+        servicios = [f.id for f in filas if f.tipo == 'servicio']
+        if servicios: resumenes.anotar("servicios", -1, Cuota.id.in_(servicios))
+        resultado = db.session.execute(
+            update(Cuota).where(Cuota.id.in_(ids), Cuota.estado == 'pendiente')
+            .values(estado='vencida').execution_options(synchronize_session=False)
+        )
+        saldos.actualizar({f.contrato_id for f in filas})
+        if servicios: resumenes.anotar("servicios", 1, Cuota.id.in_(servicios))
+        db.session.commit()
+        total += resultado.rowcount
+        ultimo_id = ids[-1]
+    return total
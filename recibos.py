@@ -0,0 +1,90 @@
+import hashlib
+import io
+import json
+import os
+
+from fpdf import FPDF
+from num2words import num2words
+from sqlalchemy.orm import joinedload
+
+from models import Pago, Contrato
+from utils import clean, directorio_instancia, escribir_atomico, borrar_versiones, mapear_en_procesos
+
+# --- RECIBOS DE PAGO ---
+# Cada recibo se guarda en disco como recibo_<pago_id>_<huella>.pdf, donde la
+# huella resume los datos impresos (si cambia p. ej. el nombre del cliente, el
+# recibo se vuelve a generar). Las reimpresiones por lote renderizan solo los
+# que faltan, en un pool de procesos, y unen los PDF cacheados en un solo archivo.
+MIN_PARALELO = 8 # Por debajo de esto no compensa repartir entre procesos
+
+def consulta_pagos():
+    """Pago.query con contrato, cliente y cuota en el mismo SELECT: todo lo que imprime el recibo."""
+    return Pago.query.options(joinedload(Pago.contrato).joinedload(Contrato.cliente), joinedload(Pago.cuota))
+
+def datos_recibo(pago):
+    """Datos planos (serializables) que se imprimen en el recibo de un Pago."""
+    cliente = pago.contrato.cliente
+    return {
+        "pago_id": pago.id,
+        "cliente": f"{cliente.nombre} {cliente.apellido}",
+        "monto": int(pago.monto),
+        "tipo": pago.cuota.tipo if pago.cuota else "",
+        "numero_cuota": pago.cuota.numero_cuota if pago.cuota else "",
+        "observaciones": (pago.cuota.observaciones or '') if pago.cuota else "",
+    }
+
+def renderizar(datos):
+    """PDF del recibo a partir de los datos de datos_recibo()."""
+    try: letras = num2words(datos["monto"], lang='es')
+    except: letras = str(datos["monto"])
+
+    class PDF(FPDF):
+        def header(self): self.set_font('Arial','B',14); self.cell(0,10,'RECIBO DE DINERO',0,1,'C')
+
+    pdf = PDF(); pdf.add_page(); pdf.set_font('Arial','',12)
+    pdf.cell(0,10, clean(f"Recibí de: {datos['cliente']}"), 0, 1)
+    pdf.cell(0,10, clean(f"La suma de: {letras.upper()} GUARANIES"), 0, 1)
+    pdf.cell(0,10, clean(f"Concepto: Pago de {datos['tipo']} N° {datos['numero_cuota']} ({datos['observaciones']})"), 0, 1)
+    pdf.cell(0,10, f"Monto: {datos['monto']:,}", 0, 1)
+    return pdf.output(dest='S').encode('latin-1')
+
+def directorio():
+    return directorio_instancia("recibos", "RECIBOS_DIR")
+
+def _ruta(datos):
+    huella = hashlib.sha1(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest()[:10]
+    return os.path.join(directorio(), f"recibo_{datos['pago_id']}_{huella}.pdf")
+
+def _guardar(datos, ruta, pdf):
+    escribir_atomico(ruta, pdf)
+    borrar_versiones(os.path.join(directorio(), f"recibo_{datos['pago_id']}_*.pdf"), ruta)
+
+def obtener(pago):
+    """PDF del recibo de un Pago (cargado con consulta_pagos()), desde la caché en disco o renderizado en el momento."""
+    datos = datos_recibo(pago)
+    ruta = _ruta(datos)
+    if os.path.exists(ruta):
+        with open(ruta, "rb") as f: return f.read()
+    pdf = renderizar(datos)
+    _guardar(datos, ruta, pdf)
+    return pdf
+
+def obtener_lote(pagos):
+    """Un solo PDF con los recibos de todos los pagos, en el orden recibido."""
+    import pypdfium2 as pdfium
+
+    lista = [(datos, _ruta(datos)) for datos in map(datos_recibo, pagos)]
+    faltantes = [(datos, ruta) for datos, ruta in lista if not os.path.exists(ruta)]
+    pdfs = mapear_en_procesos(renderizar, [d for d, _ in faltantes], MIN_PARALELO, chunksize=16)
+    for (datos, ruta), pdf in zip(faltantes, pdfs):
+        _guardar(datos, ruta, pdf)
+
+    salida = pdfium.PdfDocument.new()
+    for _, ruta in lista:
+        origen = pdfium.PdfDocument(ruta)
+        salida.import_pages(origen)
+        origen.close()
+    buf = io.BytesIO()
+    salida.save(buf)
+    salida.close()
+    return buf.getvalue()
@@ -0,0 +1,184 @@
+import hashlib
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, insert, delete, func, event, inspect, DateTime
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import (Pago, Contrato, Lote, MovimientoCaja, Gasto, Cuota,
+                    ResumenDiarioCobro, ResumenDiarioCaja, ResumenDiarioGasto, ResumenDiarioServicio)
+
+# --- RESÚMENES DIARIOS (TABLAS DE HECHOS) ---
+# Una fila por día y dimensión con la cantidad y el monto de cobros, movimientos
+# de caja, gastos y cuotas de servicio. Los reportes por rango leen estas tablas
+# en lugar del detalle. Mantenimiento por deltas: antes del flush se leen (con
+# bloqueo) las filas del detalle que se van a modificar o borrar y se restan;
+# después del flush se leen las nuevas o modificadas y se suman. Antes del commit
+# las deltas acumuladas se aplican con un upsert por fila de resumen
+# (monto = monto + delta), en la misma transacción. Las escrituras masivas que no
+# pasan por el ORM llaman a anotar(). Solo reconstruir() recalcula días enteros.
+
+def _cobros():
+    return (
+        select(func.date(Pago.fecha_pago).label("fecha"), Lote.fraccionamiento_id, Contrato.vendedor_id, Pago.forma_pago_id,
+               func.coalesce(Contrato.moneda, 'GS').label("moneda"), Pago.monto)
+        .select_from(Pago)
+        .join(Contrato, Pago.contrato_id == Contrato.id)
+        .join(Lote, Contrato.lote_id == Lote.id)
+    )
+
+def _caja():
+    return select(func.date(MovimientoCaja.fecha_hora).label("fecha"), MovimientoCaja.caja_id, MovimientoCaja.tipo_movimiento, MovimientoCaja.monto)
+
+def _gastos():
+    return select(Gasto.fecha_factura, Gasto.categoria_gasto_id, Gasto.estado, Gasto.monto)
+
+def _servicios():
+    return (
+        select(Cuota.fecha_vencimiento, Cuota.observaciones, Cuota.estado, Cuota.valor_cuota)
+        .where(Cuota.tipo == 'servicio')
+    )
+
+# nombre -> (tabla de hechos, dimensiones, filas del detalle (dimensiones..., monto), (modelo, columna de fecha))
+TABLAS = {
+    "cobros": (ResumenDiarioCobro, ["fecha", "fraccionamiento_id", "vendedor_id", "forma_pago_id", "moneda"], _cobros, (Pago, "fecha_pago")),
+    "caja": (ResumenDiarioCaja, ["fecha", "caja_id", "tipo_movimiento"], _caja, (MovimientoCaja, "fecha_hora")),
+    "gastos": (ResumenDiarioGasto, ["fecha", "categoria_gasto_id", "estado"], _gastos, (Gasto, "fecha_factura")),
+    "servicios": (ResumenDiarioServicio, ["fecha", "servicio", "estado"], _servicios, (Cuota, "fecha_vencimiento")),
+}
+_POR_MODELO = {fuente[0]: nombre for nombre, (_, _, _, fuente) in TABLAS.items()}
+
+def anotar(tabla, signo, *condiciones, sesion=None):
+    """Suma (signo=1) o resta (signo=-1) al resumen las filas del detalle que cumplen `condiciones`; se aplica al hacer commit.
+
+    Para escrituras que no pasan por el ORM: llamar con -1 antes de modificar o
+    borrar las filas y con 1 después de modificarlas o insertarlas.
+    """
+    sesion = sesion or db.session
+    _, _, filas, (origen, _) = TABLAS[tabla]
+    q = filas().where(*condiciones)
+    if signo < 0:
+        q = q.with_for_update() # La imagen anterior no cambia hasta que esta transacción escriba
+    deltas = sesion.info.setdefault("resumenes_deltas", {}).setdefault(tabla, {})
+    for *dimensiones, monto in sesion.execute(q):
+        acumulado = deltas.setdefault((_dia(dimensiones[0]), *dimensiones[1:]), [0, 0])
+        acumulado[0] += signo
+        acumulado[1] += signo * (monto or 0)
+
+def reconstruir(tabla, desde=None, hasta=None, dias_bloque=31):
+    """Recalcula `tabla` por bloques de días, confirmando cada bloque. Sin rango, la tabla completa. Devuelve las filas resultantes."""
+    modelo, dimensiones, filas, (origen, campo) = TABLAS[tabla]
+    columna = getattr(origen, campo)
+    completa = desde is None and hasta is None
+    if desde is None or hasta is None:
+        minimo, maximo = db.session.execute(select(func.min(columna), func.max(columna))).one()
+        desde = desde or (_dia(minimo) if minimo else None)
+        hasta = hasta or (_dia(maximo) if maximo else None)
+    if completa:
+        # Días que ya no tienen detalle
+        q = delete(modelo)
+        if desde and hasta: q = q.where((modelo.fecha < desde) | (modelo.fecha > hasta))
+        db.session.execute(q)
+        db.session.commit()
+    inicio = desde
+    while inicio and hasta and inicio <= hasta:
+        fin = min(inicio + timedelta(days=dias_bloque - 1), hasta)
+        detalle = filas().where(*_rango(columna, inicio, fin)).subquery()
+        *grupo, monto = detalle.c
+        resultado = db.session.execute(select(*grupo, func.count(), func.sum(monto)).group_by(*grupo)).all()
+        db.session.execute(delete(modelo).where(modelo.fecha >= inicio, modelo.fecha <= fin))
+        if resultado:
+            db.session.execute(insert(modelo.__table__), [
+                _fila(dimensiones, (_dia(f[0]), *f[1:-2]), f[-2], f[-1]) for f in resultado
+            ])
+        db.session.commit()
+        inicio = fin + timedelta(days=1)
+    return db.session.execute(select(func.count(modelo.id))).scalar()
+
+@event.listens_for(Session, "before_flush")
+def _restar_anteriores(sesion, contexto, instancias):
+    tocados = _tocados(sesion, (*sesion.dirty, *sesion.deleted))
+    for tabla, ids in tocados.items():
+        origen = TABLAS[tabla][3][0]
+        anotar(tabla, -1, origen.id.in_(ids), sesion=sesion)
+    sesion.info["resumenes_anteriores"] = tocados
+
+@event.listens_for(Session, "after_flush")
+def _sumar_nuevas(sesion, contexto):
+    # Las modificadas son las mismas que se restaron: un objeto que otro
+    # before_flush ensucie después no debe sumarse sin haberse restado
+    tocados = sesion.info.pop("resumenes_anteriores", {})
+    for tabla, ids in _tocados(sesion, sesion.new).items():
+        tocados.setdefault(tabla, set()).update(ids)
+    borrados = {(type(obj), obj.id) for obj in sesion.deleted}
+    for tabla, ids in tocados.items():
+        origen = TABLAS[tabla][3][0]
+        ids = [i for i in ids if (origen, i) not in borrados]
+        if ids: anotar(tabla, 1, origen.id.in_(ids), sesion=sesion)
+
+@event.listens_for(Session, "before_commit")
+def _aplicar_deltas(sesion):
+    if sesion.new or sesion.dirty or sesion.deleted:
+        sesion.flush() # Lo que quede pendiente también anota sus deltas
+    for tabla, deltas in sesion.info.pop("resumenes_deltas", {}).items():
+        _aplicar(sesion, tabla, deltas)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _al_deshacer(sesion, transaccion_previa):
+    sesion.info.pop("resumenes_deltas", None)
+    sesion.info.pop("resumenes_anteriores", None)
+
+def _aplicar(sesion, tabla, deltas):
+    modelo, dimensiones, _, _ = TABLAS[tabla]
+    filas = [_fila(dimensiones, d, cantidad, monto) for d, (cantidad, monto) in deltas.items() if cantidad or monto]
+    if not filas: return
+    filas.sort(key=lambda f: f["clave"]) # Mismo orden en todas las transacciones: sin bloqueos cruzados
+    t = modelo.__table__
+    if sesion.get_bind().dialect.name == "mysql":
+        q = mysql.insert(t).values(filas)
+        q = q.on_duplicate_key_update(cantidad=t.c.cantidad + q.inserted.cantidad, monto=t.c.monto + q.inserted.monto)
+    else: # SQLite (pruebas)
+        q = sqlite.insert(t).values(filas)
+        q = q.on_conflict_do_update(index_elements=[t.c.clave],
+                                    set_={"cantidad": t.c.cantidad + q.excluded.cantidad, "monto": t.c.monto + q.excluded.monto})
+    sesion.execute(q)
+    sesion.execute(delete(modelo).where(modelo.clave.in_([f["clave"] for f in filas]), modelo.cantidad <= 0))
+
+def _tocados(sesion, objetos):
+    """IDs por tabla de los objetos de detalle que cambian el resumen."""
+    tocados = {}
+    for obj in objetos:
+        tabla = _POR_MODELO.get(type(obj))
+        if not tabla: continue
+        if obj in sesion.dirty and not sesion.is_modified(obj): continue
+        if isinstance(obj, Cuota) and not _puede_ser_servicio(inspect(obj)): continue
+        tocados.setdefault(tabla, set()).add(obj.id)
+    return tocados
+
+def _puede_ser_servicio(estado):
+    # Tipo actual o anterior (una cuota que deja de ser de servicio también cambia
+    # el resumen). Si no está cargado, la consulta de detalle filtra.
+    historial = estado.attrs.tipo.history
+    tipos = {*historial.added, *historial.unchanged, *historial.deleted}
+    return not tipos or 'servicio' in tipos
+
+def _fila(dimensiones, valores, cantidad, monto):
+    return {**dict(zip(dimensiones, valores)), "clave": _clave(valores), "cantidad": cantidad, "monto": monto}
+
+def _clave(valores):
+    """Hash del día y las dimensiones: admite NULL y textos largos en un índice único."""
+    return hashlib.sha1(repr(tuple(None if v is None else str(v) for v in valores)).encode()).hexdigest()
+
+def _rango(columna, desde, hasta):
+    if isinstance(columna.type, DateTime):
+        return columna >= _inicio(desde), columna < _inicio(hasta + timedelta(days=1))
+    return columna >= desde, columna <= hasta
+
+def _dia(valor):
+    if isinstance(valor, datetime): return valor.date()
+    if isinstance(valor, date): return valor
+    return date.fromisoformat(str(valor)[:10])
+
+def _inicio(dia):
+    return datetime.combine(dia, datetime.min.time())
@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from models import Funcionario, Lote, Cliente, Contrato
+from models import Funcionario, Lote, Cliente, Contrato, Fraccionamiento
 from utils import role_required, registrar_auditoria # <--- IMPORTAR
 
 bp = Blueprint('auth', __name__)
@@ -20,16 +20,16 @@ def login():
             if user.estado == 'activo':
                 login_user(user)
                 # --- AUDITORÍA DE LOGIN ---
-                registrar_auditoria("LOGIN", "Sistema", f"Inicio de sesión exitoso: {user.usuario}")
+                registrar_auditoria("LOGIN", "Sistema", f"Inicio de sesión exitoso: {user.usuario}", diferido=True)
                 return redirect(request.args.get('next') or url_for('auth.admin_dashboard'))
             else: 
                 flash("Este usuario está inactivo.", "warning")
                 # Opcional: Auditar intento fallido de usuario inactivo
-                registrar_auditoria("LOGIN_FAIL", "Sistema", f"Intento de acceso usuario inactivo: {request.form.get('username')}")
+                registrar_auditoria("LOGIN_FAIL", "Sistema", f"Intento de acceso usuario inactivo: {request.form.get('username')}", diferido=True)
         else: 
             flash("Usuario o contraseña incorrectos.", "danger")
             # Opcional: Auditar intento fallido
-            registrar_auditoria("LOGIN_FAIL", "Sistema", f"Credenciales inválidas: {request.form.get('username')}")
+            registrar_auditoria("LOGIN_FAIL", "Sistema", f"Credenciales inválidas: {request.form.get('username')}", diferido=True)
             
     return render_template("login.html")
 
@@ -40,7 +40,7 @@ def logout():
     usuario = current_user.usuario
     logout_user()
     # --- AUDITORÍA DE LOGOUT ---
-    registrar_auditoria("LOGOUT", "Sistema", f"Cierre de sesión: {usuario}")
+    registrar_auditoria("LOGOUT", "Sistema", f"Cierre de sesión: {usuario}", diferido=True)
     return redirect(url_for("auth.index"))
 
 @bp.route("/admin/dashboard")
@@ -52,7 +52,8 @@ def admin_dashboard():
         "reservados": Lote.query.filter_by(estado="reservado").count(), 
         "vendidos": Lote.query.filter_by(estado="vendido").count(),
         "total_clientes": Cliente.query.count(), 
-        "contratos_activos": Contrato.query.filter_by(estado="activo").count()
+        "contratos_activos": Contrato.query.filter_by(estado="activo").count(),
+        "fraccionamientos": Fraccionamiento.query.order_by(Fraccionamiento.nombre).all()
     }
     return render_template("dashboard.html", **stats)
 
@@ -3,7 +3,7 @@ from flask_login import login_required
 from extensions import db
 from models import FormaPago, TipoCliente, TipoComprobante, Profesion, TipoDocumento, Ciudad, Barrio, CondicionPago, Impuesto, Talonario, ParametroSistema, Cotizacion, Aplicacion, Role
 from datetime import datetime
-from utils import admin_required, role_required, registrar_auditoria
+from utils import admin_required, role_required, registrar_auditoria, invalidar_parametros
 
 bp = Blueprint('base', __name__)
 
@@ -28,8 +28,9 @@ def create_api_for_simple_model(model_class, endpoint):
             else:
                 new_obj = model_class(nombre=data['nombre'])
                 
-            db.session.add(new_obj); db.session.commit()
+            db.session.add(new_obj)
             registrar_auditoria("CREAR", endpoint, f"Nuevo registro: {new_obj.nombre}")
+            db.session.commit()
             return jsonify(new_obj.to_dict()), 201
         
         query = model_class.query
@@ -52,13 +53,14 @@ def create_api_for_simple_model(model_class, endpoint):
             data = request.json
             if 'nombre' in data: obj.nombre = data.get('nombre', obj.nombre)
             if endpoint == 'barrios' and 'ciudad_id' in data: obj.ciudad_id = data['ciudad_id']
-            db.session.commit()
             registrar_auditoria("EDITAR", endpoint, f"Edición ID {obj_id}")
+            db.session.commit()
             return jsonify(obj.to_dict())
             
         if request.method == "DELETE":
-            db.session.delete(obj); db.session.commit()
+            db.session.delete(obj)
             registrar_auditoria("ELIMINAR", endpoint, f"Eliminación ID {obj_id}")
+            db.session.commit()
             return jsonify({"message": "Eliminado correctamente"})
 
 # Creación dinámica de endpoints
@@ -77,8 +79,9 @@ def api_condiciones_pago():
     if request.method == "POST":
         data = request.json
         new_obj = CondicionPago(nombre=data['nombre'], dias=data.get('dias', 0))
-        db.session.add(new_obj); db.session.commit()
+        db.session.add(new_obj)
         registrar_auditoria("CREAR", "CondicionPago", f"Nueva: {new_obj.nombre}")
+        db.session.commit()
         return jsonify(new_obj.to_dict()), 201
     return jsonify([obj.to_dict() for obj in CondicionPago.query.all()])
 
@@ -97,13 +100,14 @@ def api_condicion_pago_detalle(obj_id):
         data = request.json
         obj.nombre = data.get('nombre', obj.nombre)
         obj.dias = data.get('dias', obj.dias)
-        db.session.commit()
         registrar_auditoria("EDITAR", "CondicionPago", f"Edición ID {obj_id}")
+        db.session.commit()
         return jsonify(obj.to_dict())
         
     if request.method == "DELETE":
-        db.session.delete(obj); db.session.commit()
+        db.session.delete(obj)
         registrar_auditoria("ELIMINAR", "CondicionPago", f"Baja ID {obj_id}")
+        db.session.commit()
         return jsonify({"message": "Eliminado correctamente"})
 
 @bp.route("/api/admin/impuestos", methods=["GET", "POST"])
@@ -113,8 +117,9 @@ def api_impuestos():
     if request.method == "POST":
         data = request.json
         obj = Impuesto(nombre=data['nombre'], porcentaje=data['porcentaje'])
-        db.session.add(obj); db.session.commit()
+        db.session.add(obj)
         registrar_auditoria("CREAR", "Impuesto", f"Nuevo: {obj.nombre}")
+        db.session.commit()
         return jsonify(obj.to_dict()), 201
     return jsonify([o.to_dict() for o in Impuesto.query.all()])
 
@@ -129,12 +134,13 @@ def api_impuesto_detalle(obj_id):
         data = request.json
         obj.nombre = data.get('nombre', obj.nombre)
         obj.porcentaje = data.get('porcentaje', obj.porcentaje)
-        db.session.commit()
         registrar_auditoria("EDITAR", "Impuesto", f"Edición ID {obj_id}")
+        db.session.commit()
         return jsonify(obj.to_dict())
     if request.method == "DELETE":
-        db.session.delete(obj); db.session.commit()
+        db.session.delete(obj)
         registrar_auditoria("ELIMINAR", "Impuesto", f"Baja ID {obj_id}")
+        db.session.commit()
         return jsonify({"message": "Eliminado correctamente"})
 
 @bp.route("/api/admin/talonarios", methods=["GET", "POST"])
@@ -154,8 +160,9 @@ def api_talonarios():
             numero_fin=data['numero_fin'],
             activo=data.get('activo', True)
         )
-        db.session.add(obj); db.session.commit()
+        db.session.add(obj)
         registrar_auditoria("CREAR", "Talonario", f"Nuevo Talonario {obj.timbrado}")
+        db.session.commit()
         return jsonify(obj.to_dict()), 201
     return jsonify([o.to_dict() for o in Talonario.query.order_by(Talonario.activo.desc(), Talonario.fecha_fin_vigencia.desc()).all()])
 
@@ -177,12 +184,13 @@ def api_talonario_detalle(obj_id):
         obj.numero_actual = data.get('numero_actual', obj.numero_actual)
         obj.numero_fin = data.get('numero_fin', obj.numero_fin)
         obj.activo = data.get('activo', obj.activo)
-        db.session.commit()
         registrar_auditoria("EDITAR", "Talonario", f"Edición ID {obj_id}")
+        db.session.commit()
         return jsonify(obj.to_dict())
     if request.method == "DELETE":
-        db.session.delete(obj); db.session.commit()
+        db.session.delete(obj)
         registrar_auditoria("ELIMINAR", "Talonario", f"Baja ID {obj_id}")
+        db.session.commit()
         return jsonify({"message": "Eliminado correctamente"})
 
 @bp.route("/api/admin/parametros", methods=["GET", "POST"])
@@ -193,8 +201,10 @@ def api_parametros_sistema():
         if ParametroSistema.query.filter_by(clave=data['clave']).first():
             return jsonify({"error": "Esa clave ya existe"}), 400
         param = ParametroSistema(clave=data['clave'], valor=data['valor'], descripcion=data.get('descripcion'))
-        db.session.add(param); db.session.commit()
+        db.session.add(param)
         registrar_auditoria("CREAR", "Parametro", f"Nuevo: {param.clave}")
+        db.session.commit()
+        invalidar_parametros()
         return jsonify(param.to_dict()), 201
     return jsonify([p.to_dict() for p in ParametroSistema.query.all()])
 
@@ -206,12 +216,15 @@ def api_parametro_sistema_detalle(pid):
         data = request.json
         param.valor = data.get('valor', param.valor)
         param.descripcion = data.get('descripcion', param.descripcion)
-        db.session.commit()
         registrar_auditoria("EDITAR", "Parametro", f"Cambio en {param.clave}")
+        db.session.commit()
+        invalidar_parametros()
         return jsonify(param.to_dict())
     if request.method == "DELETE":
-        db.session.delete(param); db.session.commit()
+        db.session.delete(param)
         registrar_auditoria("ELIMINAR", "Parametro", f"Eliminado ID {pid}")
+        db.session.commit()
+        invalidar_parametros()
         return jsonify({"message": "Eliminado"})
 
 @bp.route("/api/admin/cotizaciones", methods=["GET", "POST"])
@@ -226,8 +239,9 @@ def api_cotizaciones_sistema():
             compra=data['compra'],
             venta=data['venta']
         )
-        db.session.add(cot); db.session.commit()
+        db.session.add(cot)
         registrar_auditoria("CREAR", "Cotizacion", f"Cotización del {cot.fecha}")
+        db.session.commit()
         return jsonify(cot.to_dict()), 201
     return jsonify([c.to_dict() for c in Cotizacion.query.order_by(Cotizacion.fecha.desc()).limit(50).all()])
 
@@ -239,12 +253,13 @@ def api_cotizacion_sistema_detalle(cid):
         data = request.json
         cot.compra = data['compra']
         cot.venta = data['venta']
-        db.session.commit()
         registrar_auditoria("EDITAR", "Cotizacion", f"Edición ID {cid}")
+        db.session.commit()
         return jsonify(cot.to_dict())
     if request.method == "DELETE":
-        db.session.delete(cot); db.session.commit()
+        db.session.delete(cot)
         registrar_auditoria("ELIMINAR", "Cotizacion", f"Baja ID {cid}")
+        db.session.commit()
         return jsonify({"message": "Eliminado"})
 
 @bp.route("/api/admin/aplicaciones", methods=["GET"])
@@ -274,8 +289,8 @@ def api_rol_detalle(id_rol):
                 app = Aplicacion.query.get(app_id)
                 if app:
                     rol.aplicaciones.append(app)
-            db.session.commit()
             registrar_auditoria("PERMISOS", "Rol", f"Actualizados permisos para rol {rol.name}")
+            db.session.commit()
             return jsonify({"message": "Permisos actualizados"})
         rol.name = data.get('name', rol.name)
         rol.description = data.get('description', rol.description)
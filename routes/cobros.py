@@ -1,14 +1,19 @@
 from flask import Blueprint, render_template, request, jsonify, session, Response
 from flask_login import login_required, current_user
 from extensions import db
-from models import Pago, Cuota, Caja, MovimientoCaja, CuentaBancaria, DepositoBancario, Cliente, Contrato
-from datetime import datetime, date
+from models import Pago, Cuota, Caja, MovimientoCaja, CuentaBancaria, DepositoBancario, Cliente, Contrato, FormaPago
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 from utils import role_required, get_param, clean, registrar_auditoria 
 from fpdf import FPDF
 from num2words import num2words
-from sqlalchemy import desc
+from sqlalchemy import desc, or_, and_, case, literal, func
+from sqlalchemy.orm import contains_eager, joinedload
 import traceback
+import mora
+import recibos
+import saldos
+import fondos
 
 bp = Blueprint('cobros', __name__)
 
@@ -36,56 +41,108 @@ def cobros_reportes():
 def cobros_definiciones(): 
     return render_template("cobros/definiciones.html")
 
+# Columnas ordenables del historial (índice de columna de DataTables -> expresión SQL)
+COLUMNAS_HISTORIAL = {
+    'fecha': Pago.fecha_pago,
+    'recibo': Pago.id,
+    'cliente': Cliente.apellido,
+    'monto': Pago.monto,
+    'forma_pago': FormaPago.nombre,
+}
+
 @bp.route("/api/cobros/historial")
 @login_required
 def api_cobros_historial():
-    fecha_inicio = request.args.get('fecha_inicio')
-    fecha_fin = request.args.get('fecha_fin')
-    
-    query = Pago.query
-    
-    if fecha_inicio:
-        try:
-            f_ini = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-            query = query.filter(Pago.fecha_pago >= f_ini)
-        except: pass
+    # Modo server-side de DataTables: paginado, búsqueda y orden en SQL.
+    # Con el orden por defecto (fecha desc) acepta ?cursor=<fecha_iso>|<id> para
+    # paginar por clave (fecha_pago, id) en lugar de OFFSET.
+    args = request.args
+    draw = args.get('draw', 0, type=int)
+    inicio = max(args.get('start', 0, type=int), 0)
+    largo = min(args.get('length', 25, type=int), 500)
+    if largo < 0: largo = 500 # DataTables manda -1 para "todos"
+
+    base = (db.session.query(Pago)
+            .join(Pago.contrato).join(Contrato.cliente)
+            .outerjoin(Pago.forma_pago_rel))
+
+    try:
+        if args.get('fecha_inicio'):
+            base = base.filter(Pago.fecha_pago >= datetime.strptime(args['fecha_inicio'], '%Y-%m-%d'))
+        if args.get('fecha_fin'):
+            base = base.filter(Pago.fecha_pago < datetime.strptime(args['fecha_fin'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        return jsonify({"error": "Formato de fecha inválido"}), 400
+
+    busqueda = (args.get('search[value]') or '').strip()
+    filtro = None
+    if busqueda:
+        patron = f"%{busqueda}%"
+        filtro = or_(Cliente.nombre.ilike(patron), Cliente.apellido.ilike(patron),
+                     Cliente.documento.ilike(patron), Contrato.numero_contrato.ilike(patron),
+                     Pago.referencia.ilike(patron))
+        if busqueda.isdigit():
+            filtro = or_(filtro, Pago.id == int(busqueda))
+
+    # Total y filtrados en un solo agregado
+    coincide = case((filtro, 1), else_=0) if filtro is not None else literal(1)
+    total, filtrados = base.with_entities(func.count(Pago.id), func.coalesce(func.sum(coincide), 0)).one()
+
+    query = base.filter(filtro) if filtro is not None else base
+    columna = args.get(f"columns[{args.get('order[0][column]', '')}][data]", 'fecha')
+    descendente = args.get('order[0][dir]', 'desc') != 'asc'
+    cursor = args.get('cursor')
+    if columna not in COLUMNAS_HISTORIAL: columna = 'fecha'
+
+    if columna == 'fecha' and descendente:
+        query = query.order_by(Pago.fecha_pago.desc(), Pago.id.desc())
+        if cursor:
+            try:
+                fecha_cursor, id_cursor = cursor.split('|')
+                fecha_cursor = datetime.fromisoformat(fecha_cursor)
+                id_cursor = int(id_cursor)
+            except ValueError:
+                return jsonify({"error": "Cursor inválido"}), 400
+            query = query.filter(or_(Pago.fecha_pago < fecha_cursor,
+                                     and_(Pago.fecha_pago == fecha_cursor, Pago.id < id_cursor)))
+        else:
+            query = query.offset(inicio)
+    else:
+        orden = COLUMNAS_HISTORIAL[columna]
+        query = query.order_by(orden.desc() if descendente else orden.asc(), Pago.id.desc()).offset(inicio)
+
+    pagos = (query.options(contains_eager(Pago.contrato).contains_eager(Contrato.cliente),
+                           contains_eager(Pago.forma_pago_rel),
+                           joinedload(Pago.cuota))
+             .limit(largo).all())
 
-    if fecha_fin:
-        try:
-            f_fin = datetime.strptime(fecha_fin, '%Y-%m-%d')
-            query = query.filter(Pago.fecha_pago <= f_fin)
-        except: pass
-        
-    pagos = query.order_by(Pago.fecha_pago.desc()).all()
-    
     data = []
     for p in pagos:
-        cliente_nombre = "N/A"
-        concepto = "Pago General"
-        
-        if p.contrato and p.contrato.cliente:
-            cliente_nombre = f"{p.contrato.cliente.nombre} {p.contrato.cliente.apellido}"
-        
-        if p.cuota:
-            concepto = f"Cuota {p.cuota.numero_cuota} ({p.cuota.tipo})"
-            
+        cliente = p.contrato.cliente
         data.append({
             'id': p.id,
             'fecha': p.fecha_pago.strftime('%d/%m/%Y'),
             'recibo': p.id,
-            'cliente': cliente_nombre,
-            'concepto': concepto,
+            'cliente': f"{cliente.nombre} {cliente.apellido}",
+            'contrato': p.contrato.numero_contrato,
+            'concepto': f"Cuota {p.cuota.numero_cuota} ({p.cuota.tipo})" if p.cuota else "Pago General",
             'monto': float(p.monto),
-            'forma_pago': p.forma_pago.nombre if p.forma_pago else "N/A",
+            'forma_pago': p.forma_pago_rel.nombre if p.forma_pago_rel else "N/A",
             'estado': 'Confirmado',
-            'acciones': f"""
-                <a href="/admin/cobros/recibo/{p.id}" target="_blank" class="btn btn-sm btn-info" title="Imprimir Recibo">
-                    <i class="fas fa-print"></i>
-                </a>
-            """
+            'recibo_url': f"/admin/cobros/recibo/{p.id}"
         })
 
-    return jsonify({"data": data})
+    return jsonify({
+        "draw": draw,
+        "recordsTotal": total,
+        "recordsFiltered": int(filtrados),
+        "data": data,
+        "cursor": f"{pagos[-1].fecha_pago.isoformat()}|{pagos[-1].id}" if pagos else None
+    })
+
+def _parsear_monto(valor):
+    # Formato local: '1.500.000' o '1.500.000,50'
+    return Decimal(str(valor).replace('.', '').replace(',', '.'))
 
 @bp.route("/api/admin/clientes/<int:cliente_id>/cuotas")
 @login_required
@@ -96,21 +153,13 @@ def api_get_cuotas_por_cliente(cliente_id):
     ).order_by(desc(Cuota.tipo), Cuota.fecha_vencimiento).all()
     
     data = []
-    today = date.today()
+    m = mora.calcular_cuotas(cuotas, date.today())
     
-    for c in cuotas:
+    for i, c in enumerate(cuotas):
         c_dict = c.to_dict()
-        dias_atraso = (today - c.fecha_vencimiento).days
-        interes = 0.0
-        
-        if dias_atraso > 90 and c.tipo == 'cuota': 
-            tasa_diaria = 0.0275 
-            interes = float(c.valor_cuota) * tasa_diaria * dias_atraso
-            
-        c_dict['dias_atraso'] = dias_atraso if dias_atraso > 0 else 0
-        c_dict['interes_mora'] = interes
-        c_dict['total_pagar'] = float(c.valor_cuota) + interes
-        
+        c_dict['dias_atraso'] = int(m['dias_atraso'][i])
+        c_dict['interes_mora'] = float(m['interes'][i])
+        c_dict['total_pagar'] = float(m['total'][i])
         data.append(c_dict)
 
     return jsonify(data)
@@ -122,23 +171,18 @@ def api_registrar_pago():
     
     try:
         forma_id = int(data.get("forma_pago_id"))
-        monto_str = str(data["monto"]).replace('.', '').replace(',', '.')
-        monto_recibido = Decimal(monto_str)
+        monto_recibido = _parsear_monto(data["monto"])
         fecha_pago_dt = datetime.strptime(data["fecha_pago"], "%Y-%m-%d")
         fecha_pago_date = fecha_pago_dt.date()
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, ArithmeticError):
         return jsonify({"error": "Datos de pago inválidos"}), 400
 
     cuota = Cuota.query.get(int(data["cuota_id"]))
     if not cuota or cuota.estado == 'pagada': 
         return jsonify({"error": "Cuota inválida o ya pagada"}), 400
     
-    dias_atraso = (fecha_pago_date - cuota.fecha_vencimiento).days
-    interes_calculado = Decimal(0)
-    
-    if dias_atraso > 90 and cuota.tipo == 'cuota':
-        tasa_diaria = Decimal("0.0275") 
-        interes_calculado = cuota.valor_cuota * tasa_diaria * dias_atraso
+    m = mora.calcular_cuotas([cuota], fecha_pago_date)
+    dias_atraso, interes_calculado = int(m['dias_atraso'][0]), mora.a_decimal(m['interes'][0])
 
     total_minimo_requerido = cuota.valor_cuota + interes_calculado
     
@@ -178,6 +222,8 @@ def api_registrar_pago():
             cuenta_bancaria_id=cuenta_bancaria_id
         )
         db.session.add(pago)
+        db.session.flush() # ID del pago para el movimiento de caja
+        cuenta_acreditada = None
         
         cuota.estado = 'pagada'
         cuota.fecha_pago = pago.fecha_pago
@@ -196,7 +242,6 @@ def api_registrar_pago():
                 usuario_id=current_user.id
             )
             db.session.add(mov)
-            caja.saldo_actual = (caja.saldo_actual or 0) + monto_recibido
             
         elif cuenta_bancaria_id:
             cta = CuentaBancaria.query.get(cuenta_bancaria_id)
@@ -211,31 +256,240 @@ def api_registrar_pago():
                     usuario_id=current_user.id
                 )
                 db.session.add(dep)
-                cta.saldo = (cta.saldo or 0) + monto_recibido
+                cuenta_acreditada = cta.id
 
-        db.session.commit()
+        saldos.actualizar([cuota.contrato_id])
+        # Saldo de caja/banco como último paso: el bloqueo de su fila dura solo hasta el commit
+        if forma_id == 1 and caja: fondos.mover_caja(caja.id, monto_recibido)
+        elif cuenta_acreditada: fondos.mover_cuenta(cuenta_acreditada, monto_recibido)
         registrar_auditoria("CREAR", "Pago", audit_detalle) 
+        db.session.commit()
         return jsonify({"ok": True, "message": "Pago registrado correctamente", "pago_id": pago.id})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Error interno BD: {str(e)}"}), 500
 
+@bp.route("/api/admin/pagos/lote", methods=["POST"])
+@login_required
+def api_registrar_pago_lote():
+    # Cobro de varias cuotas en una sola transacción y con un solo recibo.
+    # Recibe cuota_ids, o contrato_id + monto para cubrir las cuotas más antiguas primero.
+    data = request.get_json(force=True)
+
+    try:
+        forma_id = int(data.get("forma_pago_id"))
+        fecha_pago_dt = datetime.strptime(data["fecha_pago"], "%Y-%m-%d")
+        fecha_pago_date = fecha_pago_dt.date()
+        monto_recibido = _parsear_monto(data["monto"]) if str(data.get("monto") or "").strip() else None
+        cuota_ids = {int(i) for i in data.get("cuota_ids") or []}
+        contrato_id = int(data["contrato_id"]) if data.get("contrato_id") else None
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        return jsonify({"error": "Datos de pago inválidos"}), 400
+
+    # Bloquea las cuotas hasta el commit para que otro cajero no las cobre en paralelo
+    query = (Cuota.query.filter(Cuota.estado.in_(['pendiente', 'vencida']))
+             .order_by(desc(Cuota.tipo), Cuota.fecha_vencimiento, Cuota.numero_cuota)
+             .with_for_update())
+
+    asignacion = [] # (cuota, días de atraso, interés, monto a aplicar)
+    if cuota_ids:
+        cuotas = query.filter(Cuota.id.in_(cuota_ids)).all()
+        if len(cuotas) != len(cuota_ids):
+            return jsonify({"error": "Alguna cuota es inválida o ya está pagada"}), 400
+        if len({c.contrato.cliente_id for c in cuotas}) > 1:
+            return jsonify({"error": "Las cuotas deben ser de un mismo cliente"}), 400
+        m = mora.calcular_cuotas(cuotas, fecha_pago_date)
+        for i, c in enumerate(cuotas):
+            interes = mora.a_decimal(m['interes'][i])
+            asignacion.append((c, int(m['dias_atraso'][i]), interes, c.valor_cuota + interes))
+        total_requerido = sum(a[3] for a in asignacion)
+        if monto_recibido is None:
+            monto_recibido = total_requerido
+        elif monto_recibido < total_requerido - Decimal(50):
+            return jsonify({
+                "error": "Monto insuficiente.",
+                "detalle": f"La deuda total de las {len(asignacion)} cuotas es {total_requerido:,.0f}"
+            }), 400
+    elif contrato_id and monto_recibido is not None:
+        restante = monto_recibido
+        cuotas = query.filter(Cuota.contrato_id == contrato_id).all()
+        m = mora.calcular_cuotas(cuotas, fecha_pago_date)
+        for i, c in enumerate(cuotas):
+            interes = mora.a_decimal(m['interes'][i])
+            total_cuota = c.valor_cuota + interes
+            if restante < total_cuota - Decimal(50): break
+            asignacion.append((c, int(m['dias_atraso'][i]), interes, total_cuota))
+            restante -= total_cuota
+        if not asignacion:
+            return jsonify({"error": "El monto no alcanza para cubrir la cuota pendiente más antigua"}), 400
+    else:
+        return jsonify({"error": "Indique cuota_ids, o contrato_id y monto"}), 400
+
+    # Lo que sobra se devuelve como vuelto; un faltante dentro de la tolerancia se descuenta de la última cuota
+    total_aplicado = sum(a[3] for a in asignacion)
+    vuelto = max(monto_recibido - total_aplicado, Decimal(0))
+    if monto_recibido < total_aplicado:
+        c, dias, interes, monto = asignacion[-1]
+        asignacion[-1] = (c, dias, interes, monto - (total_aplicado - monto_recibido))
+        total_aplicado = monto_recibido
+
+    cuenta_bancaria_id = data.get("cuenta_bancaria_id")
+    cuenta_bancaria_id = int(cuenta_bancaria_id) if cuenta_bancaria_id and str(cuenta_bancaria_id).strip() else None
+
+    caja = None
+    if forma_id == 1:
+        caja_id = session.get("caja_id")
+        if not caja_id: return jsonify({"error": "Caja no abierta en sesión"}), 403
+        caja = Caja.query.get(caja_id)
+        if not caja or not caja.abierta: return jsonify({"error": "Caja cerrada"}), 403
+
+    try:
+        pagos = []
+        for cuota, dias, interes, monto in asignacion:
+            obs = data.get("observaciones", "")
+            if interes > 0:
+                obs += f" [Incluye mora: {interes:,.0f} Gs por {dias} días de atraso]"
+            pago = Pago(
+                contrato_id=cuota.contrato_id,
+                cuota_id=cuota.id,
+                fecha_pago=fecha_pago_dt,
+                monto=monto,
+                forma_pago_id=forma_id,
+                referencia=data.get("referencia"),
+                observaciones=obs.strip(),
+                usuario_id=current_user.id,
+                cuenta_bancaria_id=cuenta_bancaria_id
+            )
+            db.session.add(pago)
+            pagos.append(pago)
+            cuota.estado = 'pagada'
+            cuota.fecha_pago = fecha_pago_date
+            cuota.valor_pagado = monto
+        db.session.flush() # IDs de los pagos para los movimientos de caja
+        cuenta_acreditada = None
+
+        detalle_cuotas = ", ".join(f"{c.contrato.numero_contrato}-{c.numero_cuota}" for c, _, _, _ in asignacion)
+        cliente = asignacion[0][0].contrato.cliente
+        if caja:
+            for pago, (cuota, _, _, _) in zip(pagos, asignacion):
+                db.session.add(MovimientoCaja(
+                    caja_id=caja.id,
+                    tipo_movimiento="ingreso",
+                    monto=pago.monto,
+                    concepto=f"Cobro {cuota.tipo.title()} {cuota.numero_cuota} - {cliente.nombre}",
+                    fecha_hora=datetime.now(),
+                    pago_id=pago.id,
+                    usuario_id=current_user.id
+                ))
+        elif cuenta_bancaria_id:
+            cta = CuentaBancaria.query.get(cuenta_bancaria_id)
+            if cta:
+                db.session.add(DepositoBancario(
+                    cuenta_id=cta.id,
+                    fecha_deposito=fecha_pago_date,
+                    monto=total_aplicado,
+                    referencia=data.get("referencia", "Cobro Auto"),
+                    concepto=f"Cobro cuotas {detalle_cuotas}"[:255],
+                    estado='confirmado',
+                    usuario_id=current_user.id
+                ))
+                cuenta_acreditada = cta.id
+
+        saldos.actualizar({c.contrato_id for c, _, _, _ in asignacion})
+        if caja: fondos.mover_caja(caja.id, total_aplicado)
+        elif cuenta_acreditada: fondos.mover_cuenta(cuenta_acreditada, total_aplicado)
+        registrar_auditoria("CREAR", "Pago", f"Pago de {len(pagos)} cuotas ({detalle_cuotas}). Total: {total_aplicado:,.0f}")
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error interno BD: {str(e)}"}), 500
+
+    ids = ",".join(str(p.id) for p in pagos)
+    return jsonify({
+        "ok": True,
+        "message": f"{len(pagos)} cuotas cobradas correctamente",
+        "pago_ids": [p.id for p in pagos],
+        "total": float(total_aplicado),
+        "vuelto": float(vuelto),
+        "recibo_url": f"/admin/cobros/recibo-lote?pagos={ids}"
+    })
+
 @bp.route("/admin/cobros/recibo/<int:pago_id>")
 @login_required
 def generar_recibo_pdf(pago_id):
-    pago = Pago.query.get_or_404(pago_id)
-    try: letras = num2words(int(pago.monto), lang='es')
-    except: letras = str(int(pago.monto))
-    
+    pago = recibos.consulta_pagos().filter(Pago.id == pago_id).first_or_404()
+    return Response(recibos.obtener(pago), mimetype="application/pdf")
+
+@bp.route("/admin/cobros/recibos")
+@login_required
+def generar_recibos_pdf():
+    # Reimpresión de recibos en un solo PDF: ?caja_id= (sesión actual de esa caja,
+    # por defecto la de la sesión) o ?fecha_desde=&fecha_hasta=
+    query = recibos.consulta_pagos()
+    if request.args.get('fecha_desde') or request.args.get('fecha_hasta'):
+        try:
+            desde = datetime.strptime(request.args.get('fecha_desde') or request.args['fecha_hasta'], '%Y-%m-%d')
+            hasta = datetime.strptime(request.args.get('fecha_hasta') or request.args['fecha_desde'], '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            return jsonify({"error": "Formato de fecha inválido"}), 400
+        query = query.filter(Pago.fecha_pago >= desde, Pago.fecha_pago < hasta)
+        nombre = f"Recibos_{desde:%Y%m%d}"
+    else:
+        caja_id = request.args.get('caja_id', type=int) or session.get("caja_id")
+        if not caja_id: return jsonify({"error": "Indique caja_id o un rango de fechas"}), 400
+        # La sesión de caja empieza en su último movimiento de apertura
+        apertura = db.session.query(func.max(MovimientoCaja.id)).filter(
+            MovimientoCaja.caja_id == caja_id, MovimientoCaja.concepto == "Apertura de Caja").scalar()
+        movs = db.session.query(MovimientoCaja.pago_id).filter(
+            MovimientoCaja.caja_id == caja_id, MovimientoCaja.pago_id != None, MovimientoCaja.id >= (apertura or 0))
+        query = query.filter(Pago.id.in_(movs))
+        nombre = f"Recibos_Caja{caja_id}"
+
+    pagos = query.order_by(Pago.fecha_pago, Pago.id).all()
+    if not pagos:
+        return jsonify({"error": "No hay pagos para reimprimir"}), 404
+    return Response(recibos.obtener_lote(pagos), mimetype="application/pdf",
+                    headers={'Content-Disposition': f'inline;filename={nombre}.pdf'})
+
+@bp.route("/admin/cobros/recibo-lote")
+@login_required
+def generar_recibo_lote_pdf():
+    # Recibo único para un cobro de varias cuotas (?pagos=1,2,3)
+    try:
+        ids = [int(i) for i in request.args.get('pagos', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({"error": "Lista de pagos inválida"}), 400
+    pagos = recibos.consulta_pagos().filter(Pago.id.in_(ids)).order_by(Pago.id).all() if ids else []
+    if not pagos:
+        return jsonify({"error": "Pagos no encontrados"}), 404
+
+    total = sum(p.monto for p in pagos)
+    try: letras = num2words(int(total), lang='es')
+    except: letras = str(int(total))
+    cliente = pagos[0].contrato.cliente
+
     class PDF(FPDF):
         def header(self): self.set_font('Arial','B',14); self.cell(0,10,'RECIBO DE DINERO',0,1,'C')
-    
+
     pdf = PDF(); pdf.add_page(); pdf.set_font('Arial','',12)
-    pdf.cell(0,10, clean(f"Recibí de: {pago.contrato.cliente.nombre} {pago.contrato.cliente.apellido}"), 0, 1)
+    pdf.cell(0,10, clean(f"Recibí de: {cliente.nombre} {cliente.apellido}"), 0, 1)
     pdf.cell(0,10, clean(f"La suma de: {letras.upper()} GUARANIES"), 0, 1)
-    pdf.cell(0,10, clean(f"Concepto: Pago de {pago.cuota.tipo} N° {pago.cuota.numero_cuota} ({pago.cuota.observaciones or ''})"), 0, 1)
-    pdf.cell(0,10, f"Monto: {int(pago.monto):,}", 0, 1)
+    pdf.cell(0,10, clean(f"Concepto: Pago de {len(pagos)} cuotas"), 0, 1)
+    pdf.ln(2)
+    pdf.set_font('Arial','B',10); pdf.set_fill_color(230, 230, 230)
+    pdf.cell(45,8, "Contrato", 1, 0, 'C', True)
+    pdf.cell(35,8, "Cuota", 1, 0, 'C', True)
+    pdf.cell(40,8, "Vencimiento", 1, 0, 'C', True)
+    pdf.cell(50,8, "Monto", 1, 1, 'C', True)
+    pdf.set_font('Arial','',10)
+    for p in pagos:
+        pdf.cell(45,7, clean(p.contrato.numero_contrato), 1, 0, 'C')
+        pdf.cell(35,7, clean(f"{p.cuota.tipo} N° {p.cuota.numero_cuota}") if p.cuota else "-", 1, 0, 'C')
+        pdf.cell(40,7, p.cuota.fecha_vencimiento.strftime("%d/%m/%Y") if p.cuota else "-", 1, 0, 'C')
+        pdf.cell(50,7, f"{int(p.monto):,}".replace(',', '.'), 1, 1, 'R')
+    pdf.set_font('Arial','B',12)
+    pdf.cell(0,10, f"Total: {int(total):,}", 0, 1)
     return Response(pdf.output(dest='S').encode('latin-1'), mimetype="application/pdf")
 
 # --- LÓGICA CORREGIDA: REPORTE ESTADO DE CUENTA ---
@@ -260,8 +514,9 @@ def api_reporte_estado_cuenta():
             if c.estado == 'cancelado': 
                 continue 
                 
-            total_contrato = sum([float(cu.valor_cuota) for cu in c.cuotas])
-            total_pagado = sum([float(p.monto) for p in c.pagos])
+            # Totales materializados en el contrato (saldos.actualizar)
+            total_contrato = float(c.total_cuotas or 0)
+            total_pagado = float(c.total_pagado or 0)
             saldo_pendiente = total_contrato - total_pagado
             
             historial = []
@@ -273,13 +528,6 @@ def api_reporte_estado_cuenta():
                     "monto": float(p.monto)
                 })
                 
-            today = date.today()
-            cuotas_vencidas = Cuota.query.filter(
-                Cuota.contrato_id == c.id,
-                Cuota.estado == 'pendiente',
-                Cuota.fecha_vencimiento < today
-            ).count()
-            
             lote_txt = "S/D"
             if c.lote:
                 lote_txt = f"Mz {c.lote.manzana} - Lote {c.lote.numero_lote}"
@@ -290,7 +538,8 @@ def api_reporte_estado_cuenta():
                 "total_contrato": float(total_contrato),
                 "total_pagado": float(total_pagado),
                 "saldo_pendiente": float(saldo_pendiente),
-                "cuotas_vencidas": cuotas_vencidas,
+                "cuotas_vencidas": c.cuotas_vencidas or 0,
+                "proxima_cuota": c.proxima_cuota.isoformat() if c.proxima_cuota else None,
                 "historial_pagos": historial
             })
             
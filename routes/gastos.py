@@ -4,6 +4,7 @@ from extensions import db
 from models import Gasto, CategoriaGasto, Proveedor, Caja, MovimientoCaja, CuentaBancaria, DepositoBancario
 from datetime import datetime
 from utils import role_required, registrar_auditoria # <--- IMPORTAR
+import fondos
 
 bp = Blueprint('gastos', __name__)
 
@@ -39,8 +40,8 @@ def api_gastos():
             monto=float(data['monto']), estado='pendiente'
         )
         db.session.add(gasto)
-        db.session.commit()
         registrar_auditoria("CREAR", "Gasto", f"Nuevo gasto registrado por Gs. {gasto.monto:,.0f} (Prov ID: {gasto.proveedor_id})") # <--- AUDITORIA
+        db.session.commit()
         return jsonify(gasto.to_dict()), 201
     
     gastos = Gasto.query.order_by(Gasto.fecha_factura.desc()).all()
@@ -53,8 +54,8 @@ def api_gasto_delete(gid):
     gasto = Gasto.query.get_or_404(gid)
     if gasto.estado == 'anulado': return jsonify({"error": "Ya anulado"}), 400
     gasto.estado = 'anulado'
-    db.session.commit()
     registrar_auditoria("ANULAR", "Gasto", f"Se anuló el gasto ID {gid}") # <--- AUDITORIA
+    db.session.commit()
     return jsonify({"message": "Anulado"})
 
 @bp.route("/api/admin/gastos/<int:gasto_id>/pagar", methods=["POST"])
@@ -73,7 +74,6 @@ def api_pagar_gasto(gasto_id):
             if not caja_id: return jsonify({"error": "Debe abrir una caja para pagar en efectivo"}), 400
             caja = Caja.query.get(caja_id)
             if not caja.abierta: return jsonify({"error": "Caja cerrada"}), 400
-            if caja.saldo_actual < gasto.monto: return jsonify({"error": f"Saldo insuficiente en caja (Gs. {caja.saldo_actual:,.0f})"}), 400
             
             mov = MovimientoCaja(
                 caja_id=caja.id, tipo_movimiento='egreso', monto=gasto.monto,
@@ -81,12 +81,14 @@ def api_pagar_gasto(gasto_id):
                 fecha_hora=datetime.now(), usuario_id=current_user.id
             )
             db.session.add(mov)
-            caja.saldo_actual -= gasto.monto
+            # Control de saldo y descuento en un solo UPDATE atómico
+            if fondos.mover_caja(caja.id, -gasto.monto, permitir_negativo=False) is None:
+                db.session.rollback()
+                return jsonify({"error": f"Saldo insuficiente en caja (Gs. {caja.saldo_actual:,.0f})"}), 400
 
         elif metodo == 'banco':
             cuenta = CuentaBancaria.query.get(data.get('cuenta_id'))
             if not cuenta: return jsonify({"error": "Cuenta inválida"}), 400
-            if cuenta.saldo < gasto.monto: return jsonify({"error": f"Saldo insuficiente en banco (Gs. {cuenta.saldo:,.0f})"}), 400
             
             debito = DepositoBancario(
                 cuenta_id=cuenta.id, fecha_deposito=fecha_pago, monto=-gasto.monto,
@@ -94,12 +96,14 @@ def api_pagar_gasto(gasto_id):
                 estado='confirmado', usuario_id=current_user.id
             )
             db.session.add(debito)
-            cuenta.saldo -= gasto.monto
+            if fondos.mover_cuenta(cuenta.id, -gasto.monto, permitir_negativo=False) is None:
+                db.session.rollback()
+                return jsonify({"error": f"Saldo insuficiente en banco (Gs. {cuenta.saldo:,.0f})"}), 400
         
         gasto.estado = 'pagado'
         gasto.fecha_pago = fecha_pago
-        db.session.commit()
         registrar_auditoria("PAGAR", "Gasto", f"Pago de gasto ID {gasto.id} por {gasto.monto:,.0f} vía {metodo}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify({"message": "Pago registrado"})
     except Exception as e:
         db.session.rollback()
@@ -113,8 +117,9 @@ def api_proveedores():
     if request.method == "POST":
         data = request.json
         p = Proveedor(razon_social=data['razon_social'], ruc=data['ruc'], telefono=data.get('telefono'), direccion=data.get('direccion'))
-        db.session.add(p); db.session.commit()
+        db.session.add(p)
         registrar_auditoria("CREAR", "Proveedor", f"Alta proveedor {p.razon_social}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify(p.to_dict())
     return jsonify([p.to_dict() for p in Proveedor.query.all()])
 
@@ -131,14 +136,14 @@ def api_proveedor_detalle(pid):
         proveedor.ruc = data.get('ruc', proveedor.ruc)
         proveedor.telefono = data.get('telefono', proveedor.telefono)
         proveedor.direccion = data.get('direccion', proveedor.direccion)
-        db.session.commit()
         registrar_auditoria("EDITAR", "Proveedor", f"Modificación proveedor ID {pid}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify(proveedor.to_dict())
     if request.method == "DELETE":
         if proveedor.gastos: return jsonify({"error": "No se puede eliminar, tiene gastos asociados."}), 400
         db.session.delete(proveedor)
-        db.session.commit()
         registrar_auditoria("ELIMINAR", "Proveedor", f"Baja proveedor ID {pid}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify({"message": "Proveedor eliminado"})
     return jsonify(proveedor.to_dict())
 
@@ -149,8 +154,9 @@ def api_proveedor_detalle(pid):
 def api_categorias():
     if request.method == "POST":
         c = CategoriaGasto(nombre=request.json['nombre'], descripcion=request.json.get('descripcion'))
-        db.session.add(c); db.session.commit()
+        db.session.add(c)
         registrar_auditoria("CREAR", "CategoriaGasto", f"Nueva categoría: {c.nombre}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify(c.to_dict())
     return jsonify([c.to_dict() for c in CategoriaGasto.query.all()])
 
@@ -165,12 +171,13 @@ def api_categoria_gasto_detalle(cid):
             return jsonify({"error": "Ya existe otra categoría con ese nombre"}), 400
         categoria.nombre = data.get('nombre', categoria.nombre)
         categoria.descripcion = data.get('descripcion', categoria.descripcion)
-        db.session.commit()
         registrar_auditoria("EDITAR", "CategoriaGasto", f"Editada categoría ID {cid}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify(categoria.to_dict())
     if request.method == "DELETE":
         if categoria.gastos: return jsonify({"error": "No se puede eliminar, tiene gastos asociados."}), 400
-        db.session.delete(categoria); db.session.commit()
+        db.session.delete(categoria)
         registrar_auditoria("ELIMINAR", "CategoriaGasto", f"Eliminada categoría ID {cid}") # <--- AUDITORIA
+        db.session.commit()
         return jsonify({"message": "Categoría eliminada"})
     return jsonify(categoria.to_dict())
\ No newline at end of file
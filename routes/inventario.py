@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, request, jsonify, Response
+from flask import Blueprint, render_template, request, jsonify, Response, send_file, abort
 from flask_login import login_required, current_user
 from extensions import db
-from models import Fraccionamiento, Lote, Contrato, Cuota, Cliente, ListaPrecioLote, Funcionario
+from models import Fraccionamiento, Lote, LoteCambio, Contrato, Cuota, Cliente, ListaPrecioLote, Funcionario
 from datetime import datetime, timedelta, date
 from utils import role_required, admin_required, get_param, clean, registrar_auditoria
-from sqlalchemy import or_, desc, func
+from geometria import banda_para, derivados_geometria, asignar_geometria, parsear_bbox, indice_lotes, codificar_geometria, ESCALA_CUANTIZACION
+import cache_mapa
+import miniaturas
+import saldos
+import resumenes
+from sqlalchemy import or_, desc, func, insert
+from sqlalchemy.orm import defer, joinedload
 from dateutil.relativedelta import relativedelta
 from fpdf import FPDF
 from num2words import num2words
@@ -12,6 +18,8 @@ import locale
 
 bp = Blueprint('inventario', __name__)
 
+MIME_COMPACTO = 'application/vnd.lotes.compact+json'
+
 @bp.route("/api/inventario/vendedores-activos")
 @login_required
 def api_vendedores_activos():
@@ -54,22 +62,128 @@ def inventario_fraccionamiento_detalle(fraccionamiento_id):
 @bp.route("/api/fraccionamientos", methods=["GET"])
 def public_fraccionamientos():
     # Usado por main.js y admin.js para cargar el mapa
-    fracs = Fraccionamiento.query.all()
-    features = [f.to_feature() for f in fracs]
-    return jsonify({"type": "FeatureCollection", "features": features})
+    # ?zoom= o ?tolerance= devuelve las geometrías simplificadas precalculadas
+    banda = banda_para(request.args.get('zoom', type=int), request.args.get('tolerance', type=float))
+    def features():
+        # La ciudad va en el mismo SELECT: con cursor de servidor no se pueden lanzar consultas intermedias
+        query = Fraccionamiento.query.options(joinedload(Fraccionamiento.ciudad))
+        return (f.to_feature(banda) for f in query.yield_per(200))
+    return cache_mapa.respuesta_geojson(('fraccionamientos', None), banda, features)
 
 @bp.route("/api/lotes", methods=["GET"])
 def public_lotes():
     # Usado por main.js y admin.js
-    frac_id = request.args.get('fraccionamiento_id')
-    query = Lote.query.filter_by(activo=True)
-    if frac_id:
-        query = query.filter_by(fraccionamiento_id=frac_id)
-    
-    lotes = query.all()
-    features = [l.to_feature() for l in lotes]
+    frac_id = request.args.get('fraccionamiento_id', type=int)
+    banda = banda_para(request.args.get('zoom', type=int), request.args.get('tolerance', type=float))
+    # Formato compacto (?format=compact o Accept: application/vnd.lotes.compact+json):
+    # geometrías cuantizadas y en base64 en lugar de arrays de floats
+    compacto = request.args.get('format') == 'compact' or request.accept_mimetypes.best == MIME_COMPACTO
+    extra = {"cuantizacion": {"escala": ESCALA_CUANTIZACION}} if compacto else None
+
+    def feature(l):
+        f = l.to_feature(banda)
+        if compacto: f['geometry'] = codificar_geometria(f['geometry'])
+        return f
+
+    # ?bbox=minx,miny,maxx,maxy: solo los lotes visibles, resueltos con el índice espacial
+    if request.args.get('bbox'):
+        try:
+            bbox = parsear_bbox(request.args['bbox'])
+        except ValueError:
+            return jsonify({"error": "bbox inválido, formato: minx,miny,maxx,maxy"}), 400
+        ids = indice_lotes.consultar_bbox(*bbox, fraccionamiento_id=frac_id)
+        lotes = Lote.query.filter(Lote.id.in_(ids), Lote.activo == True).all() if ids else []
+        resp = jsonify({"type": "FeatureCollection", **(extra or {}), "features": [feature(l) for l in lotes]})
+        resp.vary.add('Accept')
+        return resp
+
+    def features():
+        query = Lote.query.filter_by(activo=True)
+        if frac_id:
+            query = query.filter_by(fraccionamiento_id=frac_id)
+        # Sin banda de zoom no hace falta leer las geometrías simplificadas
+        if not banda:
+            query = query.options(defer(Lote.geojson_simplificado))
+        return (feature(l) for l in query.yield_per(500))
+    # Cacheado por fraccionamiento; la versión sale de la bitácora LoteCambio.
+    # Sin caché vigente se transmite en streaming, lote por lote.
+    resp = cache_mapa.respuesta_geojson(('lotes', frac_id), (banda, compacto), features, extra)
+    resp.vary.add('Accept')
+    return resp
+
+@bp.route("/api/lotes/at", methods=["GET"])
+def public_lotes_en_punto():
+    # Lote(s) que contienen la coordenada clickeada en el mapa
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        return jsonify({"error": "Parámetros lat y lng requeridos"}), 400
+    ids = indice_lotes.consultar_punto(lng, lat, fraccionamiento_id=request.args.get('fraccionamiento_id', type=int))
+    lotes = Lote.query.filter(Lote.id.in_(ids), Lote.activo == True).all() if ids else []
+    return jsonify({"type": "FeatureCollection", "features": [l.to_feature() for l in lotes]})
+
+@bp.route("/api/lotes/near", methods=["GET"])
+def public_lotes_cercanos():
+    # Lotes más cercanos a una coordenada dentro de ?radius= metros (por defecto 50, máx. 2000)
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        return jsonify({"error": "Parámetros lat y lng requeridos"}), 400
+    radio = min(max(request.args.get('radius', 50, type=float), 0), 2000)
+    limite = min(request.args.get('limit', 10, type=int), 100)
+    cercanos = indice_lotes.consultar_cercanos(lng, lat, radio, limite, fraccionamiento_id=request.args.get('fraccionamiento_id', type=int))
+    lotes = {l.id: l for l in Lote.query.filter(Lote.id.in_([i for i, _ in cercanos]), Lote.activo == True)} if cercanos else {}
+    features = []
+    for lote_id, distancia in cercanos:
+        if lote_id in lotes:
+            f = lotes[lote_id].to_feature()
+            f['properties']['distancia_m'] = round(distancia, 1)
+            features.append(f)
     return jsonify({"type": "FeatureCollection", "features": features})
 
+@bp.route("/api/lotes/changes", methods=["GET"])
+def public_lotes_cambios():
+    # Feed incremental para el mapa: solo las propiedades que cambiaron desde ?since=<seq>.
+    # Junto con la secuencia se devuelve 'ventana' (cambios con id dentro de la
+    # VENTANA anterior, como en LoteCambio.secuencia). Si el cliente la reenvía y
+    # ya no coincide, una transacción confirmó tarde un id menor: se vuelve a
+    # enviar toda la ventana (los cambios se combinan en orden de id, así que
+    # repetir los ya aplicados no altera el resultado).
+    since = request.args.get('since', type=int)
+    ventana = request.args.get('ventana', type=int)
+    frac_id = request.args.get('fraccionamiento_id', type=int)
+    filtro = [LoteCambio.fraccionamiento_id == frac_id] if frac_id else []
+    if since is None:
+        # Sin 'since' solo se informa la secuencia actual para empezar a consultar
+        ultimo = db.session.query(func.max(LoteCambio.id)).filter(*filtro).scalar() or 0
+        return jsonify({"seq": ultimo, "ventana": _cambios_en_ventana(ultimo, filtro), "cambios": [], "mas": False})
+
+    desde = since
+    if ventana is not None and _cambios_en_ventana(since, filtro) != ventana:
+        desde = max(since - LoteCambio.VENTANA, 0)
+    limite = min(request.args.get('limit', 500, type=int), 2000)
+    registros = (LoteCambio.query.filter(LoteCambio.id > desde, *filtro)
+                 .order_by(LoteCambio.id).limit(limite + 1).all())
+    mas = len(registros) > limite
+    registros = registros[:limite]
+
+    # Varios cambios del mismo lote se combinan en uno solo
+    cambios = {}
+    for r in registros:
+        d = cambios.setdefault(r.lote_id, {"id": r.lote_id, "properties": {}})
+        d["properties"].update(r.propiedades)
+        if r.geometria: d["geometry"] = r.geometria
+    seq = registros[-1].id if registros else since
+    return jsonify({"seq": seq, "ventana": _cambios_en_ventana(seq, filtro), "cambios": list(cambios.values()), "mas": mas})
+
+def _cambios_en_ventana(seq, filtro):
+    return db.session.query(func.count(LoteCambio.id)).filter(
+        *filtro, LoteCambio.id > seq - LoteCambio.VENTANA, LoteCambio.id <= seq).scalar()
+
+def _registrar_cambio_lote(lote, propiedades, geometria=None):
+    """Agrega a la sesión (misma transacción que el cambio) el registro para el feed del mapa."""
+    db.session.add(LoteCambio(lote_id=lote.id, fraccionamiento_id=lote.fraccionamiento_id, propiedades=propiedades, geometria=geometria))
+
 # ==========================================
 # APIs ADMINISTRATIVAS (GESTIÓN DE MAPA)
 # ==========================================
@@ -101,11 +215,12 @@ def api_admin_fraccionamientos():
                 nombre=nombre_limpio,
                 descripcion=data.get('descripcion'),
                 ciudad_id=int(data['ciudad_id']) if data.get('ciudad_id') else None,
-                geojson=data['geojson']
+                geojson=data['geojson'],
+                **derivados_geometria(data['geojson'])
             )
             db.session.add(nuevo)
-            db.session.commit()
             registrar_auditoria("CREAR", "Fraccionamiento", f"Creado fraccionamiento: {nuevo.nombre}")
+            db.session.commit()
             return jsonify({"ok": True, "id": nuevo.id})
         except Exception as e:
             db.session.rollback()
@@ -149,12 +264,12 @@ def api_admin_fraccionamiento_detalle(id):
             if 'comision_propietario' in data: f.comision_propietario = data['comision_propietario']
             if 'comision_inmobiliaria' in data: f.comision_inmobiliaria = data['comision_inmobiliaria']
             if 'geojson' in data: 
-                f.geojson = data['geojson']
+                asignar_geometria(f, data['geojson'])
                 cambios.append("Se actualizó el mapa/polígono")
 
-            db.session.commit()
             if cambios:
                 registrar_auditoria("EDITAR", "Fraccionamiento", f"Editado {f.nombre}: {', '.join(cambios)}")
+            db.session.commit()
             return jsonify({"ok": True})
         except Exception as e:
             db.session.rollback()
@@ -165,8 +280,8 @@ def api_admin_fraccionamiento_detalle(id):
             return jsonify({"error": "No se puede eliminar, tiene lotes asociados"}), 400
         nombre = f.nombre
         db.session.delete(f)
-        db.session.commit()
         registrar_auditoria("ELIMINAR", "Fraccionamiento", f"Eliminado: {nombre}")
+        db.session.commit()
         return jsonify({"ok": True})
 
 @bp.route("/api/admin/lotes", methods=["POST"])
@@ -192,16 +307,99 @@ def api_admin_lotes_crear():
             estado=data.get('estado', 'disponible'),
             fraccionamiento_id=data['fraccionamiento_id'],
             geojson=data['geojson'],
-            activo=True
+            activo=True,
+            **derivados_geometria(data['geojson'])
         )
         db.session.add(nuevo)
-        db.session.commit()
+        db.session.flush()
+        _registrar_cambio_lote(nuevo, nuevo.to_feature()['properties'], nuevo.geojson)
         registrar_auditoria("CREAR", "Lote", f"Creado Lote {nuevo.numero_lote} Mz {nuevo.manzana} en Fracc ID {nuevo.fraccionamiento_id}")
+        db.session.commit()
         return jsonify({"ok": True, "id": nuevo.id})
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@bp.route("/api/admin/fraccionamientos/<int:id>/lotes/importar", methods=["POST"])
+@login_required
+def api_admin_lotes_importar(id):
+    # Carga masiva: recibe una FeatureCollection completa de lotes
+    f = Fraccionamiento.query.get_or_404(id)
+    data = request.get_json(force=True) or {}
+    features = data.get('features')
+    if data.get('type') != 'FeatureCollection' or not isinstance(features, list):
+        return jsonify({"error": "Se espera un GeoJSON de tipo FeatureCollection"}), 400
+    try:
+        cantidad, errores = importar_lotes(f.id, features)
+        if errores:
+            return jsonify({"error": "No se importó ningún lote", "detalles": errores}), 400
+        return jsonify({"ok": True, "importados": cantidad})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+def importar_lotes(fraccionamiento_id, features, tam_bloque=500):
+    """Valida e inserta en bloque los lotes de una FeatureCollection (también usado por el CLI).
+
+    Devuelve (cantidad_insertada, errores). Si hay algún error no se inserta nada.
+    """
+    errores = []
+    filas = []
+    claves = set()
+    for i, feat in enumerate(features, start=1):
+        props = (feat or {}).get('properties') or {}
+        try:
+            manzana = str(props['manzana']).strip()
+            numero_lote = str(props['numero_lote']).strip()
+            precio = float(props['precio'])
+            metros = int(float(props.get('metros_cuadrados', props.get('m2'))))
+        except (KeyError, TypeError, ValueError):
+            errores.append(f"Feature {i}: requiere manzana, numero_lote, precio y metros_cuadrados válidos")
+            continue
+        if not feat.get('geometry'):
+            errores.append(f"Feature {i}: sin geometría")
+            continue
+        estado = props.get('estado') or 'disponible'
+        if estado not in Lote.estado.type.enums:
+            errores.append(f"Feature {i}: estado '{estado}' inválido (use {', '.join(Lote.estado.type.enums)})")
+            continue
+        if (manzana, numero_lote) in claves:
+            errores.append(f"Feature {i}: Lote {numero_lote} Mz {manzana} repetido en el archivo")
+            continue
+        claves.add((manzana, numero_lote))
+        filas.append({
+            "numero_lote": numero_lote, "manzana": manzana, "precio": precio, "metros_cuadrados": metros,
+            "estado": estado, "fraccionamiento_id": fraccionamiento_id,
+            "geojson": feat['geometry'], "activo": True,
+            **derivados_geometria(feat['geometry'])
+        })
+
+    # Una sola consulta contra uq_lote_manzana_fracc (incluye lotes dados de baja)
+    existentes = {(m, n) for m, n in db.session.query(Lote.manzana, Lote.numero_lote).filter(Lote.fraccionamiento_id == fraccionamiento_id)}
+    for fila in filas:
+        if (fila['manzana'], fila['numero_lote']) in existentes:
+            errores.append(f"El Lote {fila['numero_lote']} de la Manzana {fila['manzana']} ya existe en este fraccionamiento.")
+    if errores or not filas:
+        return 0, errores
+
+    for inicio in range(0, len(filas), tam_bloque):
+        db.session.execute(insert(Lote), filas[inicio:inicio + tam_bloque])
+
+    # IDs generados, para el feed de cambios (que también sincroniza el índice espacial).
+    # Mismo registro que el alta individual: propiedades del feature y geometría.
+    nuevos = {(m, n): lote_id for lote_id, m, n in db.session.query(Lote.id, Lote.manzana, Lote.numero_lote).filter(Lote.fraccionamiento_id == fraccionamiento_id)}
+    cambios = []
+    for fila in filas:
+        lote = Lote(id=nuevos[(fila['manzana'], fila['numero_lote'])], **fila) # Transitorio, solo para armar el feature
+        cambios.append({"lote_id": lote.id, "fraccionamiento_id": fraccionamiento_id,
+                        "propiedades": lote.to_feature()['properties'], "geometria": lote.geojson})
+    for inicio in range(0, len(cambios), tam_bloque):
+        db.session.execute(insert(LoteCambio), cambios[inicio:inicio + tam_bloque])
+    frac = Fraccionamiento.query.get(fraccionamiento_id)
+    registrar_auditoria("IMPORTAR", "Lote", f"Importados {len(filas)} lotes en Fracc {frac.nombre if frac else fraccionamiento_id}")
+    db.session.commit()
+    return len(filas), []
+
 @bp.route("/api/admin/lotes/<int:id>", methods=["PATCH", "DELETE"])
 @login_required
 def api_admin_lotes_detalle(id):
@@ -210,23 +408,30 @@ def api_admin_lotes_detalle(id):
     if request.method == "PATCH":
         data = request.json
         cambios = []
+        props = {} # Para el feed incremental del mapa
         try:
             if 'precio' in data and float(data['precio']) != float(lote.precio):
                 cambios.append(f"Precio: {lote.precio} -> {data['precio']}")
                 lote.precio = data['precio']
+                props['precio'] = float(data['precio'])
             
             if 'estado' in data and data['estado'] != lote.estado:
                 cambios.append(f"Estado: {lote.estado} -> {data['estado']}")
                 lote.estado = data['estado']
+                props['estado'] = data['estado']
             
-            if 'metros_cuadrados' in data: lote.metros_cuadrados = data['metros_cuadrados']
-            if 'numero_lote' in data: lote.numero_lote = data['numero_lote']
-            if 'manzana' in data: lote.manzana = data['manzana']
-            if 'geojson' in data: lote.geojson = data['geojson']
-
-            db.session.commit()
+            for campo in ('metros_cuadrados', 'numero_lote', 'manzana'):
+                if campo in data and data[campo] != getattr(lote, campo):
+                    setattr(lote, campo, data[campo])
+                    props[campo] = data[campo]
+            if 'geojson' in data:
+                asignar_geometria(lote, data['geojson'])
+
+            if props or 'geojson' in data:
+                _registrar_cambio_lote(lote, props, data.get('geojson'))
             if cambios:
                 registrar_auditoria("EDITAR", "Lote", f"Lote {lote.numero_lote} (Mz {lote.manzana}): {', '.join(cambios)}")
+            db.session.commit()
             return jsonify({"ok": True})
         except Exception as e:
             db.session.rollback()
@@ -236,8 +441,9 @@ def api_admin_lotes_detalle(id):
         # Baja lógica
         try:
             lote.activo = False
-            db.session.commit()
+            _registrar_cambio_lote(lote, {"activo": False})
             registrar_auditoria("ELIMINAR", "Lote", f"Eliminado Lote {lote.numero_lote} Mz {lote.manzana}")
+            db.session.commit()
             return jsonify({"ok": True})
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -394,9 +600,11 @@ def api_contratos():
 
             # 9. Actualizar estado del lote
             lote.estado = "vendido" if c.tipo_contrato == "venta" else "reservado"
+            _registrar_cambio_lote(lote, {"estado": lote.estado})
+            saldos.actualizar([c.id])
             
-            db.session.commit()
             registrar_auditoria("CREAR", "Contrato", f"Nuevo contrato {c.numero_contrato} (Cliente ID {c.cliente_id})")
+            db.session.commit()
             return jsonify({"ok": True, "id": c.id}), 201
 
         except Exception as e:
@@ -428,13 +636,25 @@ def api_contrato_detalle(id):
             
             if nuevo == 'rescindido':
                 c.lote.estado = 'disponible'
-                Cuota.query.filter(Cuota.contrato_id == c.id, Cuota.estado != 'pagada').delete()
+                _registrar_cambio_lote(c.lote, {"estado": "disponible"})
+                impagas = Cuota.query.filter(Cuota.contrato_id == c.id, Cuota.estado != 'pagada')
+                resumenes.anotar("servicios", -1, Cuota.contrato_id == c.id, Cuota.estado != 'pagada')
+                impagas.delete()
                 cambios.append("Lote liberado y deuda eliminada")
+                saldos.actualizar([c.id])
 
-        db.session.commit()
         if cambios: registrar_auditoria("EDITAR", "Contrato", f"ID {c.id}: {'; '.join(cambios)}")
+        db.session.commit()
         return jsonify({"ok": True})
 
+@bp.route("/admin/inventario/fraccionamientos/<int:fid>/miniatura.png")
+@login_required
+def miniatura_fraccionamiento(fid):
+    # Plano del fraccionamiento coloreado por estado (cacheado en disco por versión)
+    ruta = miniaturas.ruta_miniatura(fid, resaltar_lote_id=request.args.get('lote_id', type=int))
+    if ruta is None: abort(404)
+    return send_file(ruta, mimetype='image/png', max_age=0)
+
 # --- GENERACIÓN DE PDF ---
 
 @bp.route("/admin/inventario/contrato_pdf/<int:contrato_id>")
@@ -523,6 +743,16 @@ En prueba de conformidad, se firman dos ejemplares de un mismo tenor y a un solo
     pdf.line(120, y, 180, y)
     pdf.text(135, y + 5, "EL COMPRADOR")
     
+    # Anexo: Plano de ubicación del lote
+    plano = miniaturas.ruta_miniatura(c.lote.fraccionamiento_id, resaltar_lote_id=c.lote_id)
+    if plano:
+        pdf.add_page()
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, clean("ANEXO: PLANO DE UBICACIÓN"), 0, 1, 'C')
+        pdf.set_font('Arial', '', 9)
+        pdf.cell(0, 6, clean(f"Lote N° {lote_nro} - Manzana {manzana} (borde azul). Verde: disponible, amarillo: reservado, rojo: vendido."), 0, 1, 'C')
+        pdf.image(plano, x=25, y=pdf.get_y() + 4, w=160)
+
     # Anexo: Tabla de Cuotas
     pdf.add_page()
     pdf.set_font('Arial', 'B', 12)
@@ -583,17 +813,22 @@ def api_lista_precios_lote(lote_id):
             # --- AQUÍ ESTÁ LA CORRECCIÓN PRINCIPAL ---
             lote = Lote.query.get(lote_id)
             if lote:
+                props = {}
                 # 1. Si es CONTADO (ID 1 o cuotas=1), actualizamos el precio base
                 if int(d.get('condicion_pago_id')) == 1 or int(d.get('cantidad_cuotas')) == 1:
                     lote.precio = float(d['precio_total'])
+                    props['precio'] = lote.precio
                     
                 # 2. Si es CRÉDITO 130 CUOTAS (o tiene 130 cuotas), actualizamos financiado
                 if int(d.get('cantidad_cuotas')) == 130:
                     lote.precio_financiado_130 = float(d['precio_total'])
                     lote.precio_cuota_130 = float(d['precio_cuota'])
+                    props['precio_financiado_130'] = lote.precio_financiado_130
+                    props['precio_cuota_130'] = lote.precio_cuota_130
+                if props: _registrar_cambio_lote(lote, props)
 
-            db.session.commit()
             registrar_auditoria("CREAR", "ListaPrecioLote", f"Plan de pago agregado a lote ID {lote_id}")
+            db.session.commit()
             return jsonify({"ok": True})
             
         except Exception as e:
@@ -605,8 +840,8 @@ def api_lista_precios_lote(lote_id):
 def api_eliminar_precio_lote(id):
     p = ListaPrecioLote.query.get_or_404(id)
     db.session.delete(p)
-    db.session.commit()
     registrar_auditoria("ELIMINAR", "ListaPrecioLote", f"Plan de pago eliminado ID {id}")
+    db.session.commit()
     return jsonify({"ok": True})
 
 # --- NUEVA API PARA BÚSQUEDA SIMPLE DE CLIENTES (SIN SELECT2) ---
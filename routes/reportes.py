@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, render_template, Response
-from flask_login import login_required
+from flask import Blueprint, request, jsonify, render_template, Response, send_file
+from flask_login import login_required, current_user
 from extensions import db
-from models import Gasto, Venta, Cliente, Funcionario, MovimientoCaja, DepositoBancario, Lote, ListaPrecioLote, Fraccionamiento, Contrato, Cuota, Pago
-from datetime import datetime, timedelta
-from fpdf import FPDF
-from sqlalchemy import func
+from models import Gasto, Venta, Cliente, Funcionario, MovimientoCaja, DepositoBancario, Lote, ListaPrecioLote, Fraccionamiento, Contrato, Cuota, Pago, Proveedor, CategoriaGasto, FormaPago, \
+    CondicionPago, ResumenDiarioCobro, ResumenDiarioCaja, ResumenDiarioGasto, ResumenDiarioServicio
+from datetime import datetime, timedelta, date
+from sqlalchemy import func, select, or_, case, literal
+from sqlalchemy.orm import joinedload, contains_eager, load_only
+import numpy as np
+import mora
+import cartera
+import trabajos
+import liquidaciones
+import exportar
 
 bp = Blueprint('reportes', __name__)
 
@@ -12,54 +19,115 @@ bp = Blueprint('reportes', __name__)
 @bp.route("/admin/inventario/reportes/inmuebles")
 @login_required
 def reporte_inmuebles_view():
-    lotes = Lote.query.join(Fraccionamiento).order_by(Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote).all()
-    return render_template("reportes/listado_inmuebles.html", lotes=lotes)
+    # Las filas se piden por páginas a /api/reportes/inmuebles
+    return render_template("reportes/listado_inmuebles.html",
+                           fraccionamientos=Fraccionamiento.query.options(load_only(Fraccionamiento.id, Fraccionamiento.nombre)).order_by(Fraccionamiento.nombre).all())
 
 @bp.route("/admin/inventario/reportes/precios")
 @login_required
 def reporte_precios_view():
-    precios = ListaPrecioLote.query.join(Lote).join(Fraccionamiento).order_by(Fraccionamiento.nombre, Lote.manzana).all()
-    return render_template("reportes/listado_precios.html", precios=precios)
+    return render_template("reportes/listado_precios.html",
+                           fraccionamientos=Fraccionamiento.query.options(load_only(Fraccionamiento.id, Fraccionamiento.nombre)).order_by(Fraccionamiento.nombre).all(),
+                           condiciones=CondicionPago.query.order_by(CondicionPago.nombre).all())
 
 @bp.route("/admin/inventario/reportes/contratos")
 @login_required
 def reporte_contratos_view(): 
-    contratos = Contrato.query.order_by(Contrato.fecha_contrato.desc()).all()
-    return render_template("reportes/listado_contratos.html", contratos=contratos)
+    return render_template("reportes/listado_contratos.html",
+                           fraccionamientos=Fraccionamiento.query.options(load_only(Fraccionamiento.id, Fraccionamiento.nombre)).order_by(Fraccionamiento.nombre).all())
 
 @bp.route("/admin/cobros/reportes/arqueo")
 @login_required
 def reporte_arqueo_view(): return render_template("reportes/arqueo_caja.html")
 
+@bp.route("/admin/cobros/reportes/antiguedad")
+@login_required
+def reporte_antiguedad_view():
+    return render_template("reportes/antiguedad_cartera.html", datos=cartera.antiguedad())
+
 @bp.route("/admin/tesoreria/reportes/extracto")
 @login_required
 def reporte_extracto_view(): return render_template("reportes/extracto_bancario.html")
 
 # --- APIS DE DATOS ---
+# Los reportes con `formato` = csv|xlsx (en el JSON, el formulario o la URL) se
+# descargan como archivo en streaming en vez de devolver JSON (ver exportar.py).
+
+def _parametros():
+    # JSON desde fetch o formulario normal (las descargas se piden con un <form> POST)
+    return request.get_json(silent=True) or request.form
+
+def _formato_exportacion(parametros):
+    formato = request.args.get('formato') or parametros.get('formato')
+    return formato if formato in exportar.FORMATOS else None
+
+def _pagina_listado(base, clave, columnas, campos_busqueda, orden_defecto):
+    """Modo server-side de DataTables para los listados: búsqueda, orden y OFFSET/LIMIT en SQL.
+
+    `columnas` mapea el `data` de cada columna ordenable a su expresión. Devuelve
+    la consulta de la página y los contadores que espera DataTables.
+    """
+    args = request.args
+    inicio = max(args.get('start', 0, type=int), 0)
+    largo = min(args.get('length', 50, type=int), 500)
+    if largo < 0: largo = 500 # DataTables manda -1 para "todos"
+
+    busqueda = (args.get('search[value]') or '').strip()
+    filtro = or_(*[c.ilike(f"%{busqueda}%") for c in campos_busqueda]) if busqueda else None
+
+    # Total y filtrados en un solo agregado
+    coincide = case((filtro, 1), else_=0) if filtro is not None else literal(1)
+    total, filtrados = base.with_entities(func.count(clave), func.coalesce(func.sum(coincide), 0)).one()
+
+    query = base.filter(filtro) if filtro is not None else base
+    columna = args.get(f"columns[{args.get('order[0][column]', '')}][data]")
+    if columna in columnas:
+        orden = columnas[columna]
+        query = query.order_by(orden.desc() if args.get('order[0][dir]') == 'desc' else orden.asc(), clave)
+    else:
+        query = query.order_by(*orden_defecto, clave)
+    return query.offset(inicio).limit(largo), {
+        "draw": args.get('draw', 0, type=int),
+        "recordsTotal": total,
+        "recordsFiltered": int(filtrados),
+    }
 
 @bp.route("/api/reportes/gastos/resumen", methods=["POST"])
 @login_required
 def api_reporte_gastos():
-    data = request.json
+    data = _parametros()
     desde = datetime.strptime(data['fecha_desde'], "%Y-%m-%d").date()
     hasta = datetime.strptime(data['fecha_hasta'], "%Y-%m-%d").date()
-    
-    gastos = Gasto.query.filter(Gasto.fecha_factura >= desde, Gasto.fecha_factura <= hasta, Gasto.estado != 'anulado').all()
-    resumen = {}
-    detalles = []
-    total = 0
-    for g in gastos:
-        cat = g.categoria.nombre
-        resumen[cat] = resumen.get(cat, 0) + float(g.monto)
-        total += float(g.monto)
-        detalles.append(g.to_dict())
-        
-    return jsonify({"detalles": detalles, "resumen": [{"nombre": k, "total": v} for k, v in resumen.items()], "total_general": total})
+
+    formato = _formato_exportacion(data)
+    if formato:
+        q = (select(Gasto.fecha_factura, Proveedor.razon_social, Proveedor.ruc, Gasto.numero_factura, CategoriaGasto.nombre,
+                    Gasto.detalle, Gasto.estado, Gasto.fecha_pago, Gasto.monto)
+             .join(Proveedor, Gasto.proveedor_id == Proveedor.id)
+             .join(CategoriaGasto, Gasto.categoria_gasto_id == CategoriaGasto.id)
+             .where(Gasto.fecha_factura >= desde, Gasto.fecha_factura <= hasta, Gasto.estado != 'anulado')
+             .order_by(Gasto.fecha_factura, Gasto.id))
+        return exportar.respuesta(f"gastos_{desde.isoformat()}_{hasta.isoformat()}",
+                                  ["Fecha", "Proveedor", "RUC", "N° Factura", "Categoria", "Detalle", "Estado", "Fecha Pago", "Monto"],
+                                  exportar.filas(q), formato)
+
+    gastos = (Gasto.query.options(joinedload(Gasto.categoria), joinedload(Gasto.proveedor))
+              .filter(Gasto.fecha_factura >= desde, Gasto.fecha_factura <= hasta, Gasto.estado != 'anulado')
+              .order_by(Gasto.fecha_factura, Gasto.id).all())
+    detalles = [g.to_dict() for g in gastos]
+    # Totales por categoría desde el resumen diario
+    resumen = (db.session.query(CategoriaGasto.nombre, func.sum(ResumenDiarioGasto.monto))
+               .join(CategoriaGasto, ResumenDiarioGasto.categoria_gasto_id == CategoriaGasto.id)
+               .filter(ResumenDiarioGasto.fecha >= desde, ResumenDiarioGasto.fecha <= hasta, ResumenDiarioGasto.estado != 'anulado')
+               .group_by(CategoriaGasto.nombre).all())
+    resumen = [{"nombre": nombre, "total": float(total or 0)} for nombre, total in resumen]
+
+    return jsonify({"detalles": detalles, "resumen": resumen, "total_general": sum(r['total'] for r in resumen)})
 
 @bp.route("/api/reportes/ventas/resumen", methods=["POST"])
 @login_required
 def api_reporte_ventas_resumen():
-    data = request.json
+    data = _parametros()
     tipo = data.get('tipo') 
     
     # Convertir fechas
@@ -69,23 +137,22 @@ def api_reporte_ventas_resumen():
     except:
         return jsonify({"error": "Fechas inválidas"}), 400
 
-    # Consulta base sobre CUOTAS tipo 'servicio'
+    # Consulta base sobre el resumen diario de CUOTAS tipo 'servicio'
     query = db.session.query(
-        Cuota.observaciones, 
-        Cuota.estado,
-        func.count(Cuota.id).label('cantidad'),
-        func.sum(Cuota.valor_cuota).label('total')
+        ResumenDiarioServicio.servicio.label('observaciones'),
+        ResumenDiarioServicio.estado,
+        func.sum(ResumenDiarioServicio.cantidad).label('cantidad'),
+        func.sum(ResumenDiarioServicio.monto).label('total')
     ).filter(
-        Cuota.tipo == 'servicio',
-        Cuota.fecha_vencimiento >= fecha_desde,
-        Cuota.fecha_vencimiento <= fecha_hasta
+        ResumenDiarioServicio.fecha >= fecha_desde,
+        ResumenDiarioServicio.fecha <= fecha_hasta
     )
 
     resultados = []
 
     if tipo == 'servicios_tipo':
         # Agrupar por Nombre del Servicio (guardado en observaciones)
-        data_db = query.group_by(Cuota.observaciones).all()
+        data_db = query.group_by(ResumenDiarioServicio.servicio).all()
         for row in data_db:
             resultados.append({
                 "label": row.observaciones or "Varios",
@@ -95,7 +162,7 @@ def api_reporte_ventas_resumen():
             
     elif tipo == 'servicios_estado':
         # Agrupar por Estado (Pendiente vs Pagado)
-        data_db = query.group_by(Cuota.estado).all()
+        data_db = query.group_by(ResumenDiarioServicio.estado).all()
         for row in data_db:
             label = row.estado.upper()
             resultados.append({
@@ -107,49 +174,369 @@ def api_reporte_ventas_resumen():
     # Ordenar por total descendente
     resultados.sort(key=lambda x: x['total'], reverse=True)
 
+    formato = _formato_exportacion(data)
+    if formato:
+        return exportar.respuesta(f"ventas_{tipo}_{fecha_desde.isoformat()}_{fecha_hasta.isoformat()}",
+                                  ["Servicio" if tipo == 'servicios_tipo' else "Estado", "Cantidad", "Total"],
+                                  ((r['label'], r['cantidad'], r['total']) for r in resultados), formato)
     return jsonify(resultados)
 
+@bp.route("/api/reportes/cobros/resumen", methods=["POST"])
+@login_required
+def api_reporte_cobros_resumen():
+    # Cobros del período agrupados por dia|mes|fraccionamiento|forma_pago|vendedor, leídos del resumen diario
+    data = _parametros()
+    try:
+        desde = datetime.strptime(data['fecha_desde'], "%Y-%m-%d").date()
+        hasta = datetime.strptime(data['fecha_hasta'], "%Y-%m-%d").date()
+    except (KeyError, ValueError):
+        return jsonify({"error": "Fechas inválidas"}), 400
+    r = ResumenDiarioCobro
+    agrupaciones = {
+        "dia": r.fecha,
+        "mes": func.extract('year', r.fecha) * 100 + func.extract('month', r.fecha),
+        "fraccionamiento": r.fraccionamiento_id,
+        "forma_pago": r.forma_pago_id,
+        "vendedor": r.vendedor_id,
+    }
+    agrupar = data.get('agrupar') or 'mes'
+    if agrupar not in agrupaciones:
+        return jsonify({"error": f"agrupar debe ser uno de: {', '.join(agrupaciones)}"}), 400
+    clave = agrupaciones[agrupar]
+    q = (db.session.query(clave.label('clave'), r.moneda, func.sum(r.cantidad), func.sum(r.monto))
+         .filter(r.fecha >= desde, r.fecha <= hasta)
+         .group_by(clave, r.moneda).order_by(clave))
+    if data.get('fraccionamiento_id'):
+        q = q.filter(r.fraccionamiento_id == int(data['fraccionamiento_id']))
+    filas = q.all()
+
+    nombres = {}
+    if agrupar == "fraccionamiento":
+        nombres = dict(db.session.query(Fraccionamiento.id, Fraccionamiento.nombre).filter(Fraccionamiento.id.in_({f.clave for f in filas})))
+    elif agrupar == "forma_pago":
+        nombres = dict(db.session.query(FormaPago.id, FormaPago.nombre).filter(FormaPago.id.in_({f.clave for f in filas})))
+    elif agrupar == "vendedor":
+        nombres = {i: f"{n} {a}" for i, n, a in db.session.query(Funcionario.id, Funcionario.nombre, Funcionario.apellido).filter(Funcionario.id.in_({f.clave for f in filas}))}
+
+    def nombre(c):
+        if agrupar == "mes": return f"{int(c) // 100}-{int(c) % 100:02d}"
+        if agrupar == "dia": return str(c)
+        return nombres.get(c, "Sin asignar")
+    res = [{"clave": nombre(f.clave), "moneda": f.moneda, "cantidad": int(f[2] or 0), "total": float(f[3] or 0)} for f in filas]
+
+    formato = _formato_exportacion(data)
+    if formato:
+        return exportar.respuesta(f"cobros_por_{agrupar}_{desde.isoformat()}_{hasta.isoformat()}", [agrupar.replace('_', ' ').title(), "Moneda", "Cantidad", "Total"],
+                                  ((x['clave'], x['moneda'], x['cantidad'], x['total']) for x in res), formato)
+    return jsonify({"agrupar": agrupar, "filas": res})
+
 @bp.route("/api/reportes/arqueo", methods=["POST"])
 @login_required
 def api_reporte_arqueo():
-    d = request.json
+    d = _parametros()
     desde = datetime.strptime(d['fecha_desde'], "%Y-%m-%d")
     hasta = datetime.strptime(d['fecha_hasta'], "%Y-%m-%d") + timedelta(days=1)
-    movs = MovimientoCaja.query.filter(MovimientoCaja.caja_id == d['caja_id'], MovimientoCaja.fecha_hora >= desde, MovimientoCaja.fecha_hora < hasta).all()
-    ingresos = sum(m.monto for m in movs if m.tipo_movimiento == 'ingreso')
-    egresos = sum(m.monto for m in movs if m.tipo_movimiento == 'egreso')
+    formato = _formato_exportacion(d)
+    if formato:
+        q = (select(MovimientoCaja.fecha_hora, MovimientoCaja.tipo_movimiento, MovimientoCaja.concepto, Funcionario.nombre, MovimientoCaja.monto)
+             .outerjoin(Funcionario, MovimientoCaja.usuario_id == Funcionario.id)
+             .where(MovimientoCaja.caja_id == d['caja_id'], MovimientoCaja.fecha_hora >= desde, MovimientoCaja.fecha_hora < hasta)
+             .order_by(MovimientoCaja.fecha_hora, MovimientoCaja.id))
+        return exportar.respuesta(f"arqueo_caja_{d['caja_id']}_{d['fecha_desde']}_{d['fecha_hasta']}",
+                                  ["Fecha", "Tipo", "Concepto", "Usuario", "Monto"], exportar.filas(q), formato)
+    movs = (MovimientoCaja.query.options(joinedload(MovimientoCaja.usuario))
+            .filter(MovimientoCaja.caja_id == d['caja_id'], MovimientoCaja.fecha_hora >= desde, MovimientoCaja.fecha_hora < hasta)
+            .order_by(MovimientoCaja.fecha_hora, MovimientoCaja.id).all())
+    # Totales desde el resumen diario de la caja
+    totales = dict(db.session.query(ResumenDiarioCaja.tipo_movimiento, func.sum(ResumenDiarioCaja.monto))
+                   .filter(ResumenDiarioCaja.caja_id == d['caja_id'], ResumenDiarioCaja.fecha >= desde.date(), ResumenDiarioCaja.fecha < hasta.date())
+                   .group_by(ResumenDiarioCaja.tipo_movimiento).all())
+    ingresos, egresos = totales.get('ingreso') or 0, totales.get('egreso') or 0
     res = [{"fecha": m.fecha_hora.strftime("%d/%m %H:%M"), "tipo": m.tipo_movimiento, "concepto": m.concepto, "monto": float(m.monto), "usuario": m.usuario.nombre if m.usuario else ""} for m in movs]
     return jsonify({"movimientos": res, "total_ingresos": float(ingresos), "total_egresos": float(egresos), "saldo_periodo": float(ingresos-egresos)})
 
 @bp.route("/api/reportes/extracto", methods=["POST"])
 @login_required
 def api_reporte_extracto():
-    d = request.json
+    d = _parametros()
     desde = datetime.strptime(d['fecha_desde'], "%Y-%m-%d").date()
     hasta = datetime.strptime(d['fecha_hasta'], "%Y-%m-%d").date()
+    formato = _formato_exportacion(d)
+    if formato:
+        q = (select(DepositoBancario.fecha_deposito, DepositoBancario.referencia, DepositoBancario.concepto, DepositoBancario.estado, DepositoBancario.monto)
+             .where(DepositoBancario.cuenta_id == d['cuenta_id'], DepositoBancario.fecha_deposito >= desde, DepositoBancario.fecha_deposito <= hasta)
+             .order_by(DepositoBancario.fecha_deposito, DepositoBancario.id))
+        return exportar.respuesta(f"extracto_cuenta_{d['cuenta_id']}_{desde.isoformat()}_{hasta.isoformat()}",
+                                  ["Fecha", "Referencia", "Concepto", "Estado", "Monto"], exportar.filas(q), formato)
     deps = DepositoBancario.query.filter(DepositoBancario.cuenta_id == d['cuenta_id'], DepositoBancario.fecha_deposito >= desde, DepositoBancario.fecha_deposito <= hasta).all()
     return jsonify([{"fecha": dep.fecha_deposito.strftime("%d/%m/%Y"), "referencia": dep.referencia, "concepto": dep.concepto, "monto": float(dep.monto)} for dep in deps])
 
 @bp.route("/api/reportes/clientes/estado-cuenta", methods=["POST"])
 @login_required
 def api_reporte_estado_cuenta():
-    data = request.json
+    data = _parametros()
     cliente = Cliente.query.get_or_404(data['cliente_id'])
+    formato = _formato_exportacion(data)
+    if formato:
+        # Historial de pagos de todos los contratos del cliente
+        q = (select(Contrato.numero_contrato, Pago.fecha_pago, Cuota.tipo, Cuota.numero_cuota, FormaPago.nombre, Pago.referencia, Pago.monto)
+             .select_from(Pago)
+             .join(Contrato, Pago.contrato_id == Contrato.id)
+             .outerjoin(Cuota, Pago.cuota_id == Cuota.id)
+             .outerjoin(FormaPago, Pago.forma_pago_id == FormaPago.id)
+             .where(Contrato.cliente_id == cliente.id)
+             .order_by(Contrato.id, Pago.fecha_pago, Pago.id))
+        return exportar.respuesta(f"estado_cuenta_{cliente.documento}",
+                                  ["Contrato", "Fecha Pago", "Tipo", "Cuota", "Forma de Pago", "Referencia", "Monto"], exportar.filas(q), formato)
     contratos = Contrato.query.filter_by(cliente_id=cliente.id).all()
     res = {"cliente": f"{cliente.nombre} {cliente.apellido}", "documento": cliente.documento, "contratos": []}
+    # Mora de todas las cuotas vencidas del cliente en una sola pasada, sumada por contrato
+    filas, m = mora.cartera_vencida(cliente_id=cliente.id)
+    mora_por_contrato, vencido_por_contrato = {}, {}
+    if filas:
+        ids, inverso = np.unique(np.array([f.contrato_id for f in filas]), return_inverse=True)
+        mora_por_contrato = dict(zip(ids.tolist(), np.bincount(inverso, weights=m['interes']).tolist()))
+        vencido_por_contrato = dict(zip(ids.tolist(), np.bincount(inverso, weights=m['total']).tolist()))
     for c in contratos:
-        cuotas = Cuota.query.filter_by(contrato_id=c.id).all()
         pagos = Pago.query.filter_by(contrato_id=c.id).all()
         res["contratos"].append({
             "numero": c.numero_contrato, "lote": c.lote.numero_lote, 
             "total_contrato": float(c.valor_total),
-            "total_pagado": sum(float(p.monto) for p in pagos),
-            "saldo_pendiente": sum(float(cu.valor_cuota) for cu in cuotas if cu.estado != 'pagada'),
-            "cuotas_vencidas": len([cu for cu in cuotas if cu.estado == 'vencida']),
+            "total_pagado": float(c.total_pagado or 0),
+            "saldo_pendiente": float(c.saldo or 0),
+            "cuotas_vencidas": c.cuotas_vencidas or 0,
+            "proxima_cuota": c.proxima_cuota.isoformat() if c.proxima_cuota else None,
+            "interes_mora": mora_por_contrato.get(c.id, 0.0),
+            "deuda_vencida": vencido_por_contrato.get(c.id, 0.0),
             "historial_pagos": [p.to_dict() for p in pagos]
         })
     return jsonify(res)
 
+# --- LISTADOS (inmuebles, precios, contratos) ---
+# Las vistas usan DataTables server-side con Scroller: se piden sólo las filas
+# visibles a medida que se desplaza. Con ?formato=csv|xlsx se exporta el listado
+# completo con los mismos filtros.
+
+def _filtros_lote(args):
+    filtros = []
+    if args.get('fraccionamiento_id', type=int):
+        filtros.append(Lote.fraccionamiento_id == args.get('fraccionamiento_id', type=int))
+    if args.get('estado'):
+        filtros.append(Lote.estado == args['estado'])
+    return filtros
+
+@bp.route("/api/reportes/inmuebles", methods=["GET"])
+@login_required
+def api_reporte_inmuebles():
+    filtros = _filtros_lote(request.args)
+    formato = _formato_exportacion(request.args)
+    if formato:
+        q = (select(Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote, Lote.metros_cuadrados, Lote.precio, Lote.estado)
+             .join(Fraccionamiento, Lote.fraccionamiento_id == Fraccionamiento.id).where(*filtros)
+             .order_by(Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote))
+        return exportar.respuesta(f"inmuebles_{date.today().isoformat()}",
+                                  ["Fraccionamiento", "Manzana", "Lote", "Superficie (m2)", "Precio Contado", "Estado"],
+                                  exportar.filas(q), formato)
+
+    base = db.session.query(Lote).join(Lote.fraccionamiento).filter(*filtros)
+    query, respuesta = _pagina_listado(
+        base, Lote.id,
+        {'fraccionamiento': Fraccionamiento.nombre, 'ubicacion': Lote.manzana, 'metros_cuadrados': Lote.metros_cuadrados,
+         'precio': Lote.precio, 'estado': Lote.estado},
+        [Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote],
+        [Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote])
+    # Sin geojson: el listado no dibuja el polígono
+    lotes = query.options(load_only(Lote.id, Lote.manzana, Lote.numero_lote, Lote.metros_cuadrados, Lote.precio, Lote.estado),
+                          contains_eager(Lote.fraccionamiento).load_only(Fraccionamiento.id, Fraccionamiento.nombre)).all()
+    respuesta["data"] = [{
+        "id": l.id,
+        "fraccionamiento": l.fraccionamiento.nombre,
+        "ubicacion": f"M: {l.manzana} - L: {l.numero_lote}",
+        "manzana": l.manzana,
+        "numero_lote": l.numero_lote,
+        "metros_cuadrados": l.metros_cuadrados,
+        "precio": float(l.precio),
+        "estado": l.estado,
+    } for l in lotes]
+    return jsonify(respuesta)
+
+@bp.route("/api/reportes/precios", methods=["GET"])
+@login_required
+def api_reporte_precios():
+    filtros = _filtros_lote(request.args)
+    if request.args.get('condicion_pago_id', type=int):
+        filtros.append(ListaPrecioLote.condicion_pago_id == request.args.get('condicion_pago_id', type=int))
+    formato = _formato_exportacion(request.args)
+    if formato:
+        q = (select(Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote, CondicionPago.nombre, ListaPrecioLote.cantidad_cuotas,
+                    ListaPrecioLote.precio_cuota, ListaPrecioLote.precio_total)
+             .join(Lote, ListaPrecioLote.lote_id == Lote.id)
+             .join(Fraccionamiento, Lote.fraccionamiento_id == Fraccionamiento.id)
+             .join(CondicionPago, ListaPrecioLote.condicion_pago_id == CondicionPago.id).where(*filtros)
+             .order_by(Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote, ListaPrecioLote.cantidad_cuotas))
+        return exportar.respuesta(f"precios_{date.today().isoformat()}",
+                                  ["Fraccionamiento", "Manzana", "Lote", "Plan", "Cuotas", "Valor Cuota", "Total Financiado"],
+                                  exportar.filas(q), formato)
+
+    base = (db.session.query(ListaPrecioLote)
+            .join(ListaPrecioLote.lote).join(Lote.fraccionamiento)
+            .join(ListaPrecioLote.condicion_pago).filter(*filtros))
+    query, respuesta = _pagina_listado(
+        base, ListaPrecioLote.id,
+        {'fraccionamiento': Fraccionamiento.nombre, 'lote': Lote.manzana, 'condicion_pago': CondicionPago.nombre,
+         'cantidad_cuotas': ListaPrecioLote.cantidad_cuotas, 'precio_cuota': ListaPrecioLote.precio_cuota,
+         'precio_total': ListaPrecioLote.precio_total},
+        [Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote, CondicionPago.nombre],
+        [Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote, ListaPrecioLote.cantidad_cuotas])
+    precios = query.options(contains_eager(ListaPrecioLote.lote).load_only(Lote.id, Lote.manzana, Lote.numero_lote)
+                            .contains_eager(Lote.fraccionamiento).load_only(Fraccionamiento.id, Fraccionamiento.nombre),
+                            contains_eager(ListaPrecioLote.condicion_pago)).all()
+    respuesta["data"] = [{
+        "id": p.id,
+        "fraccionamiento": p.lote.fraccionamiento.nombre,
+        "lote": f"M: {p.lote.manzana} - L: {p.lote.numero_lote}",
+        "manzana": p.lote.manzana,
+        "numero_lote": p.lote.numero_lote,
+        "condicion_pago": p.condicion_pago.nombre,
+        "cantidad_cuotas": p.cantidad_cuotas,
+        "precio_cuota": float(p.precio_cuota),
+        "precio_total": float(p.precio_total),
+    } for p in precios]
+    return jsonify(respuesta)
+
+@bp.route("/api/reportes/contratos", methods=["GET"])
+@login_required
+def api_reporte_contratos():
+    # Listado de contratos con sus saldos materializados; página JSON o exportación con ?formato=csv|xlsx
+    filtros = []
+    if request.args.get('estado'):
+        filtros.append(Contrato.estado == request.args['estado'])
+    if request.args.get('fraccionamiento_id', type=int):
+        filtros.append(Lote.fraccionamiento_id == request.args.get('fraccionamiento_id', type=int))
+    formato = _formato_exportacion(request.args)
+    if formato:
+        q = (select(Contrato.numero_contrato, Contrato.fecha_contrato, Cliente.documento, (Cliente.nombre + ' ' + Cliente.apellido),
+                    Fraccionamiento.nombre, Lote.manzana, Lote.numero_lote, Contrato.moneda, Contrato.valor_total, Contrato.cantidad_cuotas,
+                    Contrato.total_pagado, Contrato.saldo, Contrato.cuotas_vencidas, Contrato.proxima_cuota, Contrato.estado)
+             .join(Cliente, Contrato.cliente_id == Cliente.id)
+             .join(Lote, Contrato.lote_id == Lote.id)
+             .join(Fraccionamiento, Lote.fraccionamiento_id == Fraccionamiento.id)
+             .where(*filtros)
+             .order_by(Contrato.fecha_contrato.desc(), Contrato.id.desc()))
+        return exportar.respuesta(f"contratos_{date.today().isoformat()}",
+                                  ["Contrato", "Fecha", "Documento", "Cliente", "Fraccionamiento", "Manzana", "Lote", "Moneda", "Valor Total",
+                                   "Cuotas", "Pagado", "Saldo", "Cuotas Vencidas", "Prox. Vencimiento", "Estado"],
+                                  exportar.filas(q), formato)
+
+    base = (db.session.query(Contrato)
+            .join(Contrato.cliente).join(Contrato.lote).join(Lote.fraccionamiento)
+            .filter(*filtros))
+    query, respuesta = _pagina_listado(
+        base, Contrato.id,
+        {'numero_contrato': Contrato.numero_contrato, 'cliente': Cliente.apellido, 'lote': Fraccionamiento.nombre,
+         'fecha_contrato': Contrato.fecha_contrato, 'valor_total': Contrato.valor_total, 'total_pagado': Contrato.total_pagado,
+         'saldo': Contrato.saldo, 'cuotas_vencidas': Contrato.cuotas_vencidas, 'proxima_cuota': Contrato.proxima_cuota,
+         'estado': Contrato.estado},
+        [Contrato.numero_contrato, Cliente.nombre, Cliente.apellido, Cliente.documento, Fraccionamiento.nombre],
+        [Contrato.fecha_contrato.desc(), Contrato.id.desc()])
+    contratos = query.options(contains_eager(Contrato.cliente).load_only(Cliente.id, Cliente.nombre, Cliente.apellido),
+                              contains_eager(Contrato.lote).load_only(Lote.id, Lote.manzana, Lote.numero_lote)
+                              .contains_eager(Lote.fraccionamiento).load_only(Fraccionamiento.id, Fraccionamiento.nombre)).all()
+    respuesta["data"] = [{
+        "id": c.id,
+        "numero_contrato": c.numero_contrato,
+        "cliente": f"{c.cliente.nombre} {c.cliente.apellido}",
+        "lote": f"{c.lote.fraccionamiento.nombre} - M:{c.lote.manzana} L:{c.lote.numero_lote}",
+        "fecha_contrato": c.fecha_contrato.strftime('%d/%m/%Y'),
+        "moneda": c.moneda or 'GS',
+        "valor_total": float(c.valor_total),
+        "total_pagado": float(c.total_pagado or 0),
+        "saldo": float(c.saldo or 0),
+        "cuotas_vencidas": c.cuotas_vencidas or 0,
+        "proxima_cuota": c.proxima_cuota.strftime('%d/%m/%Y') if c.proxima_cuota else None,
+        "estado": c.estado,
+    } for c in contratos]
+    return jsonify(respuesta)
+
+@bp.route("/api/reportes/cartera/antiguedad", methods=["GET"])
+@login_required
+def api_reporte_antiguedad_cartera():
+    # Deuda vencida por tramos de atraso (?formato=csv|xlsx exporta el detalle fraccionamiento/vendedor/cliente)
+    try:
+        fecha = datetime.strptime(request.args['fecha'], "%Y-%m-%d").date() if request.args.get('fecha') else date.today()
+    except ValueError:
+        return jsonify({"error": "Fecha inválida"}), 400
+    datos = cartera.antiguedad(fecha)
+
+    formato = _formato_exportacion(request.args)
+    if formato:
+        return exportar.respuesta(f"antiguedad_cartera_{fecha.isoformat()}",
+                                  ["Fraccionamiento", "Vendedor", "Documento", "Cliente", *[f"{t} dias" for t in datos['tramos']], "Total", "Cuotas"],
+                                  ((d['fraccionamiento'], d['vendedor'], d['documento'], d['cliente'], *[d[t] for t in datos['tramos']], d['total'], d['cuotas'])
+                                   for d in datos['detalle']), formato)
+
+    return jsonify({k: v for k, v in datos.items() if k != 'detalle'})
+
+@bp.route("/api/reportes/flujo-proyectado", methods=["GET"])
+@login_required
+def api_reporte_flujo_proyectado():
+    # Cobros esperados por mes de las cuotas impagas, por moneda y fraccionamiento (?formato=csv|xlsx para exportar)
+    meses = min(max(request.args.get('meses', 36, type=int), 1), cartera.MAX_MESES_PROYECCION)
+    try:
+        desde = datetime.strptime(request.args['desde'], "%Y-%m-%d").date() if request.args.get('desde') else None
+    except ValueError:
+        return jsonify({"error": "Fecha inválida"}), 400
+    datos = cartera.proyeccion_flujo(meses, desde, request.args.get('fraccionamiento_id', type=int))
+
+    formato = _formato_exportacion(request.args)
+    if formato:
+        return exportar.respuesta(f"flujo_proyectado_{datos['desde']}",
+                                  ["Fraccionamiento", "Moneda", "Vencido", *datos['meses'], "Total", "Inmobiliaria", "Propietario"],
+                                  ((f['nombre'], f['moneda'], f['vencido'], *f['mensual'], f['total'], f['total_inmobiliaria'], f['total_propietario'])
+                                   for f in datos['por_fraccionamiento']), formato)
+
+    return jsonify(datos)
+
+@bp.route("/api/reportes/cartera-vencida", methods=["GET"])
+@login_required
+def api_reporte_cartera_vencida():
+    # Todas las cuotas vencidas con su mora (?formato=csv|xlsx para exportar)
+    try:
+        fecha = datetime.strptime(request.args['fecha'], "%Y-%m-%d").date() if request.args.get('fecha') else date.today()
+    except ValueError:
+        return jsonify({"error": "Fecha inválida"}), 400
+    filas, m = mora.cartera_vencida(fecha, cliente_id=request.args.get('cliente_id', type=int),
+                                    fraccionamiento_id=request.args.get('fraccionamiento_id', type=int))
+    dias, interes, total = m['dias_atraso'].tolist(), m['interes'].tolist(), m['total'].tolist()
+
+    formato = _formato_exportacion(request.args)
+    if formato:
+        return exportar.respuesta(f"cartera_vencida_{fecha.isoformat()}", COLUMNAS_CARTERA_VENCIDA,
+                                  _filas_cartera_vencida(filas, dias, interes, total), formato)
+
+    cuotas = [{
+        "cuota_id": f.id, "contrato_id": f.contrato_id, "numero_contrato": f.numero_contrato,
+        "cliente_id": f.cliente_id, "cliente": f"{f.nombre} {f.apellido}", "documento": f.documento,
+        "fraccionamiento": f.fraccionamiento, "lote": f"Mz {f.manzana} - Lote {f.numero_lote}",
+        "tipo": f.tipo, "numero_cuota": f.numero_cuota, "fecha_vencimiento": f.fecha_vencimiento.isoformat(),
+        "dias_atraso": dias[i], "valor_cuota": float(f.valor_cuota), "interes_mora": interes[i], "total_pagar": total[i]
+    } for i, f in enumerate(filas)]
+    return jsonify({
+        "fecha": fecha.isoformat(),
+        "tasa_diaria": mora.tasa_diaria(),
+        "cuotas": cuotas,
+        "resumen": {"cantidad": len(filas), "capital": float(m['total'].sum() - m['interes'].sum()),
+                    "interes_mora": float(m['interes'].sum()), "total": float(m['total'].sum())}
+    })
+
+COLUMNAS_CARTERA_VENCIDA = ["Documento", "Cliente", "Telefono", "Contrato", "Fraccionamiento", "Manzana", "Lote", "Tipo", "Cuota",
+                            "Vencimiento", "Dias Atraso", "Valor Cuota", "Interes Mora", "Total"]
+
+def _filas_cartera_vencida(filas, dias, interes, total):
+    for i, f in enumerate(filas):
+        yield (f.documento, f"{f.nombre} {f.apellido}", f.telefono or "", f.numero_contrato, f.fraccionamiento, f.manzana, f.numero_lote,
+               f.tipo, f.numero_cuota, f.fecha_vencimiento, dias[i], f.valor_cuota, interes[i], total[i])
+
 @bp.route("/admin/reportes/liquidacion-propietario", methods=["GET"])
 @login_required
 def reporte_liquidacion_view():
@@ -170,122 +557,71 @@ def generar_liquidacion_pdf():
         return "Faltan datos para generar el reporte", 400
 
     fraccionamiento = Fraccionamiento.query.get_or_404(frac_id)
-    f_desde = datetime.strptime(fecha_ini, "%Y-%m-%d")
-    f_hasta = datetime.strptime(fecha_fin, "%Y-%m-%d") + timedelta(days=1) # Incluir todo el día final
-
-    # 2. Consultar Pagos de ese Fraccionamiento en el rango de fechas
-    # Join: Pago -> Contrato -> Lote -> Fraccionamiento
-    pagos = Pago.query.join(Contrato).join(Lote).filter(
-        Lote.fraccionamiento_id == frac_id,
-        Pago.fecha_pago >= f_desde,
-        Pago.fecha_pago < f_hasta
-    ).order_by(Pago.fecha_pago).all()
-
-    # 3. Configurar PDF
-    class PDF(FPDF):
-        def header(self):
-            self.set_font('Arial', 'B', 14)
-            self.cell(0, 10, 'LIQUIDACIÓN DE PROPIETARIO', 0, 1, 'C')
-            self.set_font('Arial', '', 10)
-            self.cell(0, 10, f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 0, 1, 'R')
-            self.line(10, 30, 200, 30)
-            self.ln(5)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-    pdf = PDF('L', 'mm', 'A4') # Horizontal para que quepan las columnas
-    pdf.add_page()
-    pdf.set_font('Arial', '', 11)
-
-    # 4. Datos del Encabezado
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(40, 10, "Fraccionamiento:", 0, 0)
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, fraccionamiento.nombre.upper(), 0, 1)
-    
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(40, 8, f"Período:", 0, 0)
-    pdf.set_font('Arial', '', 11)
-    pdf.cell(0, 8, f"Del {fecha_ini} al {fecha_fin}", 0, 1)
-    
-    pdf.cell(0, 5, "", 0, 1) # Espacio
+    return Response(_liquidacion_pdf(fraccionamiento, fecha_ini, fecha_fin), mimetype="application/pdf")
+
+def _liquidacion_pdf(fraccionamiento, fecha_ini, fecha_fin, progreso=None):
+    """Arma el PDF de liquidación de un fraccionamiento y devuelve los bytes."""
+    f_desde = datetime.strptime(fecha_ini, "%Y-%m-%d").date()
+    f_hasta = datetime.strptime(fecha_fin, "%Y-%m-%d").date()
+    datos, = liquidaciones.datos_liquidacion(f_desde, f_hasta, [fraccionamiento.id])
+    if progreso: progreso(50)
+    return liquidaciones.renderizar(datos)
+
+# --- REPORTES EN SEGUNDO PLANO ---
+# Los reportes largos se piden por /api/reportes/trabajos: la respuesta es inmediata
+# (un ID) y el worker web queda libre para cobros y ventas. El navegador consulta
+# el progreso y descarga el archivo al terminar (ver trabajos.py).
+
+@trabajos.registrar("liquidacion_propietario", "pdf", "application/pdf")
+def _trabajo_liquidacion(progreso, fraccionamiento_id, fecha_desde, fecha_hasta):
+    fraccionamiento = db.session.get(Fraccionamiento, int(fraccionamiento_id))
+    if not fraccionamiento:
+        raise ValueError("Fraccionamiento no encontrado")
+    contenido = _liquidacion_pdf(fraccionamiento, fecha_desde, fecha_hasta, progreso)
+    return contenido, f"liquidacion_{fraccionamiento.id}_{fecha_desde}_{fecha_hasta}.pdf"
+
+@trabajos.registrar("liquidaciones_mes", "zip", "application/zip")
+def _trabajo_liquidaciones_mes(progreso, mes):
+    # mes = "AAAA-MM": un PDF por fraccionamiento con pagos más el resumen consolidado
+    anio, nro_mes = (int(x) for x in mes.split("-"))
+    return liquidaciones.empaquetar(liquidaciones.generar_mes(anio, nro_mes, progreso)), f"liquidaciones_{anio}-{nro_mes:02d}.zip"
+
+@trabajos.registrar("cartera_vencida", "csv", "text/csv")
+def _trabajo_cartera_vencida(progreso, fecha=None, cliente_id=None, fraccionamiento_id=None):
+    fecha = datetime.strptime(fecha, "%Y-%m-%d").date() if fecha else date.today()
+    filas, m = mora.cartera_vencida(fecha, cliente_id=cliente_id, fraccionamiento_id=fraccionamiento_id)
+    progreso(50)
+    contenido = "".join(exportar.generar_csv(COLUMNAS_CARTERA_VENCIDA, _filas_cartera_vencida(filas, m['dias_atraso'].tolist(), m['interes'].tolist(), m['total'].tolist())))
+    return contenido.encode('utf-8'), f"cartera_vencida_{fecha.isoformat()}.csv"
+
+@bp.route("/api/reportes/trabajos", methods=["POST"])
+@login_required
+def api_enviar_trabajo():
+    data = request.get_json(silent=True) or {}
+    parametros = data.get('parametros') or {}
+    if not isinstance(parametros, dict):
+        return jsonify({"error": "Parámetros inválidos"}), 400
+    try:
+        trabajo_id = trabajos.enviar(data.get('tipo'), parametros, usuario_id=current_user.id)
+    except KeyError:
+        return jsonify({"error": f"Tipo de reporte desconocido. Disponibles: {', '.join(trabajos.tipos())}"}), 400
+    return jsonify({"id": trabajo_id, "estado": "pendiente"}), 202
 
-    # 5. Tabla de Detalles
-    # Encabezados
-    pdf.set_fill_color(200, 220, 255)
-    pdf.set_font('Arial', 'B', 9)
-    
-    # Definir anchos
-    w_fecha = 25
-    w_cliente = 50
-    w_lote = 25
-    w_cuota = 15
-    w_monto = 30
-    w_inmob = 35
-    w_prop = 35
-    
-    pdf.cell(w_fecha, 8, "Fecha", 1, 0, 'C', 1)
-    pdf.cell(w_cliente, 8, "Cliente", 1, 0, 'C', 1)
-    pdf.cell(w_lote, 8, "Lote", 1, 0, 'C', 1)
-    pdf.cell(w_cuota, 8, "N.Cuota", 1, 0, 'C', 1)
-    pdf.cell(w_monto, 8, "Monto Pagado", 1, 0, 'C', 1)
-    pdf.cell(w_inmob, 8, f"Inmob. ({fraccionamiento.comision_inmobiliaria}%)", 1, 0, 'C', 1)
-    pdf.cell(w_prop, 8, f"Prop. ({fraccionamiento.comision_propietario}%)", 1, 1, 'C', 1)
-
-    pdf.set_font('Arial', '', 9)
-    
-    total_recaudado = 0
-    total_inmobiliaria = 0
-    total_propietario = 0
-
-    for p in pagos:
-        # Cálculos Matemáticos
-        monto = float(p.monto)
-        # Porcentajes definidos en el fraccionamiento
-        com_inmob_pct = float(fraccionamiento.comision_inmobiliaria or 0) / 100
-        com_prop_pct = float(fraccionamiento.comision_propietario or 0) / 100
-        
-        monto_inmob = monto * com_inmob_pct
-        monto_prop = monto * com_prop_pct
-        
-        # Sumar totales
-        total_recaudado += monto
-        total_inmobiliaria += monto_inmob
-        total_propietario += monto_prop
-
-        # Datos visuales
-        cliente_nom = f"{p.contrato.cliente.nombre} {p.contrato.cliente.apellido}"
-        lote_nom = f"Mz{p.contrato.lote.manzana}-L{p.contrato.lote.numero_lote}"
-        n_cuota = str(p.cuota.numero_cuota) if p.cuota else "Ent" # Ent = Entrega inicial
-        
-        pdf.cell(w_fecha, 7, p.fecha_pago.strftime("%d/%m/%Y"), 1)
-        pdf.cell(w_cliente, 7, cliente_nom[:23], 1) # Cortar nombres largos
-        pdf.cell(w_lote, 7, lote_nom, 1, 0, 'C')
-        pdf.cell(w_cuota, 7, n_cuota, 1, 0, 'C')
-        pdf.cell(w_monto, 7, f"{int(monto):,}".replace(',', '.'), 1, 0, 'R')
-        pdf.cell(w_inmob, 7, f"{int(monto_inmob):,}".replace(',', '.'), 1, 0, 'R')
-        pdf.cell(w_prop, 7, f"{int(monto_prop):,}".replace(',', '.'), 1, 1, 'R')
-
-    # 6. Totales Finales
-    pdf.ln(5)
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(w_fecha + w_cliente + w_lote + w_cuota, 8, "TOTALES GENERALES:", 0, 0, 'R')
-    pdf.cell(w_monto, 8, f"{int(total_recaudado):,}".replace(',', '.'), 1, 0, 'R')
-    pdf.cell(w_inmob, 8, f"{int(total_inmobiliaria):,}".replace(',', '.'), 1, 0, 'R')
-    pdf.cell(w_prop, 8, f"{int(total_propietario):,}".replace(',', '.'), 1, 1, 'R')
-    
-    # Resumen de Liquidación
-    pdf.ln(10)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 10, "RESUMEN A LIQUIDAR", 1, 1, 'C', 1)
-    
-    pdf.cell(100, 10, "A FAVOR DE LA INMOBILIARIA:", 1)
-    pdf.cell(0, 10, f"Gs. {int(total_inmobiliaria):,}".replace(',', '.'), 1, 1, 'R')
-    
-    pdf.cell(100, 10, "A FAVOR DEL PROPIETARIO:", 1)
-    pdf.cell(0, 10, f"Gs. {int(total_propietario):,}".replace(',', '.'), 1, 1, 'R')
+@bp.route("/api/reportes/trabajos/<trabajo_id>", methods=["GET"])
+@login_required
+def api_estado_trabajo(trabajo_id):
+    estado = trabajos.consultar(trabajo_id)
+    if not estado or estado['usuario_id'] != current_user.id:
+        return jsonify({"error": "Trabajo no encontrado o vencido"}), 404
+    return jsonify({k: v for k, v in estado.items() if k != 'parametros'})
 
-    return Response(pdf.output(dest='S').encode('latin-1'), mimetype="application/pdf")
\ No newline at end of file
+@bp.route("/api/reportes/trabajos/<trabajo_id>/descarga", methods=["GET"])
+@login_required
+def api_descargar_trabajo(trabajo_id):
+    estado = trabajos.consultar(trabajo_id)
+    if not estado or estado['usuario_id'] != current_user.id:
+        return jsonify({"error": "Trabajo no encontrado o vencido"}), 404
+    if estado['estado'] != 'terminado':
+        return jsonify({"error": "El reporte todavía no está listo"}), 409
+    return send_file(trabajos.ruta_resultado(estado), mimetype=estado['mimetype'], download_name=estado['nombre'],
+                     as_attachment=estado['mimetype'] != "application/pdf") # Los PDF se abren en el navegador
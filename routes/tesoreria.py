@@ -7,6 +7,7 @@ from datetime import datetime
 from sqlalchemy import desc
 from decimal import Decimal  # Mantenemos esto para arreglar el error de sumas
 from utils import role_required, registrar_auditoria
+import fondos
 
 bp = Blueprint('tesoreria', __name__)
 
@@ -98,10 +99,10 @@ def api_abrir_caja():
         usuario_id=current_user.id
     )
     db.session.add(apertura)
+    registrar_auditoria("APERTURA", "Caja", f"Apertura Caja {caja.descripcion} con {monto_apertura:,.0f}")
     db.session.commit()
     
     session["caja_id"] = caja.id
-    registrar_auditoria("APERTURA", "Caja", f"Apertura Caja {caja.descripcion} con {monto_apertura:,.0f}")
     return jsonify({"ok": True, "message": f"Caja '{caja.descripcion}' abierta con Gs. {monto_apertura:,.0f}"})
 
 @bp.route("/api/admin/caja/cerrar", methods=["POST"])
@@ -116,7 +117,8 @@ def api_cerrar_caja():
         session.pop("caja_id", None)
         return jsonify({"error": "La caja no existe o ya está cerrada"}), 400
     
-    saldo_cierre = caja.saldo_actual
+    # Retiro de todo el saldo en la BD (sin leerlo y volver a escribirlo desde Python)
+    saldo_cierre = fondos.vaciar_caja(caja.id)
     
     # Registrar Movimiento de Cierre (Egreso para dejar en 0 o ajuste)
     cierre = MovimientoCaja(
@@ -130,12 +132,11 @@ def api_cerrar_caja():
     db.session.add(cierre)
     
     caja.abierta = False
-    caja.saldo_actual = 0
     caja.ultimo_arqueo = datetime.now()
+    registrar_auditoria("CIERRE", "Caja", f"Cierre Caja {caja.descripcion} con saldo {saldo_cierre:,.0f}")
     db.session.commit()
     
     session.pop("caja_id", None)
-    registrar_auditoria("CIERRE", "Caja", f"Cierre Caja {caja.descripcion} con saldo {saldo_cierre:,.0f}")
     return jsonify({"ok": True, "message": f"Caja '{caja.descripcion}' cerrada con saldo Gs. {saldo_cierre:,.0f}"})
 
 # ==========================================
@@ -161,8 +162,9 @@ def api_entidades_financieras():
         if not data.get('nombre'): return jsonify({"error": "El nombre es requerido"}), 400
         if EntidadFinanciera.query.filter_by(nombre=data['nombre']).first(): return jsonify({"error": "La entidad ya existe"}), 400
         entidad = EntidadFinanciera(nombre=data['nombre'])
-        db.session.add(entidad); db.session.commit()
+        db.session.add(entidad)
         registrar_auditoria("CREAR", "EntidadFinanciera", f"Nueva entidad: {entidad.nombre}")
+        db.session.commit()
         return jsonify(entidad.to_dict()), 201
     return jsonify([e.to_dict() for e in EntidadFinanciera.query.order_by(EntidadFinanciera.nombre).all()])
 
@@ -177,13 +179,14 @@ def api_entidad_financiera_detalle(eid):
         if EntidadFinanciera.query.filter(EntidadFinanciera.id != eid, EntidadFinanciera.nombre == data['nombre']).first():
             return jsonify({"error": "Ese nombre ya está en uso"}), 400
         entidad.nombre = data['nombre']
-        db.session.commit()
         registrar_auditoria("EDITAR", "EntidadFinanciera", f"Editada entidad ID {eid}")
+        db.session.commit()
         return jsonify(entidad.to_dict())
     if request.method == "DELETE":
         if entidad.cuentas: return jsonify({"error": "No se puede eliminar, tiene cuentas asociadas."}), 400
-        db.session.delete(entidad); db.session.commit()
+        db.session.delete(entidad)
         registrar_auditoria("ELIMINAR", "EntidadFinanciera", f"Eliminada entidad ID {eid}")
+        db.session.commit()
         return jsonify({"message": "Entidad eliminada"})
 
 @bp.route("/api/admin/cuentas-bancarias", methods=["GET", "POST"])
@@ -211,8 +214,9 @@ def api_cuentas_bancarias():
             moneda=data['moneda'],
             saldo=saldo_ini
         )
-        db.session.add(cuenta); db.session.commit()
+        db.session.add(cuenta)
         registrar_auditoria("CREAR", "CuentaBancaria", f"Nueva cuenta {cuenta.numero_cuenta}")
+        db.session.commit()
         return jsonify(cuenta.to_dict()), 201
     
     # GET
@@ -239,13 +243,14 @@ def api_cuenta_bancaria_detalle(cid):
         cuenta.titular = data.get('titular', cuenta.titular)
         cuenta.tipo_cuenta = data.get('tipo_cuenta', cuenta.tipo_cuenta)
         cuenta.moneda = data.get('moneda', cuenta.moneda)
-        db.session.commit()
         registrar_auditoria("EDITAR", "CuentaBancaria", f"Modificada cuenta {cuenta.numero_cuenta}")
+        db.session.commit()
         return jsonify(cuenta.to_dict())
     if request.method == "DELETE":
         if cuenta.depositos: return jsonify({"error": "No se puede eliminar, tiene depósitos asociados."}), 400
-        db.session.delete(cuenta); db.session.commit()
+        db.session.delete(cuenta)
         registrar_auditoria("ELIMINAR", "CuentaBancaria", f"Eliminada cuenta ID {cid}")
+        db.session.commit()
         return jsonify({"message": "Cuenta eliminada"})
 
 @bp.route("/api/admin/depositos", methods=["GET", "POST"])
@@ -274,12 +279,9 @@ def api_depositos():
                 usuario_id=current_user.id
             )
             
-            # CORRECCIÓN: Suma segura entre Decimal y Decimal (o 0)
-            saldo_actual = cuenta.saldo if cuenta.saldo else Decimal(0)
-            cuenta.saldo = saldo_actual + monto
-            
             # --- NUEVO: Si se indica que viene de CAJA, registrar el egreso ---
             origen = data.get('origen_fondos')
+            caja_origen = None
             if origen == 'caja':
                 caja_id = session.get('caja_id')
                 if caja_id:
@@ -294,11 +296,14 @@ def api_depositos():
                             usuario_id=current_user.id
                         )
                         db.session.add(mov)
-                        caja.saldo_actual = (caja.saldo_actual or Decimal(0)) - monto
+                        caja_origen = caja.id
 
             db.session.add(deposito)
-            db.session.commit()
+            # Saldos como incrementos en la BD, al final para bloquear las filas lo menos posible
+            fondos.mover_cuenta(cuenta.id, monto)
+            if caja_origen: fondos.mover_caja(caja_origen, -monto)
             registrar_auditoria("CREAR", "DepositoBancario", f"Depósito de {monto:,.0f} en Cta {cuenta.numero_cuenta}")
+            db.session.commit()
             return jsonify(deposito.to_dict()), 201
             
         except Exception as e:
@@ -323,13 +328,10 @@ def api_deposito_detalle(did):
     if deposito.estado == 'anulado':
         return jsonify({"error": "El depósito ya está anulado"}), 400
     
-    cuenta = deposito.cuenta
-    # Restar de forma segura
-    cuenta.saldo = (cuenta.saldo or Decimal(0)) - deposito.monto
-    
     deposito.estado = 'anulado'
-    db.session.commit()
+    fondos.mover_cuenta(deposito.cuenta_id, -deposito.monto)
     registrar_auditoria("ANULAR", "DepositoBancario", f"Anulado depósito ID {did}")
+    db.session.commit()
     return jsonify({"message": "Depósito anulado correctamente"})
 
 @bp.route("/api/admin/transferencias", methods=["POST"])
@@ -355,10 +357,6 @@ def api_transferencias_bancarias():
     if not cuenta_origen or not cuenta_destino:
         return jsonify({"error": "Una o ambas cuentas no existen"}), 404
     
-    saldo_origen = cuenta_origen.saldo or Decimal(0)
-    if saldo_origen < monto:
-        return jsonify({"error": "Saldo insuficiente en la cuenta de origen"}), 400
-    
     try:
         fecha_transferencia = datetime.strptime(data['fecha'], "%Y-%m-%d").date()
         concepto = data.get('concepto', 'Transferencia entre cuentas')
@@ -392,9 +390,6 @@ def api_transferencias_bancarias():
             elif moneda_origen == 'PYG' and moneda_destino == 'USD':
                 monto_credito = monto / rate
         
-        cuenta_origen.saldo = (cuenta_origen.saldo or Decimal(0)) - monto_debito
-        cuenta_destino.saldo = (cuenta_destino.saldo or Decimal(0)) + monto_credito
-        
         egreso = DepositoBancario(
             cuenta_id=cuenta_origen.id,
             fecha_deposito=fecha_transferencia,
@@ -416,9 +411,13 @@ def api_transferencias_bancarias():
         
         db.session.add(egreso)
         db.session.add(ingreso)
+        # Débito con control de saldo en el mismo UPDATE (sin leer antes ni bloquear con SELECT ... FOR UPDATE)
+        if fondos.mover_cuentas([(cuenta_origen.id, -monto_debito), (cuenta_destino.id, monto_credito)]) is None:
+            db.session.rollback()
+            return jsonify({"error": "Saldo insuficiente en la cuenta de origen"}), 400
+        registrar_auditoria("TRANSFERENCIA", "Tesoreria", f"Transf. {monto:,.0f} {moneda_origen} de Cta {cuenta_origen.numero_cuenta} a {cuenta_destino.numero_cuenta}")
         db.session.commit()
         
-        registrar_auditoria("TRANSFERENCIA", "Tesoreria", f"Transf. {monto:,.0f} {moneda_origen} de Cta {cuenta_origen.numero_cuenta} a {cuenta_destino.numero_cuenta}")
         
         return jsonify({"message": "Transferencia realizada con éxito"}), 201
         
@@ -496,15 +495,10 @@ def api_movimiento_manual():
         )
         db.session.add(mov)
         
-        saldo_actual = caja.saldo_actual or Decimal(0)
-        if tipo == 'ingreso':
-            caja.saldo_actual = saldo_actual + monto
-        else:
-            caja.saldo_actual = saldo_actual - monto
-            
-        db.session.commit()
+        saldo = fondos.mover_caja(caja.id, monto if tipo == 'ingreso' else -monto)
         registrar_auditoria("MOV_MANUAL", "Caja", f"{tipo.upper()} de {monto} en Caja {caja.id}")
-        return jsonify({"ok": True})
+        db.session.commit()
+        return jsonify({"ok": True, "saldo_actual": float(saldo or 0)})
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
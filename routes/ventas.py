@@ -5,6 +5,7 @@ from models import Cliente, Servicio, Cuota, Contrato, Funcionario, Profesion, T
 from datetime import datetime, date
 from sqlalchemy import or_, desc
 from utils import role_required, get_param, clean, registrar_auditoria
+import saldos
 
 bp = Blueprint('ventas', __name__)
 
@@ -101,8 +102,8 @@ def api_clientes_crud():
                 activo=True
             )
             db.session.add(c)
-            db.session.commit()
             registrar_auditoria("CREAR", "Cliente", f"Alta de cliente {c.nombre} {c.apellido}")
+            db.session.commit()
             return jsonify(c.to_dict())
         except Exception as e:
             db.session.rollback()
@@ -134,8 +135,8 @@ def api_cliente_individual(id):
             c.direccion = data.get('direccion', c.direccion)
             c.estado = data.get('estado', c.estado)
             
-            db.session.commit()
             registrar_auditoria("EDITAR", "Cliente", f"Modificación de cliente ID {c.id}")
+            db.session.commit()
             return jsonify(c.to_dict())
         except Exception as e:
             db.session.rollback()
@@ -145,8 +146,8 @@ def api_cliente_individual(id):
         try:
             c.activo = False
             c.estado = 'inactivo'
-            db.session.commit()
             registrar_auditoria("ELIMINAR", "Cliente", f"Baja de cliente ID {c.id}")
+            db.session.commit()
             return jsonify({"message": "Cliente eliminado"})
         except Exception as e:
             db.session.rollback()
@@ -251,8 +252,9 @@ def api_ventas_general():
                 db.session.flush()
                 created_ids.append(nueva_cuota.id)
             
-            db.session.commit()
+            saldos.actualizar([contrato.id])
             registrar_auditoria("CREAR", "Deuda", f"Se cargaron {len(created_ids)} servicios al contrato {contrato.numero_contrato}")
+            db.session.commit()
             return jsonify({"ok": True})
             
         except Exception as e:
@@ -263,13 +265,15 @@ def api_ventas_general():
 @login_required
 def api_eliminar_servicio_cargado(id):
     cuota = Cuota.query.get_or_404(id)
-    if cuota.estado != 'pendiente' or cuota.tipo != 'servicio':
+    # Impaga: 'vencida' también (el barrido de mora la cambia de estado al vencer)
+    if cuota.estado not in ('pendiente', 'vencida') or cuota.tipo != 'servicio':
         return jsonify({"error": "No se puede eliminar"}), 400
     
     try:
         db.session.delete(cuota)
-        db.session.commit()
+        saldos.actualizar([cuota.contrato_id])
         registrar_auditoria("ELIMINAR", "Deuda", f"Se eliminó el servicio pendiente ID {id}")
+        db.session.commit()
         return jsonify({"ok": True})
     except Exception as e:
         db.session.rollback()
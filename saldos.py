@@ -0,0 +1,69 @@
+from datetime import date
+
+from sqlalchemy import select, update, func
+
+from extensions import db
+from models import Contrato, Cuota, Pago
+import cartera
+
+# --- SALDOS MATERIALIZADOS DE CONTRATOS ---
+# total_cuotas, total_pagado, saldo (cuotas impagas), cuotas_vencidas y
+# proxima_cuota se recalculan en la BD con un UPDATE de subconsultas
+# correlacionadas, dentro de la transacción que modificó cuotas o pagos.
+# cuotas_vencidas cuenta las impagas con vencimiento anterior a hoy (estén o no
+# marcadas 'vencida'); el barrido diario de mora.marcar_vencidas vuelve a
+# calcular los contratos cuyas cuotas vencen sin otro movimiento.
+
+def _subconsultas():
+    de_contrato = Cuota.contrato_id == Contrato.id
+    impaga = Cuota.estado != 'pagada'
+    return {
+        "total_cuotas": select(func.coalesce(func.sum(Cuota.valor_cuota), 0)).where(de_contrato).scalar_subquery(),
+        "total_pagado": select(func.coalesce(func.sum(Pago.monto), 0)).where(Pago.contrato_id == Contrato.id).scalar_subquery(),
+        "saldo": select(func.coalesce(func.sum(Cuota.valor_cuota), 0)).where(de_contrato, impaga).scalar_subquery(),
+        "cuotas_vencidas": select(func.count(Cuota.id)).where(de_contrato, impaga, Cuota.fecha_vencimiento < date.today()).scalar_subquery(),
+        "proxima_cuota": select(func.min(Cuota.fecha_vencimiento)).where(de_contrato, impaga).scalar_subquery(),
+    }
+
+def actualizar(contrato_ids):
+    """Recalcula los saldos de los contratos dados. No confirma: el llamador hace el commit."""
+    ids = {int(i) for i in contrato_ids if i}
+    if not ids:
+        return
+    db.session.flush()
+    cartera.marcar_modificada() # La antigüedad de cartera cacheada se descarta al confirmar
+    db.session.execute(
+        update(Contrato).where(Contrato.id.in_(ids)).values(**_subconsultas())
+        .execution_options(synchronize_session=False)
+    )
+    # Los objetos Contrato ya cargados en la sesión deben releer los valores nuevos
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Contrato) and obj.id in ids:
+            db.session.expire(obj, list(_subconsultas().keys()))
+
+def verificar(tam_bloque=1000):
+    """[(contrato_id, campo, guardado, calculado)] de los contratos cuyo saldo materializado no coincide."""
+    calc = _subconsultas()
+    campos = list(calc.keys())
+    q = select(Contrato.id, *[getattr(Contrato, c) for c in campos], *[v.label(f"calc_{c}") for c, v in calc.items()]).order_by(Contrato.id)
+    diferencias = []
+    for fila in db.session.execute(q.execution_options(yield_per=tam_bloque)):
+        for c in campos:
+            guardado, calculado = getattr(fila, c), getattr(fila, f"calc_{c}")
+            if c in ("total_cuotas", "total_pagado", "saldo"):
+                distinto = round(float(guardado or 0), 2) != round(float(calculado or 0), 2)
+            else:
+                distinto = (guardado or None) != (calculado or None)
+            if distinto:
+                diferencias.append((fila.id, c, guardado, calculado))
+    return diferencias
+
+def reconstruir(contrato_ids=None, tam_bloque=500):
+    """Recalcula y confirma los saldos de los contratos dados (o de todos), por bloques."""
+    if contrato_ids is None:
+        contrato_ids = db.session.execute(select(Contrato.id).order_by(Contrato.id)).scalars().all()
+    contrato_ids = sorted(set(contrato_ids))
+    for i in range(0, len(contrato_ids), tam_bloque):
+        actualizar(contrato_ids[i:i + tam_bloque])
+        db.session.commit()
+    return len(contrato_ids)
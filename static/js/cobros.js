@@ -4,6 +4,8 @@ let clienteSeleccionadoId = null;
 let modalPago = null;
 let modalAbrirCaja = null;
 let cajaAbiertaGlobal = false;
+let cuotasCliente = {};   // id -> cuota del cliente seleccionado (con mora calculada)
+let cuotasLote = null;    // IDs a cobrar juntas, o null si el modal es de una sola cuota
 
 document.addEventListener('DOMContentLoaded', function() {
     // --- Modales ---
@@ -88,8 +90,9 @@ async function checkCajaEstado() {
     const estadoCajaSpan = document.getElementById('estado-caja');
     const btnAbrirCaja = document.getElementById('btn-abrir-caja');
     const btnCerrarCaja = document.getElementById('btn-cerrar-caja');
+    const btnReimprimir = document.getElementById('btn-reimprimir-recibos');
 
-    if (!estadoCajaSpan || !btnAbrirCaja || !btnCerrarCaja) return;
+    if (!estadoCajaSpan || !btnAbrirCaja || !btnCerrarCaja || !btnReimprimir) return;
 
     try {
         const response = await fetch('/api/admin/caja/estado');
@@ -103,11 +106,13 @@ async function checkCajaEstado() {
             estadoCajaSpan.className = 'badge bg-success';
             btnAbrirCaja.style.display = 'none';
             btnCerrarCaja.style.display = 'inline-block';
+            btnReimprimir.style.display = 'inline-block';
         } else {
             estadoCajaSpan.innerHTML = 'CERRADA';
             estadoCajaSpan.className = 'badge bg-danger';
             btnAbrirCaja.style.display = 'inline-block';
             btnCerrarCaja.style.display = 'none';
+            btnReimprimir.style.display = 'none';
         }
 
         actualizarBloqueoInterfaz();
@@ -129,15 +134,16 @@ function actualizarBloqueoInterfaz() {
             seccionCuotas.style.pointerEvents = 'none';
         }
         if(alerta) alerta.style.display = 'block';
-        document.querySelectorAll('.btn-pagar-cuota').forEach(btn => btn.disabled = true);
+        document.querySelectorAll('.btn-pagar-cuota, .chk-cuota').forEach(btn => btn.disabled = true);
     } else {
         if(seccionCuotas) {
             seccionCuotas.style.opacity = '1';
             seccionCuotas.style.pointerEvents = 'auto';
         }
         if(alerta) alerta.style.display = 'none';
-        document.querySelectorAll('.btn-pagar-cuota').forEach(btn => btn.disabled = false);
+        document.querySelectorAll('.btn-pagar-cuota, .chk-cuota').forEach(btn => btn.disabled = false);
     }
+    actualizarSeleccion();
 }
 
 async function abrirCaja() {
@@ -216,16 +222,19 @@ function seleccionarCliente(cliente) {
 
 async function cargarCuotasCliente(clienteId) {
     const tbody = document.getElementById('tbodyCuotas');
-    tbody.innerHTML = '<tr><td colspan="6" class="text-center">Cargando cuotas...</td></tr>';
+    tbody.innerHTML = '<tr><td colspan="7" class="text-center">Cargando cuotas...</td></tr>';
+    cuotasCliente = {};
+    actualizarSeleccion();
     try {
         const response = await fetch(`/api/admin/clientes/${clienteId}/cuotas`);
         const cuotas = await response.json();
         if (cuotas.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="6" class="text-center text-muted">Este cliente no tiene cuotas pendientes.</td></tr>';
+            tbody.innerHTML = '<tr><td colspan="7" class="text-center text-muted">Este cliente no tiene cuotas pendientes.</td></tr>';
             return;
         }
         tbody.innerHTML = '';
         cuotas.forEach(cuota => {
+            cuotasCliente[cuota.id] = cuota;
             const tr = document.createElement('tr');
             const fechaVenc = new Date(cuota.fecha_vencimiento + 'T00:00:00-00:00');
             const fechaFormateada = fechaVenc.toLocaleDateString('es-ES', { timeZone: 'UTC' });
@@ -249,6 +258,7 @@ async function cargarCuotasCliente(clienteId) {
             const disabledAttr = !cajaAbiertaGlobal ? 'disabled' : '';
 
             tr.innerHTML = `
+                <td><input type="checkbox" class="form-check-input chk-cuota" value="${cuota.id}" ${disabledAttr} onchange="actualizarSeleccion()"></td>
                 <td>${cuota.numero_contrato}</td>
                 <td>${cuota.numero_cuota}</td>
                 <td>${fechaFormateada} <br> ${diasAtrasoTexto}</td>
@@ -256,7 +266,7 @@ async function cargarCuotasCliente(clienteId) {
                     <strong class="${claseMonto}">Gs. ${montoFormateado}</strong>
                     ${infoInteres}
                 </td>
-                <td><span class="badge ${cuota.estado === 'pendiente' ? 'bg-secondary' : 'bg-danger'}">${cuota.estado}</span></td>
+                <td><span class="badge ${cuota.estado === 'vencida' || cuota.dias_atraso > 0 ? 'bg-danger' : 'bg-secondary'}">${cuota.dias_atraso > 0 ? 'vencida' : cuota.estado}</span></td>
                 <td>
                     <button class="btn btn-sm ${btnClass} btn-pagar-cuota" ${disabledAttr} onclick="abrirModalPago(${cuota.id}, ${cuota.total_pagar})">
                         Pagar Gs. ${cuota.total_pagar.toLocaleString('es-PY')}
@@ -270,7 +280,7 @@ async function cargarCuotasCliente(clienteId) {
 
     } catch (error) {
         console.error('Error cargando cuotas:', error);
-        tbody.innerHTML = '<tr><td colspan="6" class="text-center text-danger">Error al cargar la información.</td></tr>';
+        tbody.innerHTML = '<tr><td colspan="7" class="text-center text-danger">Error al cargar la información.</td></tr>';
     }
 }
 
@@ -283,6 +293,8 @@ function abrirModalPago(cuotaId, montoTotal) {
 
     const form = document.getElementById('formPago');
     form.reset();
+    cuotasLote = null;
+    document.getElementById('info-pago-lote').style.display = 'none';
     document.getElementById('pago-cuota-id').value = cuotaId;
     
     document.getElementById('pago-monto').value = new Intl.NumberFormat('es-PY').format(montoTotal); 
@@ -295,6 +307,38 @@ function abrirModalPago(cuotaId, montoTotal) {
     modalPago.show();
 }
 
+// --- COBRO DE VARIAS CUOTAS (UN SOLO RECIBO) ---
+function cuotasSeleccionadas() {
+    return Array.from(document.querySelectorAll('.chk-cuota:checked')).map(chk => parseInt(chk.value));
+}
+
+function actualizarSeleccion() {
+    const btn = document.getElementById('btn-pagar-seleccionadas');
+    if (btn) btn.disabled = !cajaAbiertaGlobal || cuotasSeleccionadas().length === 0;
+}
+
+function abrirModalPagoLote() {
+    const ids = cuotasSeleccionadas();
+    if (!cajaAbiertaGlobal || ids.length === 0) return;
+
+    const form = document.getElementById('formPago');
+    form.reset();
+    cuotasLote = ids;
+    document.getElementById('pago-cuota-id').value = '';
+
+    const total = ids.reduce((acc, id) => acc + cuotasCliente[id].total_pagar, 0);
+    const info = document.getElementById('info-pago-lote');
+    info.textContent = `${ids.length} cuotas seleccionadas. Total: Gs. ${total.toLocaleString('es-PY', {maximumFractionDigits: 0})}`;
+    info.style.display = 'block';
+
+    document.getElementById('pago-monto').value = new Intl.NumberFormat('es-PY').format(Math.round(total));
+    document.getElementById('pago-fecha').valueAsDate = new Date();
+    document.getElementById('div-cuenta-destino').style.display = 'none';
+    document.getElementById('selectCuentaDestino').required = false;
+
+    modalPago.show();
+}
+
 async function registrarPago() {
     if (!cajaAbiertaGlobal) {
         alert("La caja está cerrada.");
@@ -307,9 +351,10 @@ async function registrarPago() {
     const data = Object.fromEntries(formData.entries());
 
     if(data.forma_pago_id) data.forma_pago_id = parseInt(data.forma_pago_id);
+    if (cuotasLote) data.cuota_ids = cuotasLote;
 
     try {
-        const response = await fetch('/api/admin/pagos', {
+        const response = await fetch(cuotasLote ? '/api/admin/pagos/lote' : '/api/admin/pagos', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -318,7 +363,10 @@ async function registrarPago() {
         
         if (response.ok) {
             modalPago.hide();
-            if (result.pago_id) {
+            if (result.recibo_url) {
+                window.open(result.recibo_url, '_blank');
+                if (result.vuelto > 0) alert(`Vuelto: Gs. ${result.vuelto.toLocaleString('es-PY')}`);
+            } else if (result.pago_id) {
                 window.open(`/admin/cobros/recibo/${result.pago_id}`, '_blank');
             }
             if (clienteSeleccionadoId) cargarCuotasCliente(clienteSeleccionadoId);
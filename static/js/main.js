@@ -153,6 +153,27 @@ document.addEventListener('DOMContentLoaded', function () {
 });
 
 // === UTILIDADES GLOBALES ===
+// Descarga de reportes en CSV/XLSX: un <form> POST normal para que el navegador guarde el archivo mientras llega
+window.descargarReporte = function(url, parametros, formato) {
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = url;
+    form.style.display = 'none';
+    const datos = Object.assign({}, parametros, { formato: formato });
+    const csrfTokenMeta = document.querySelector('meta[name="csrf-token"]');
+    if (csrfTokenMeta) datos.csrf_token = csrfTokenMeta.getAttribute('content');
+    Object.entries(datos).forEach(([nombre, valor]) => {
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = nombre;
+        input.value = valor ?? '';
+        form.appendChild(input);
+    });
+    document.body.appendChild(form);
+    form.submit();
+    form.remove();
+};
+
 window.parseMoney = function(str) {
     if (!str) return 0;
     return parseInt(str.toString().replace(/\./g, '')) || 0;
@@ -30,6 +30,55 @@ legend.addTo(map);
 let lotesLayer = null;
 let fracsLayer = null;
 let allFracsData = []; // Guardaremos los datos crudos aquí para buscarlos fácil
+let lotesUrl = '/api/lotes';
+let lotesBanda = null;
+let lotesBounds = null;  // Área ya cargada cuando se piden lotes por bbox
+let ultimoPedido = 0;
+let lotesPorId = {};      // id de lote -> capa, para aplicar el feed de cambios
+let cambiosSeq = null;    // Última secuencia aplicada de /api/lotes/changes
+let cambiosVentana = null; // Cambios recientes ya vistos (detecta ids confirmados tarde)
+
+// Desde este zoom se piden solo los lotes visibles (?bbox=), con margen para paneos cortos
+const ZOOM_BBOX = 14;
+
+// Mismas bandas que BANDAS_ZOOM en geometria.py: el servidor envía geometrías simplificadas
+function bandaZoom(z) {
+  if (z <= 11) return 11;
+  if (z <= 13) return 13;
+  if (z <= 15) return 15;
+  return null;
+}
+
+// Formato compacto de /api/lotes (ver codificar_geometria en geometria.py):
+// varints zigzag en base64 con las diferencias entre puntos cuantizados.
+// Sin operadores de bits: los valores absolutos superan los 32 bits.
+function decodificarGeometria(g, escala) {
+  if (!g || g.q === undefined) return g;
+  const bytes = Uint8Array.from(atob(g.q), c => c.charCodeAt(0));
+  let pos = 0, x = 0, y = 0;
+  const leer = () => {
+    let valor = 0, mult = 1, b;
+    do {
+      b = bytes[pos++];
+      valor += (b & 0x7f) * mult;
+      mult *= 128;
+    } while (b & 0x80);
+    return valor % 2 ? -(valor + 1) / 2 : valor / 2;
+  };
+  const poligono = tamanos => tamanos.map(n => {
+    const anillo = [];
+    for (let i = 0; i < n; i++) {
+      x += leer(); y += leer();
+      anillo.push([x / escala, y / escala]);
+    }
+    anillo.push(anillo[0]); // Cerrar el anillo
+    return anillo;
+  });
+  return {
+    type: g.type,
+    coordinates: g.type === 'Polygon' ? poligono(g.n) : g.n.map(poligono)
+  };
+}
 
 // Cargar Fraccionamientos
 fetch('/api/fraccionamientos')
@@ -66,53 +115,71 @@ fetch('/api/fraccionamientos')
   })
   .catch(console.error);
 
+// Contenido del popup (se arma al abrirlo, así refleja los cambios del feed)
+function contenidoPopupLote(props) {
+    // 1. Información Base (Siempre visible: Lote, Mz, Superficie, Estado)
+    let content = `
+        <div style="font-size: 14px; line-height: 1.5;">
+            <b>Manzana:</b> ${props.manzana}<br>
+            <b>Lote:</b> ${props.numero_lote}<br>
+            <b>Estado:</b> ${props.estado.toUpperCase()}<br>
+            <b>Superficie:</b> ${props.metros_cuadrados} m²
+    `;
+
+    // 2. Lógica de Precios (SOLO SE MUESTRA SI NO ESTÁ VENDIDO)
+    if (props.estado !== 'vendido') {
+        
+        // A) Precio Contado (Se muestra siempre que exista)
+        if (props.precio && props.precio > 0) {
+            content += `<br><b>Precio Contado:</b> Gs. ${props.precio.toLocaleString('es-PY')}`;
+        }
+
+        // B) Financiación 130 cuotas (Se agrega DEBAJO si existe)
+        if (props.precio_cuota_130 && props.precio_cuota_130 > 0) {
+            content += `
+                <div style="margin-top: 8px; padding: 8px; background-color: #e6fffa; border: 1px solid #38b2ac; border-radius: 5px; text-align: center;">
+                    <strong style="color: #234e52; display: block; margin-bottom: 2px;">¡FINANCIACIÓN PROPIA!</strong>
+                    <span style="font-size: 0.9em; color: #2c7a7b;">130 cuotas de:</span><br>
+                    <span style="font-size: 1.2em; font-weight: bold; color: #285e61;">
+                        Gs. ${props.precio_cuota_130.toLocaleString('es-PY')}
+                    </span>
+                </div>
+            `;
+        }
+    }
+    // Si es 'vendido', el código salta aquí directamente y no muestra precios.
+
+    content += `</div>`; // Cerrar div principal
+    return content;
+}
+
 // Función para cargar lotes
 function cargarLotes(url) {
-    fetch(url)
+    lotesUrl = url;
+    lotesBanda = bandaZoom(map.getZoom());
+    let params = `zoom=${map.getZoom()}&format=compact`;
+    lotesBounds = null;
+    if (map.getZoom() >= ZOOM_BBOX) {
+      lotesBounds = map.getBounds().pad(0.5);
+      params += `&bbox=${lotesBounds.toBBoxString()}`;
+    }
+    const pedido = ++ultimoPedido;
+    const sep = url.includes('?') ? '&' : '?';
+    fetch(`${url}${sep}${params}`)
       .then(r => r.json())
       .then(fc => {
+        if (pedido !== ultimoPedido) return; // Respuesta de un paneo anterior
+        if (fc.cuantizacion) {
+          fc.features.forEach(f => { f.geometry = decodificarGeometria(f.geometry, fc.cuantizacion.escala); });
+        }
         if (lotesLayer) map.removeLayer(lotesLayer);
+        lotesPorId = {};
 
         lotesLayer = L.geoJSON(fc, {
           style: feat => styleByEstado(feat.properties.estado),
           onEachFeature: (f, l) => {
-            const props = f.properties; 
-
-            // 1. Información Base (Siempre visible: Lote, Mz, Superficie, Estado)
-            let content = `
-                <div style="font-size: 14px; line-height: 1.5;">
-                    <b>Manzana:</b> ${props.manzana}<br>
-                    <b>Lote:</b> ${props.numero_lote}<br>
-                    <b>Estado:</b> ${props.estado.toUpperCase()}<br>
-                    <b>Superficie:</b> ${props.metros_cuadrados} m²
-            `;
-
-            // 2. Lógica de Precios (SOLO SE MUESTRA SI NO ESTÁ VENDIDO)
-            if (props.estado !== 'vendido') {
-                
-                // A) Precio Contado (Se muestra siempre que exista)
-                if (props.precio && props.precio > 0) {
-                    content += `<br><b>Precio Contado:</b> Gs. ${props.precio.toLocaleString('es-PY')}`;
-                }
-
-                // B) Financiación 130 cuotas (Se agrega DEBAJO si existe)
-                if (props.precio_cuota_130 && props.precio_cuota_130 > 0) {
-                    content += `
-                        <div style="margin-top: 8px; padding: 8px; background-color: #e6fffa; border: 1px solid #38b2ac; border-radius: 5px; text-align: center;">
-                            <strong style="color: #234e52; display: block; margin-bottom: 2px;">¡FINANCIACIÓN PROPIA!</strong>
-                            <span style="font-size: 0.9em; color: #2c7a7b;">130 cuotas de:</span><br>
-                            <span style="font-size: 1.2em; font-weight: bold; color: #285e61;">
-                                Gs. ${props.precio_cuota_130.toLocaleString('es-PY')}
-                            </span>
-                        </div>
-                    `;
-                }
-            }
-            // Si es 'vendido', el código salta aquí directamente y no muestra precios.
-
-            content += `</div>`; // Cerrar div principal
-
-            l.bindPopup(content);
+            lotesPorId[f.properties.id] = l;
+            l.bindPopup(() => contenidoPopupLote(l.feature.properties));
             
             // Efectos visuales al pasar el mouse
             l.on('mouseover', function(){ this.setStyle({ weight: 3, fillOpacity: 0.4 }); });
@@ -123,8 +190,35 @@ function cargarLotes(url) {
       .catch(console.error);
 }
 
-// Carga inicial
-cargarLotes('/api/lotes');
+// Feed incremental: aplica solo lo que cambió (estado, precio) sin volver a bajar la colección
+function aplicarCambios() {
+  if (cambiosSeq === null) return;
+  fetch(`/api/lotes/changes?since=${cambiosSeq}&ventana=${cambiosVentana}`)
+    .then(r => r.json())
+    .then(res => {
+      cambiosSeq = res.seq;
+      cambiosVentana = res.ventana;
+      let recargar = res.mas;
+      res.cambios.forEach(c => {
+        // Lotes nuevos, importados, dados de baja o con geometría nueva: se recarga la capa
+        if (c.geometry || 'activo' in c.properties) { recargar = true; return; }
+        const layer = lotesPorId[c.id];
+        if (!layer) return; // Fuera del área cargada
+        Object.assign(layer.feature.properties, c.properties);
+        layer.setStyle(styleByEstado(layer.feature.properties.estado));
+      });
+      if (recargar) cargarLotes(lotesUrl);
+    })
+    .catch(console.error);
+}
+
+// Carga inicial (la secuencia se toma antes, así no se pierde ningún cambio intermedio)
+fetch('/api/lotes/changes')
+  .then(r => r.json())
+  .then(res => { cambiosSeq = res.seq; cambiosVentana = res.ventana; })
+  .catch(console.error)
+  .finally(() => cargarLotes('/api/lotes'));
+setInterval(aplicarCambios, 30000);
 
 // EVENTO DE CAMBIO EN EL SELECT
 document.getElementById('sel-frac').addEventListener('change', e => {
@@ -150,5 +244,11 @@ document.getElementById('sel-frac').addEventListener('change', e => {
   }
 
   // Cargar lotes filtrados
-  cargarLotes(`/api/fraccionamientos/${fid}/lotes`);
+  cargarLotes(`/api/lotes?fraccionamiento_id=${fid}`);
+});
+
+// Al cambiar de banda de zoom o salir del área cargada se vuelven a pedir los lotes
+map.on('moveend', () => {
+  const fueraDeArea = map.getZoom() >= ZOOM_BBOX && (!lotesBounds || !lotesBounds.contains(map.getBounds()));
+  if (bandaZoom(map.getZoom()) !== lotesBanda || fueraDeArea) cargarLotes(lotesUrl);
 });
\ No newline at end of file
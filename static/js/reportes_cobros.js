@@ -12,6 +12,15 @@ document.addEventListener('DOMContentLoaded', function() {
         formArqueo.addEventListener('submit', generarReporteArqueo);
     }
 
+    // Historial de cobros: se inicializa al abrir la pestaña
+    const tabHistorial = document.getElementById('tab-historial-btn');
+    if (tabHistorial) {
+        tabHistorial.addEventListener('shown.bs.tab', inicializarHistorialCobros, { once: true });
+        document.getElementById('btnFiltrarHistorial').addEventListener('click', () => {
+            if (tablaHistorial) tablaHistorial.ajax.reload();
+        });
+    }
+
     // --- 2. LOGICA DEL BUSCADOR DE CLIENTES (TIPO NUEVO CONTRATO) ---
     const inputBusqueda = document.getElementById('cliente_buscador_reporte');
     const listaResultados = document.getElementById('lista_resultados_cliente_reporte');
@@ -78,6 +87,14 @@ document.addEventListener('DOMContentLoaded', function() {
 // FUNCIONES DE ARQUEO
 // ==========================================
 
+function exportarArqueo(formato) {
+    descargarReporte('/api/reportes/arqueo', {
+        caja_id: document.getElementById('cajaId').value,
+        fecha_desde: document.getElementById('fechaDesde').value,
+        fecha_hasta: document.getElementById('fechaHasta').value
+    }, formato);
+}
+
 async function generarReporteArqueo(e) {
     e.preventDefault();
     
@@ -148,6 +165,13 @@ function renderizarTablaArqueo(reporte) {
 // FUNCIONES DE ESTADO DE CUENTA
 // ==========================================
 
+function exportarEstadoCuenta(formato) {
+    // Historial de pagos de todos los contratos del cliente
+    descargarReporte('/api/reportes/clientes/estado-cuenta', {
+        cliente_id: document.getElementById('cliente_id_reporte').value
+    }, formato);
+}
+
 async function generarEstadoCuenta() {
     const clienteId = document.getElementById('cliente_id_reporte').value;
     
@@ -277,4 +301,49 @@ function formatoFecha(fechaIso) {
     if (!fechaIso) return '';
     const fecha = new Date(fechaIso);
     return fecha.toLocaleDateString('es-PY');
-}
\ No newline at end of file
+}
+
+// --- HISTORIAL DE COBROS (DataTables server-side) ---
+let tablaHistorial = null;
+
+function inicializarHistorialCobros() {
+    // Al avanzar de a una página con el orden por defecto se pide por cursor (fecha, id)
+    // en lugar de OFFSET; cualquier otro salto usa start/length.
+    let ultimo = { start: null, cursor: null };
+
+    tablaHistorial = $('#tablaHistorialCobros').DataTable({
+        serverSide: true,
+        processing: true,
+        pageLength: 25,
+        order: [[0, 'desc']],
+        language: { url: "//cdn.datatables.net/plug-ins/1.13.6/i18n/es-ES.json" },
+        ajax: {
+            url: '/api/cobros/historial',
+            data: function (d) {
+                d.fecha_inicio = document.getElementById('historialDesde').value;
+                d.fecha_fin = document.getElementById('historialHasta').value;
+                const porDefecto = d.order.length && d.order[0].column === 0 && d.order[0].dir === 'desc' && !d.search.value;
+                if (porDefecto && ultimo.cursor && d.start === ultimo.start + d.length) {
+                    d.cursor = ultimo.cursor;
+                }
+                ultimo.start = d.start;
+            },
+            dataSrc: function (json) {
+                ultimo.cursor = json.cursor;
+                return json.data;
+            }
+        },
+        columns: [
+            { data: 'fecha' },
+            { data: 'recibo' },
+            { data: 'cliente' },
+            { data: 'concepto', orderable: false },
+            { data: 'monto', className: 'text-end', render: m => new Intl.NumberFormat('es-PY').format(m) },
+            { data: 'forma_pago' },
+            {
+                data: 'recibo_url', orderable: false,
+                render: url => `<a href="${url}" target="_blank" class="btn btn-sm btn-info" title="Imprimir Recibo"><i class="fas fa-print"></i></a>`
+            }
+        ]
+    });
+}
@@ -48,6 +48,13 @@ async function generarReporteGastos(e) {
     }
 }
 
+function exportarGastos(formato) {
+    descargarReporte('/api/reportes/gastos/resumen', {
+        fecha_desde: document.getElementById('fechaDesde').value,
+        fecha_hasta: document.getElementById('fechaHasta').value
+    }, formato);
+}
+
 function renderizarReporte(data, desde, hasta) {
     // 1. Renderizar Resumen
     const tbodyRes = document.getElementById('tbodyResumen');
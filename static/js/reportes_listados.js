@@ -0,0 +1,46 @@
+/* static/js/reportes_listados.js */
+
+// Listados de inventario (inmuebles, precios, contratos): DataTables en modo
+// server-side con Scroller. Sólo se piden al servidor las filas visibles a medida
+// que se desplaza; búsqueda, orden y filtros se resuelven en SQL.
+// Los <select data-filtro="campo"> de la página se envían como parámetros y
+// recargan la tabla al cambiar.
+
+function filtrosListado() {
+    const filtros = {};
+    document.querySelectorAll('[data-filtro]').forEach(el => {
+        if (el.value) filtros[el.dataset.filtro] = el.value;
+    });
+    return filtros;
+}
+
+window.crearListado = function (selector, url, columnas, opciones = {}) {
+    const tabla = $(selector).DataTable(Object.assign({
+        serverSide: true,
+        processing: true,
+        deferRender: true,
+        scroller: { loadingIndicator: true },
+        scrollY: '60vh',
+        scrollCollapse: true,
+        language: dtLanguageES,
+        ajax: {
+            url: url,
+            data: function (d) { Object.assign(d, filtrosListado()); }
+        },
+        columns: columnas
+    }, opciones));
+
+    document.querySelectorAll('[data-filtro]').forEach(el => {
+        el.addEventListener('change', () => tabla.ajax.reload());
+    });
+    return tabla;
+};
+
+// Exporta el listado completo con los filtros actuales (?formato=csv|xlsx)
+window.exportarListado = function (url, formato) {
+    const params = new URLSearchParams(Object.assign(filtrosListado(), { formato: formato }));
+    window.location.href = `${url}?${params.toString()}`;
+};
+
+window.formatoMonto = m => formateadorPYG.format(m);
+window.badgeEstado = e => `<span class="badge estado-${e}">${e.toUpperCase()}</span>`;
@@ -34,6 +34,14 @@ async function cargarCuentasSelect() {
     }
 }
 
+function exportarExtracto(formato) {
+    descargarReporte('/api/reportes/extracto', {
+        cuenta_id: document.getElementById('cuentaId').value,
+        fecha_desde: document.getElementById('fechaDesde').value,
+        fecha_hasta: document.getElementById('fechaHasta').value
+    }, formato);
+}
+
 async function generarExtracto(e) {
     e.preventDefault();
     
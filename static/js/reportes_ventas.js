@@ -15,6 +15,14 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+function exportarVentas(formato) {
+    descargarReporte('/api/reportes/ventas/resumen', {
+        tipo: document.getElementById('tipoReporte').value,
+        fecha_desde: document.getElementById('fechaDesde').value,
+        fecha_hasta: document.getElementById('fechaHasta').value
+    }, formato);
+}
+
 async function generarReporte(e) {
     e.preventDefault();
     
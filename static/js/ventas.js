@@ -418,9 +418,11 @@ async function cargarHistorialServicios() {
                 const tr = document.createElement('tr');
                 let badge = item.estado === 'pagada' ? 
                     '<span class="badge bg-success">COBRADO</span>' : 
+                    item.estado === 'vencida' ?
+                    '<span class="badge bg-danger">VENCIDO</span>' :
                     '<span class="badge bg-warning text-dark">PENDIENTE</span>';
                 
-                let btnEliminar = item.estado === 'pendiente' ? 
+                let btnEliminar = ['pendiente', 'vencida'].includes(item.estado) ? 
                     `<button class="btn btn-sm btn-outline-danger" onclick="eliminarCarga(${item.id})"><i class="fas fa-trash"></i></button>` : 
                     '';
 
@@ -0,0 +1,48 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+# --- TAREAS PROGRAMADAS EN PROCESO ---
+# Hilo de fondo que corre las tareas diarias al iniciar y luego cada día a la
+# HORA_EJECUCION. Activo por defecto (TAREAS_PROGRAMADAS=0 lo desactiva, p. ej.
+# si se usa el comando CLI desde cron). Con varios workers cada uno corre el
+# barrido: es seguro (las cuotas ya marcadas no vuelven a cumplir el filtro),
+# solo repite trabajo.
+HORA_EJECUCION = 0
+MINUTO_EJECUCION = 5
+
+_hilo = None
+_lock = threading.Lock()
+
+def iniciar(app):
+    global _hilo
+    if _hilo is not None:
+        return
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle, args=(app,), name="tareas-programadas", daemon=True)
+            _hilo.start()
+
+def ejecutar_diarias(app):
+    """Tareas diarias; cada una es idempotente, así que repetirlas no hace daño."""
+    from extensions import db
+    import mora
+    with app.app_context():
+        try:
+            n = mora.marcar_vencidas()
+            if n: print(f" [TAREAS] {n} cuotas marcadas como vencidas")
+        except Exception as e:
+            db.session.rollback()
+            print(f"X ERROR EN BARRIDO DE VENCIDAS: {e}")
+
+def _bucle(app):
+    while True:
+        ejecutar_diarias(app)
+        time.sleep(_segundos_hasta_proxima())
+
+def _segundos_hasta_proxima():
+    ahora = datetime.now()
+    proxima = ahora.replace(hour=HORA_EJECUCION, minute=MINUTO_EJECUCION, second=0, microsecond=0)
+    if proxima <= ahora:
+        proxima += timedelta(days=1)
+    return (proxima - ahora).total_seconds()
@@ -0,0 +1,79 @@
+import os
+import random
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+# Las pruebas corren contra una BD descartable: TEST_DATABASE_URL (p. ej. un
+# esquema MySQL vacío) o, por defecto, un archivo SQLite temporal.
+_directorio = tempfile.mkdtemp(prefix="inmobiliaria_pruebas_")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(_directorio, 'pruebas.db')}"
+os.environ["TAREAS_PROGRAMADAS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as _app
+from extensions import db
+from models import Cliente, Contrato, Cuota, Fraccionamiento, Funcionario, Lote, Role
+import saldos
+from utils import buffer_auditoria
+
+
+@pytest.fixture(scope="session")
+def app():
+    _app.config.update(TESTING=True, WTF_CSRF_ENABLED=False,
+                       **{clave: os.path.join(_directorio, nombre) for clave, nombre in
+                          (("RECIBOS_DIR", "recibos"), ("MINIATURAS_DIR", "miniaturas"), ("TRABAJOS_DIR", "trabajos"))})
+    with _app.app_context():
+        db.create_all()
+    yield _app
+    buffer_auditoria.vaciar() # Antes de borrar las tablas (si no, se vacía al salir)
+    with _app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def cliente_admin(app):
+    """Cliente de pruebas con sesión iniciada como un funcionario con rol Admin."""
+    sufijo = random.randrange(10**9)
+    with app.app_context():
+        rol = Role.query.filter_by(name="Admin").first() or Role(name="Admin")
+        usuario = Funcionario(nombre="Admin", apellido="Pruebas", documento=f"F{sufijo}", usuario=f"admin{sufijo}",
+                              fecha_ingreso=date.today(), roles=[rol])
+        usuario.set_password("clave")
+        db.session.add(usuario)
+        db.session.commit()
+    cliente = app.test_client()
+    assert cliente.post("/login", data={"username": f"admin{sufijo}", "password": "clave"}).status_code == 302
+    return cliente
+
+
+@pytest.fixture
+def crear_contrato(app):
+    """Fábrica: contrato con `cuotas` cuotas mensuales de `valor` desde `primer_vencimiento`, en un lote propio. Devuelve su id."""
+    def crear(cuotas=6, valor=Decimal("100000"), primer_vencimiento=None, moneda="GS", comision=Decimal("10")):
+        sufijo = random.randrange(10**9)
+        primer_vencimiento = primer_vencimiento or date.today() - relativedelta(months=2)
+        with app.app_context():
+            frac = Fraccionamiento(nombre=f"Fraccionamiento {sufijo}", comision_inmobiliaria=comision,
+                                   comision_propietario=100 - comision, geojson={"type": "Polygon", "coordinates": []})
+            cliente = Cliente(documento=f"D{sufijo}", nombre="Cliente", apellido=f"Prueba {sufijo}")
+            db.session.add_all([frac, cliente])
+            db.session.flush()
+            lote = Lote(numero_lote="1", manzana="A", precio=valor * cuotas, metros_cuadrados=360,
+                        fraccionamiento_id=frac.id, geojson={"type": "Polygon", "coordinates": []})
+            db.session.add(lote)
+            db.session.flush()
+            contrato = Contrato(numero_contrato=f"C{sufijo}", cliente_id=cliente.id, lote_id=lote.id, fecha_contrato=primer_vencimiento,
+                                moneda=moneda, valor_total=valor * cuotas, cuota_inicial=0, cantidad_cuotas=cuotas, valor_cuota=valor)
+            db.session.add(contrato)
+            db.session.flush()
+            db.session.add_all([Cuota(contrato_id=contrato.id, numero_cuota=i + 1, valor_cuota=valor,
+                                      fecha_vencimiento=primer_vencimiento + relativedelta(months=i)) for i in range(cuotas)])
+            saldos.actualizar([contrato.id])
+            db.session.commit()
+            return contrato.id
+    return crear
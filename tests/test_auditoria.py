@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from extensions import db
+from geometria import asignar_geometria
+from models import AuditLog, Fraccionamiento, Lote
+from utils import buffer_auditoria, registrar_auditoria, rescatar_auditoria_pendiente
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    # Los registros rescatados quedan en esta lista en vez de ir a la BD
+    agregados = []
+    monkeypatch.setattr(buffer_auditoria, "agregar", agregados.append)
+    return agregados
+
+
+def _fin_de_peticion(app, estado, exc=None, deshacer=False):
+    with app.test_request_context("/"):
+        registrar_auditoria("EDITAR", "Prueba", f"estado {estado}")
+        if deshacer:
+            db.session.rollback()
+            registrar_auditoria("EDITAR", "Prueba", "después del rollback")
+        rescatar_auditoria_pendiente(exc, estado)
+        assert not [o for o in db.session.new if isinstance(o, AuditLog)]
+
+
+@pytest.mark.parametrize("estado, exc, deshacer, rescatados", [
+    (200, None, False, 1),
+    (302, None, False, 1),
+    (400, None, False, 0),
+    (500, None, False, 0),
+    (200, RuntimeError("x"), False, 0),
+    (None, None, False, 0),  # sin respuesta (after_request no corrió)
+    (200, None, True, 0),
+])
+def test_solo_se_rescatan_registros_de_operaciones_exitosas(app, buffer, estado, exc, deshacer, rescatados):
+    _fin_de_peticion(app, estado, exc, deshacer)
+    assert len(buffer) == rescatados
+
+
+def test_handler_que_devuelve_500_sin_rollback_no_audita(app, buffer, cliente_admin, monkeypatch):
+    with app.app_context():
+        frac = Fraccionamiento(nombre=f"Fraccionamiento auditoría {random.randrange(10**9)}", geojson={"type": "Polygon", "coordinates": []})
+        db.session.add(frac)
+        db.session.flush()
+        lote = Lote(numero_lote="1", manzana="A", precio=1000, metros_cuadrados=360, fraccionamiento_id=frac.id)
+        asignar_geometria(lote, {"type": "Polygon", "coordinates": [[[0, 0], [0, 1], [1, 1], [0, 0]]]})
+        db.session.add(lote)
+        db.session.commit()
+        lote_id = lote.id
+
+    # El commit del DELETE falla antes de escribir (p. ej. se cortó la conexión) y
+    # el handler devuelve 500 sin hacer rollback: el registro sigue pendiente
+    def commit_fallido():
+        raise RuntimeError("conexión perdida")
+    monkeypatch.setattr(db.session, "commit", commit_fallido)
+    r = cliente_admin.delete(f"/api/admin/lotes/{lote_id}")
+    assert r.status_code == 500
+    assert [f for f in buffer if f["tabla"] == "Lote"] == []
+    with app.app_context():
+        assert db.session.get(Lote, lote_id).activo is True
@@ -0,0 +1,79 @@
+import random
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from extensions import db
+from models import Caja, Cuota, MovimientoCaja, Pago
+
+
+@pytest.fixture
+def caja(app, cliente_admin):
+    with app.app_context():
+        c = Caja(descripcion=f"Caja cobros {random.randrange(10**9)}", saldo_actual=0, abierta=True)
+        db.session.add(c)
+        db.session.commit()
+        caja_id = c.id
+    with cliente_admin.session_transaction() as sesion:
+        sesion["caja_id"] = caja_id
+    return caja_id
+
+
+def _cuotas(app, contrato_id):
+    with app.app_context():
+        return [c.id for c in Cuota.query.filter_by(contrato_id=contrato_id).order_by(Cuota.numero_cuota)]
+
+
+def _cobrar(cliente, **datos):
+    return cliente.post("/api/admin/pagos/lote", json={"forma_pago_id": 1, "fecha_pago": date.today().isoformat(), **datos})
+
+
+def test_faltante_dentro_de_la_tolerancia_se_descuenta_de_la_ultima_cuota(app, cliente_admin, caja, crear_contrato):
+    # Cuotas sin vencer: sin mora, la deuda es exactamente 2 x 100.000
+    contrato_id = crear_contrato(cuotas=3, primer_vencimiento=date.today() + relativedelta(months=1))
+    ids = _cuotas(app, contrato_id)[:2]
+
+    r = _cobrar(cliente_admin, cuota_ids=ids, monto="199.940")
+    assert r.status_code == 400 and r.get_json()["error"] == "Monto insuficiente."
+
+    r = _cobrar(cliente_admin, cuota_ids=ids, monto="199.960")
+    assert r.status_code == 200, r.get_json()
+    assert (r.get_json()["total"], r.get_json()["vuelto"]) == (199960, 0)
+    with app.app_context():
+        pagos = Pago.query.filter(Pago.id.in_(r.get_json()["pago_ids"])).order_by(Pago.cuota_id).all()
+        assert [p.monto for p in pagos] == [Decimal("100000"), Decimal("99960")]
+        assert {c.estado for c in Cuota.query.filter(Cuota.id.in_(ids))} == {"pagada"}
+        assert db.session.get(Caja, caja).saldo_actual == Decimal("199960")
+
+
+def test_monto_sobrante_por_contrato_se_devuelve_como_vuelto(app, cliente_admin, caja, crear_contrato):
+    contrato_id = crear_contrato(cuotas=3, primer_vencimiento=date.today() + relativedelta(months=1))
+    ids = _cuotas(app, contrato_id)
+
+    r = _cobrar(cliente_admin, contrato_id=contrato_id, monto="250.000")
+    assert r.status_code == 200, r.get_json()
+    assert (r.get_json()["total"], r.get_json()["vuelto"]) == (200000, 50000)
+    with app.app_context():
+        # Se cubren las cuotas más antiguas; el vuelto no entra a la caja
+        assert [c.estado for c in Cuota.query.filter(Cuota.id.in_(ids)).order_by(Cuota.numero_cuota)] == ["pagada", "pagada", "pendiente"]
+        assert db.session.get(Caja, caja).saldo_actual == Decimal("200000")
+        assert sum(m.monto for m in MovimientoCaja.query.filter_by(caja_id=caja)) == Decimal("200000")
+
+    r = _cobrar(cliente_admin, contrato_id=contrato_id, monto="50.000")
+    assert r.status_code == 400
+
+
+def test_cuota_con_mora_exige_el_interes(app, cliente_admin, caja, crear_contrato):
+    # Primera cuota con 100 días de atraso (pasada la gracia): 100.000 x 0,0275 x 100 = 275.000 de mora
+    contrato_id = crear_contrato(cuotas=2, primer_vencimiento=date.today() - relativedelta(days=100))
+    primera = _cuotas(app, contrato_id)[0]
+
+    assert _cobrar(cliente_admin, cuota_ids=[primera], monto="100.000").status_code == 400
+    r = _cobrar(cliente_admin, cuota_ids=[primera])
+    assert r.status_code == 200, r.get_json()
+    assert r.get_json()["total"] == 375000
+    with app.app_context():
+        pago = db.session.get(Pago, r.get_json()["pago_ids"][0])
+        assert "Incluye mora: 275,000 Gs por 100 días" in pago.observaciones
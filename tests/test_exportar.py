@@ -0,0 +1,37 @@
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import exportar
+
+
+def _csv(columnas, filas):
+    return "".join(exportar.generar_csv(columnas, filas))
+
+
+def test_csv_conserva_los_decimales():
+    filas = [
+        ("USD", Decimal("1234.56"), 0.125, 150000, date(2026, 10, 1)),
+        ("GS", Decimal("100000.00"), 2.0, None, datetime(2026, 10, 1, 9, 5)),
+        ("USD", Decimal("0.01"), 1e-05, -3, None),
+    ]
+    texto = _csv(["Moneda", "Monto", "Tasa", "Cantidad", "Fecha"], filas)
+    assert texto.startswith("\ufeff")
+    lineas = list(csv.reader(io.StringIO(texto.lstrip("\ufeff")), delimiter=";"))
+    assert lineas == [
+        ["Moneda", "Monto", "Tasa", "Cantidad", "Fecha"],
+        ["USD", "1234,56", "0,125", "150000", "01/10/2026"],
+        ["GS", "100000,00", "2,0", "", "01/10/2026 09:05"],
+        ["USD", "0,01", "0,00001", "-3", ""],
+    ]
+
+
+def test_csv_por_bloques_con_acentos():
+    filas = [(f"Compañía {i}", Decimal(i) / 4) for i in range(exportar.FILAS_POR_BLOQUE + 5)]
+    bloques = list(exportar.generar_csv(["Razón social", "Monto"], filas))
+    assert len(bloques) == 2
+    lineas = "".join(bloques).encode("utf-8").decode("utf-8-sig").splitlines()
+    assert lineas[0] == "Razón social;Monto"
+    assert lineas[-1] == f"Compañía {exportar.FILAS_POR_BLOQUE + 4};{Decimal(exportar.FILAS_POR_BLOQUE + 4) / 4}".replace(".", ",")
+    assert len(lineas) == exportar.FILAS_POR_BLOQUE + 6
@@ -0,0 +1,110 @@
+import random
+import threading
+from decimal import Decimal
+
+import pytest
+
+import fondos
+from extensions import db
+from models import Caja, MovimientoCaja
+
+
+@pytest.fixture
+def caja(app):
+    with app.app_context():
+        c = Caja(descripcion=f"Caja prueba {random.randrange(10**9)}", saldo_actual=Decimal("1000.00"), abierta=True)
+        db.session.add(c)
+        db.session.commit()
+        caja_id = c.id
+    yield caja_id
+    with app.app_context():
+        db.session.delete(db.session.get(Caja, caja_id))
+        db.session.commit()
+
+
+def _saldo(app, caja_id):
+    with app.app_context():
+        return db.session.get(Caja, caja_id).saldo_actual
+
+
+def test_cajeros_concurrentes_no_pierden_movimientos(app, caja):
+    # Muchos hilos suman a la misma caja a la vez, cada movimiento en su propia
+    # transacción: el saldo final debe ser el inicial más todo lo sumado.
+    hilos, operaciones = 16, 50
+    sumas, errores = [Decimal(0)] * hilos, []
+
+    def cajero(n):
+        rnd = random.Random(n)
+        with app.app_context():
+            try:
+                for _ in range(operaciones):
+                    monto = Decimal(rnd.randint(-50000, 500000))
+                    fondos.mover_caja(caja, monto)
+                    db.session.commit()
+                    sumas[n] += monto
+            except Exception as e:
+                db.session.rollback()
+                errores.append(e)
+
+    hs = [threading.Thread(target=cajero, args=(i,)) for i in range(hilos)]
+    for h in hs: h.start()
+    for h in hs: h.join()
+
+    assert errores == []
+    assert _saldo(app, caja) == Decimal("1000.00") + sum(sumas)
+
+
+def test_egreso_sin_saldo_suficiente_no_modifica_la_caja(app, caja):
+    with app.app_context():
+        assert fondos.mover_caja(caja, Decimal("-1500"), permitir_negativo=False) is None
+        db.session.rollback()
+        assert fondos.mover_caja(caja, Decimal("-400"), permitir_negativo=False) == Decimal("600.00")
+        db.session.commit()
+    assert _saldo(app, caja) == Decimal("600.00")
+
+
+def test_cierre_simultaneo_con_cobros_no_pierde_dinero(app, caja):
+    # Cajeros cobrando mientras otro hilo cierra la caja varias veces: lo retirado
+    # en los cierres más lo que quedó debe ser el saldo inicial más lo cobrado.
+    hilos, operaciones = 8, 40
+    cobrado, retirado, errores = [Decimal(0)] * hilos, [], []
+
+    def cajero(n):
+        with app.app_context():
+            try:
+                for _ in range(operaciones):
+                    fondos.mover_caja(caja, Decimal(1000 + n))
+                    db.session.commit()
+                    cobrado[n] += 1000 + n
+            except Exception as e:
+                db.session.rollback()
+                errores.append(e)
+
+    def cierre():
+        with app.app_context():
+            try:
+                for _ in range(10):
+                    retirado.append(fondos.vaciar_caja(caja))
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                errores.append(e)
+
+    hs = [threading.Thread(target=cajero, args=(i,)) for i in range(hilos)] + [threading.Thread(target=cierre)]
+    for h in hs: h.start()
+    for h in hs: h.join()
+
+    assert errores == []
+    assert sum(retirado) + _saldo(app, caja) == Decimal("1000.00") + sum(cobrado)
+
+
+def test_cerrar_caja_registra_el_retiro_del_saldo(app, caja, cliente_admin):
+    with cliente_admin.session_transaction() as sesion:
+        sesion["caja_id"] = caja
+    r = cliente_admin.post("/api/admin/caja/cerrar")
+    assert r.status_code == 200, r.get_json()
+    with app.app_context():
+        c = db.session.get(Caja, caja)
+        assert (c.saldo_actual, c.abierta) == (0, False)
+        cierre = MovimientoCaja.query.filter_by(caja_id=caja, tipo_movimiento="egreso").one()
+        assert cierre.monto == Decimal("1000.00")
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from extensions import db
+from geometria import indice_lotes
+from models import Fraccionamiento, Lote, LoteCambio
+from routes.inventario import importar_lotes
+
+
+def _feature(manzana, numero, x, **extra):
+    return {"type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [[[x, -26.0], [x + 0.001, -26.0], [x + 0.001, -25.999], [x, -25.999], [x, -26.0]]]},
+            "properties": {"manzana": manzana, "numero_lote": numero, "precio": 25000000, "metros_cuadrados": 360, **extra}}
+
+
+@pytest.fixture
+def frac_id(app):
+    with app.app_context():
+        frac = Fraccionamiento(nombre=f"Fraccionamiento importación {random.randrange(10**9)}", geojson={"type": "Polygon", "coordinates": []})
+        db.session.add(frac)
+        db.session.commit()
+        return frac.id
+
+
+def test_estado_invalido_se_informa_y_no_se_importa_nada(app, frac_id):
+    with app.app_context():
+        cantidad, errores = importar_lotes(frac_id, [_feature("A", "1", -58.0), _feature("A", "2", -57.998, estado="libre")])
+        assert cantidad == 0
+        assert len(errores) == 1 and "Feature 2" in errores[0] and "libre" in errores[0]
+        assert Lote.query.filter_by(fraccionamiento_id=frac_id).count() == 0
+
+
+def test_importacion_registra_el_mismo_cambio_que_el_alta(app, frac_id):
+    features = [_feature("A", "1", -58.0), _feature("A", "2", -57.998, estado="reservado")]
+    with app.app_context():
+        assert importar_lotes(frac_id, features) == (2, [])
+        lotes = Lote.query.filter_by(fraccionamiento_id=frac_id).order_by(Lote.id).all()
+        assert [l.estado for l in lotes] == ["disponible", "reservado"]
+        cambios = {c.lote_id: c for c in LoteCambio.query.filter_by(fraccionamiento_id=frac_id)}
+        for lote, feat in zip(lotes, features):
+            assert cambios[lote.id].propiedades == lote.to_feature()["properties"]
+            assert cambios[lote.id].geometria == feat["geometry"]
+        assert indice_lotes.consultar_punto(-57.9975, -25.9995, frac_id) == [lotes[1].id]
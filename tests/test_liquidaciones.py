@@ -0,0 +1,72 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+import liquidaciones
+from extensions import db
+from models import Contrato, Cuota, Fraccionamiento, Lote, Pago
+
+DESDE, HASTA = date(2026, 3, 1), date(2026, 3, 31)
+
+
+def _liquidacion_por_pago(frac_id):
+    """Referencia: el recorrido pago por pago que hacía el reporte antes del motor vectorial."""
+    frac = db.session.get(Fraccionamiento, frac_id)
+    pagos = Pago.query.join(Contrato).join(Lote).filter(
+        Lote.fraccionamiento_id == frac_id,
+        Pago.fecha_pago >= datetime.combine(DESDE, datetime.min.time()),
+        Pago.fecha_pago < datetime.combine(HASTA, datetime.min.time()) + timedelta(days=1)
+    ).order_by(Pago.fecha_pago).all()
+    filas, totales = [], [0, 0, 0]
+    for p in pagos:
+        monto = float(p.monto)
+        inmob = monto * (float(frac.comision_inmobiliaria or 0) / 100)
+        prop = monto * (float(frac.comision_propietario or 0) / 100)
+        filas.append((p.fecha_pago.strftime("%d/%m/%Y"), f"{p.contrato.cliente.nombre} {p.contrato.cliente.apellido}",
+                      f"Mz{p.contrato.lote.manzana}-L{p.contrato.lote.numero_lote}",
+                      str(p.cuota.numero_cuota) if p.cuota else "Ent", monto, inmob, prop))
+        totales = [totales[0] + monto, totales[1] + inmob, totales[2] + prop]
+    return filas, totales
+
+
+@pytest.fixture
+def fraccionamientos(app, crear_contrato):
+    ids = []
+    for comision, montos in ((Decimal("10"), ("150000", "99999.99", "1234567.50")), (Decimal("12.5"), ("333333.33", "1"))):
+        contrato_id = crear_contrato(cuotas=len(montos), comision=comision)
+        with app.app_context():
+            contrato = db.session.get(Contrato, contrato_id)
+            cuotas = Cuota.query.filter_by(contrato_id=contrato_id).order_by(Cuota.numero_cuota).all()
+            for i, (monto, cuota) in enumerate(zip(montos, cuotas)):
+                # La primera como entrega inicial (sin cuota), la última en el último minuto del período
+                fecha = datetime(2026, 3, 31, 23, 59) if i == len(montos) - 1 else datetime(2026, 3, 5 + i, 10)
+                db.session.add(Pago(contrato_id=contrato_id, cuota_id=cuota.id if i else None, fecha_pago=fecha, monto=Decimal(monto)))
+            # Fuera del período
+            db.session.add(Pago(contrato_id=contrato_id, cuota_id=cuotas[0].id, fecha_pago=datetime(2026, 4, 1), monto=Decimal("777")))
+            db.session.commit()
+            ids.append(contrato.lote.fraccionamiento_id)
+    return ids
+
+
+def test_repartos_iguales_al_calculo_pago_por_pago(app, fraccionamientos):
+    with app.app_context():
+        datos = {d["fraccionamiento_id"]: d for d in liquidaciones.datos_liquidacion(DESDE, HASTA, fraccionamientos)}
+        assert set(datos) == set(fraccionamientos)
+        for frac_id in fraccionamientos:
+            d = datos[frac_id]
+            filas, (recaudado, inmobiliaria, propietario) = _liquidacion_por_pago(frac_id)
+            assert [(p["fecha"], p["cliente"], p["lote"], p["cuota"], m, i, pr) for p, m, i, pr in
+                    zip(d["pagos"], d["montos"], d["inmobiliaria"], d["propietario"])] == filas
+            assert d["total_recaudado"] == pytest.approx(recaudado)
+            assert d["total_inmobiliaria"] == pytest.approx(inmobiliaria)
+            assert d["total_propietario"] == pytest.approx(propietario)
+        assert datos[fraccionamientos[1]]["comision_inmobiliaria"] == 12.5
+        assert liquidaciones.renderizar(datos[fraccionamientos[0]]).startswith(b"%PDF")
+
+
+def test_fraccionamiento_pedido_sin_pagos_sale_vacio(app, fraccionamientos):
+    with app.app_context():
+        [d] = liquidaciones.datos_liquidacion(date(2025, 1, 1), date(2025, 1, 31), fraccionamientos[:1])
+        assert (d["pagos"], d["total_recaudado"], d["total_propietario"]) == ([], 0, 0)
+        assert liquidaciones.datos_liquidacion(date(2025, 1, 1), date(2025, 1, 31)) == []
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from extensions import db
+from geometria import asignar_geometria, indice_lotes
+from models import Fraccionamiento, Lote, LoteCambio
+
+
+def _cuadrado(x, y, lado=0.001):
+    return {"type": "Polygon", "coordinates": [[[x, y], [x + lado, y], [x + lado, y + lado], [x, y + lado], [x, y]]]}
+
+
+@pytest.fixture
+def lotes(app):
+    # Dos lotes en un fraccionamiento propio, cada uno con su alta en la bitácora
+    sufijo = random.randrange(10**9)
+    with app.app_context():
+        frac = Fraccionamiento(nombre=f"Fraccionamiento cambios {sufijo}", geojson=_cuadrado(-57.0, -25.0, 0.01))
+        db.session.add(frac)
+        db.session.flush()
+        ids = []
+        for i in range(2):
+            lote = Lote(numero_lote=str(i + 1), manzana="A", precio=1000, metros_cuadrados=360, fraccionamiento_id=frac.id)
+            asignar_geometria(lote, _cuadrado(-57.0 + i * 0.002, -25.0))
+            db.session.add(lote)
+            db.session.flush()
+            db.session.add(LoteCambio(lote_id=lote.id, fraccionamiento_id=frac.id, propiedades={"activo": True}))
+            ids.append(lote.id)
+        db.session.commit()
+        datos = frac.id, ids
+    yield datos
+
+
+def _cambio(lote_id, frac_id, id=None, **propiedades):
+    db.session.add(LoteCambio(id=id, lote_id=lote_id, fraccionamiento_id=frac_id, propiedades=propiedades))
+    db.session.commit()
+
+
+def test_feed_reenvia_cambios_confirmados_tarde(app, lotes):
+    frac_id, (a, b) = lotes
+    cliente = app.test_client()
+    inicio = cliente.get(f"/api/lotes/changes?fraccionamiento_id={frac_id}").get_json()
+
+    with app.app_context():
+        ultimo = db.session.query(db.func.max(LoteCambio.id)).scalar()
+        # Una transacción toma el id ultimo+1 pero confirma después de otra que usó ultimo+2
+        _cambio(b, frac_id, id=ultimo + 2, estado="reservado")
+    res = cliente.get(f"/api/lotes/changes?fraccionamiento_id={frac_id}&since={inicio['seq']}&ventana={inicio['ventana']}").get_json()
+    assert res["seq"] == ultimo + 2
+    assert res["cambios"] == [{"id": b, "properties": {"estado": "reservado"}}]
+
+    with app.app_context():
+        _cambio(a, frac_id, id=ultimo + 1, estado="vendido")
+    sigue = f"/api/lotes/changes?fraccionamiento_id={frac_id}&since={res['seq']}"
+    # Sin 'ventana' (clientes anteriores) el id menor no se ve
+    assert cliente.get(sigue).get_json()["cambios"] == []
+    tarde = cliente.get(f"{sigue}&ventana={res['ventana']}").get_json()
+    cambios = {c["id"]: c["properties"] for c in tarde["cambios"]}
+    assert cambios[a]["estado"] == "vendido"
+    assert cambios[b]["estado"] == "reservado"
+
+    # Con la ventana al día ya no se reenvía nada
+    final = cliente.get(f"/api/lotes/changes?fraccionamiento_id={frac_id}&since={tarde['seq']}&ventana={tarde['ventana']}").get_json()
+    assert final["cambios"] == [] and final["seq"] == tarde["seq"]
+
+
+def test_indice_aplica_cambios_confirmados_tarde(app, lotes):
+    frac_id, (a, b) = lotes
+    with app.app_context():
+        assert indice_lotes.consultar_punto(-56.9995, -24.9995, frac_id) == [a]
+        assert indice_lotes.consultar_punto(-56.9975, -24.9995, frac_id) == [b]
+
+        ultimo = db.session.query(db.func.max(LoteCambio.id)).scalar()
+        _cambio(b, frac_id, id=ultimo + 2, activo=False)
+        Lote.query.filter_by(id=b).update({"activo": False})
+        db.session.commit()
+        assert indice_lotes.consultar_punto(-56.9975, -24.9995, frac_id) == []
+
+        # Se mueve el lote A con un id de la bitácora menor que el ya aplicado
+        lote = db.session.get(Lote, a)
+        asignar_geometria(lote, _cuadrado(-56.995, -25.0))
+        db.session.add(LoteCambio(id=ultimo + 1, lote_id=a, fraccionamiento_id=frac_id, propiedades={}, geometria=lote.geojson))
+        db.session.commit()
+        assert indice_lotes.consultar_punto(-56.9995, -24.9995, frac_id) == []
+        assert indice_lotes.consultar_punto(-56.9945, -24.9995, frac_id) == [a]
@@ -0,0 +1,37 @@
+import os
+import random
+
+from extensions import db
+from geometria import asignar_geometria
+from models import Fraccionamiento, Lote
+import miniaturas
+
+
+def _fraccionamiento_con_lote(x):
+    frac = Fraccionamiento(nombre=f"Fraccionamiento miniatura {random.randrange(10**9)}",
+                           geojson={"type": "Polygon", "coordinates": [[[x, 0], [x + 1, 0], [x + 1, 1], [x, 0]]]})
+    db.session.add(frac)
+    db.session.flush()
+    lote = Lote(numero_lote="1", manzana="A", precio=1000, metros_cuadrados=360, fraccionamiento_id=frac.id)
+    asignar_geometria(lote, {"type": "Polygon", "coordinates": [[[x, 0], [x + 0.5, 0], [x + 0.5, 0.5], [x, 0]]]})
+    db.session.add(lote)
+    db.session.commit()
+    return frac.id, lote.id
+
+
+def test_solo_se_resaltan_lotes_del_fraccionamiento(app, cliente_admin):
+    with app.app_context():
+        frac_id, lote_id = _fraccionamiento_con_lote(10)
+        _, lote_ajeno = _fraccionamiento_con_lote(20)
+        carpeta = miniaturas.directorio()
+    url = f"/admin/inventario/fraccionamientos/{frac_id}/miniatura.png"
+
+    assert cliente_admin.get(url).status_code == 200
+    r = cliente_admin.get(f"{url}?lote_id={lote_id}")
+    assert r.status_code == 200 and r.mimetype == "image/png"
+    r.close()
+    antes = set(os.listdir(carpeta))
+
+    for invalido in (lote_ajeno, 987654321):
+        assert cliente_admin.get(f"{url}?lote_id={invalido}").status_code == 404
+    assert set(os.listdir(carpeta)) == antes
@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+import mora
+import resumenes
+import saldos
+from extensions import db
+from models import Contrato, Cuota, ResumenDiarioServicio
+
+HOY = date(2026, 6, 30)
+
+
+def test_mora_solo_pasada_la_gracia_y_por_todos_los_dias():
+    vencimientos = [HOY + timedelta(days=5), HOY, HOY - timedelta(days=mora.DIAS_GRACIA),
+                    HOY - timedelta(days=mora.DIAS_GRACIA + 1), HOY - timedelta(days=200)]
+    m = mora.calcular([100000] * 5, vencimientos, ["cuota"] * 5, HOY, tasa=0.01)
+    assert m["dias_atraso"].tolist() == [0, 0, 90, 91, 200]
+    assert m["interes"].tolist() == [0, 0, 0, 91000, 200000]
+    assert m["total"].tolist() == [100000, 100000, 100000, 191000, 300000]
+
+
+def test_servicios_no_generan_mora():
+    m = mora.calcular([50000, 50000], [HOY - timedelta(days=120)] * 2, ["servicio", "cuota"], HOY, tasa=0.01)
+    assert m["dias_atraso"].tolist() == [120, 120]
+    assert m["interes"].tolist() == [0, 60000]
+
+
+def test_interes_redondeado_a_centavos():
+    m = mora.calcular([333.33], [HOY - timedelta(days=91)], ["cuota"], HOY, tasa=0.0275)
+    assert m["interes"][0] == round(333.33 * 0.0275 * 91, 2)
+    assert mora.a_decimal(m["interes"][0]) == mora.a_decimal(834.16)
+
+
+def test_sin_cuotas_devuelve_arreglos_vacios():
+    m = mora.calcular([], [], [], HOY)
+    assert all(isinstance(v, np.ndarray) and v.size == 0 for v in m.values())
+
+
+@pytest.mark.parametrize("parametro, tasa", [("0,01", 0.01), ("0.02", 0.02), ("no es número", float(mora.TASA_DEFECTO))])
+def test_tasa_sale_del_parametro(monkeypatch, parametro, tasa):
+    monkeypatch.setattr(mora, "get_param", lambda clave, default: parametro)
+    assert mora.tasa_diaria() == tasa
+    m = mora.calcular([1000], [HOY - timedelta(days=100)], ["cuota"], HOY)
+    assert m["interes"][0] == round(1000 * tasa * 100, 2)
+
+
+def _resumen_servicios(dia):
+    filas = ResumenDiarioServicio.query.filter_by(fecha=dia).all()
+    return sorted((f.servicio, f.estado, f.cantidad, Decimal(f.monto)) for f in filas if f.cantidad)
+
+
+def test_barrido_marca_vencidas_por_bloques(app, crear_contrato):
+    contrato_id = crear_contrato(cuotas=4)  # Vencimientos: hace 2 meses, hace 1 mes, hoy, en 1 mes
+    vencimiento_servicio = date(2020, 1, 15)
+    with app.app_context():
+        cuotas = Cuota.query.filter_by(contrato_id=contrato_id).order_by(Cuota.numero_cuota).all()
+        cuotas[0].estado = 'pagada'
+        db.session.add(Cuota(contrato_id=contrato_id, numero_cuota=1, tipo='servicio', observaciones="Agua",
+                             valor_cuota=Decimal("25000"), fecha_vencimiento=vencimiento_servicio))
+        saldos.actualizar([contrato_id])
+        db.session.commit()
+        assert _resumen_servicios(vencimiento_servicio) == [("Agua", "pendiente", 1, Decimal("25000"))]
+
+        assert mora.marcar_vencidas(tam_bloque=1) >= 2
+        db.session.expire_all()
+        estados = dict(db.session.execute(select(Cuota.numero_cuota, Cuota.estado)
+                                          .where(Cuota.contrato_id == contrato_id, Cuota.tipo == 'cuota')).all())
+        assert estados == {1: 'pagada', 2: 'vencida', 3: 'pendiente', 4: 'pendiente'}
+        assert Cuota.query.filter_by(contrato_id=contrato_id, tipo='servicio').one().estado == 'vencida'
+
+        # Resumen de servicios movido a 'vencida' igual que si se recalculara, y saldos al día
+        assert _resumen_servicios(vencimiento_servicio) == [("Agua", "vencida", 1, Decimal("25000"))]
+        resumenes.reconstruir("servicios", vencimiento_servicio, vencimiento_servicio)
+        assert _resumen_servicios(vencimiento_servicio) == [("Agua", "vencida", 1, Decimal("25000"))]
+        assert db.session.get(Contrato, contrato_id).cuotas_vencidas == 2
+        assert [d for d in saldos.verificar() if d[0] == contrato_id] == []
+
+        # Lo ya marcado no vuelve a cumplir el filtro
+        assert mora.marcar_vencidas() == 0
@@ -0,0 +1,76 @@
+import random
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import resumenes
+from extensions import db
+from models import Caja, CategoriaGasto, Gasto, MovimientoCaja, Proveedor, ResumenDiarioCaja, ResumenDiarioGasto
+
+DESDE, HASTA = date(2031, 3, 1), date(2031, 3, 31)
+
+
+@pytest.fixture
+def datos(app):
+    sufijo = random.randrange(10**9)
+    with app.app_context():
+        proveedor = Proveedor(razon_social="Proveedor prueba", ruc=f"R{sufijo}")
+        categorias = [CategoriaGasto(nombre=f"Categoría {i} {sufijo}") for i in range(2)]
+        caja = Caja(descripcion=f"Caja resúmenes {sufijo}", saldo_actual=0, abierta=True)
+        db.session.add_all([proveedor, caja, *categorias])
+        db.session.commit()
+        ids = proveedor.id, [c.id for c in categorias], caja.id
+    yield ids
+
+
+def _resumen(modelo, dimensiones):
+    filas = modelo.query.filter(modelo.fecha >= DESDE, modelo.fecha <= HASTA).all()
+    return sorted((*(getattr(f, d) for d in dimensiones), f.cantidad, Decimal(f.monto)) for f in filas)
+
+
+def _igual_a_reconstruido(tabla):
+    modelo, dimensiones, _, _ = resumenes.TABLAS[tabla]
+    incremental = _resumen(modelo, dimensiones)
+    resumenes.reconstruir(tabla, DESDE, HASTA)
+    assert incremental == _resumen(modelo, dimensiones)
+    return incremental
+
+
+def test_gastos_se_resumen_por_deltas(app, datos):
+    proveedor_id, (luz, agua), _ = datos
+    with app.app_context():
+        gastos = [Gasto(proveedor_id=proveedor_id, categoria_gasto_id=luz if i % 2 else agua,
+                        fecha_factura=date(2031, 3, 1 + i % 3), monto=Decimal(1000 * (i + 1))) for i in range(6)]
+        db.session.add_all(gastos)
+        db.session.commit()
+        assert len(_igual_a_reconstruido("gastos")) == 6
+
+        gastos[0].monto = Decimal("99.50")                  # cambia el monto
+        gastos[1].estado = "anulado"                        # cambia de fila (dimensión)
+        gastos[2].fecha_factura = date(2031, 3, 20)         # cambia de día
+        db.session.delete(gastos[3])
+        db.session.flush()                                  # varios flush en la misma transacción
+        gastos[4].categoria_gasto_id = luz if gastos[4].categoria_gasto_id == agua else agua
+        db.session.commit()
+        _igual_a_reconstruido("gastos")
+
+        for g in gastos[:3] + gastos[4:]: db.session.delete(g)
+        db.session.commit()
+        assert _igual_a_reconstruido("gastos") == []
+
+
+def test_rollback_descarta_las_deltas(app, datos):
+    proveedor_id, (luz, _), caja_id = datos
+    with app.app_context():
+        db.session.add(Gasto(proveedor_id=proveedor_id, categoria_gasto_id=luz, fecha_factura=date(2031, 3, 5), monto=500))
+        db.session.add(MovimientoCaja(caja_id=caja_id, tipo_movimiento="ingreso", monto=700, concepto="Prueba",
+                                      fecha_hora=datetime(2031, 3, 5, 10, 30)))
+        db.session.flush()
+        db.session.rollback()
+        db.session.add(MovimientoCaja(caja_id=caja_id, tipo_movimiento="egreso", monto=300, concepto="Prueba",
+                                      fecha_hora=datetime(2031, 3, 5, 23, 59)))
+        db.session.commit()
+        assert _resumen(ResumenDiarioGasto, ["categoria_gasto_id"]) == []
+        assert _resumen(ResumenDiarioCaja, ["caja_id", "tipo_movimiento"]) == [(caja_id, "egreso", 1, Decimal(300))]
+        assert _igual_a_reconstruido("caja") == [(date(2031, 3, 5), caja_id, "egreso", 1, Decimal(300))]
@@ -0,0 +1,44 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import update
+
+import saldos
+from extensions import db
+from models import Contrato, Cuota, Pago
+
+
+def _diferencias(contrato_id):
+    return [d for d in saldos.verificar() if d[0] == contrato_id]
+
+
+def test_cuotas_vencidas_por_fecha_sin_barrido(app, crear_contrato):
+    # Dos cuotas vencidas que nadie marcó 'vencida' (el barrido no corrió)
+    contrato_id = crear_contrato(cuotas=6)
+    with app.app_context():
+        c = db.session.get(Contrato, contrato_id)
+        assert c.cuotas_vencidas == 2
+        assert c.saldo == Decimal("600000") and c.total_pagado == 0
+        assert c.proxima_cuota < date.today()
+        assert _diferencias(contrato_id) == []
+
+
+def test_verificar_detecta_saldos_desactualizados(app, crear_contrato):
+    contrato_id = crear_contrato(cuotas=3)
+    with app.app_context():
+        primera = Cuota.query.filter_by(contrato_id=contrato_id, numero_cuota=1).one()
+        # Pago registrado sin pasar por saldos.actualizar()
+        primera.estado = 'pagada'
+        db.session.add(Pago(contrato_id=contrato_id, cuota_id=primera.id, fecha_pago=datetime.now(), monto=primera.valor_cuota))
+        db.session.execute(update(Contrato).where(Contrato.id == contrato_id).values(cuotas_vencidas=7))
+        db.session.commit()
+
+        diferencias = {campo: (guardado, calculado) for _, campo, guardado, calculado in _diferencias(contrato_id)}
+        assert set(diferencias) == {"total_pagado", "saldo", "cuotas_vencidas", "proxima_cuota"}
+        assert diferencias["cuotas_vencidas"] == (7, 1)
+        assert float(diferencias["saldo"][1]) == 200000
+
+        saldos.reconstruir([contrato_id])
+        assert _diferencias(contrato_id) == []
+        c = db.session.get(Contrato, contrato_id)
+        assert (c.total_pagado, c.saldo, c.cuotas_vencidas) == (Decimal("100000"), Decimal("200000"), 1)
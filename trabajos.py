@@ -0,0 +1,112 @@
+import glob
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from utils import directorio_instancia, escribir_atomico
+
+# --- TRABAJOS EN SEGUNDO PLANO ---
+# Reportes pesados (PDF, exportaciones) que no deben ocupar un worker web. Al
+# enviarlos se devuelve un ID; corren en un pool de hilos con su propio contexto
+# de aplicación y dejan en disco el estado (trabajo_<id>.json) y el resultado
+# (trabajo_<id>.<ext>). El estado se lee siempre del disco, así que cualquier
+# worker puede responder la consulta de progreso. Los archivos vencen a las
+# TTL_TRABAJOS horas.
+TTL_TRABAJOS = 24
+MAX_HILOS = 2 # Pocos a propósito: los reportes no deben competir con cobros y ventas
+
+_tipos = {}
+_pool = None
+_lock = threading.Lock()
+
+def registrar(tipo, extension, mimetype):
+    """Decorador: registra `funcion(progreso, **parametros) -> (bytes, nombre_descarga)` como tipo de trabajo."""
+    def decorador(funcion):
+        _tipos[tipo] = {"funcion": funcion, "extension": extension, "mimetype": mimetype}
+        return funcion
+    return decorador
+
+def tipos():
+    return sorted(_tipos)
+
+def directorio():
+    return directorio_instancia("trabajos", "TRABAJOS_DIR")
+
+def enviar(tipo, parametros=None, usuario_id=None):
+    """Encola un trabajo y devuelve su ID. Lanza KeyError si el tipo no existe."""
+    definicion = _tipos[tipo]
+    limpiar_vencidos()
+    trabajo_id = uuid.uuid4().hex
+    estado = {
+        "id": trabajo_id, "tipo": tipo, "parametros": parametros or {}, "usuario_id": usuario_id,
+        "estado": "pendiente", "progreso": 0, "mensaje": None, "nombre": None,
+        "mimetype": definicion["mimetype"], "creado": datetime.now().isoformat(timespec="seconds"), "terminado": None,
+    }
+    carpeta = directorio()
+    _guardar_estado(carpeta, estado)
+    _obtener_pool().submit(_ejecutar, current_app._get_current_object(), carpeta, estado)
+    return trabajo_id
+
+def consultar(trabajo_id):
+    """Estado del trabajo (dict) o None si no existe o ya venció."""
+    if not trabajo_id.isalnum(): return None
+    try:
+        with open(os.path.join(directorio(), f"trabajo_{trabajo_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def ruta_resultado(estado):
+    return os.path.join(directorio(), f"trabajo_{estado['id']}.{_tipos[estado['tipo']]['extension']}")
+
+def limpiar_vencidos():
+    limite = time.time() - TTL_TRABAJOS * 3600
+    for ruta in glob.glob(os.path.join(directorio(), "trabajo_*")):
+        try:
+            if os.path.getmtime(ruta) < limite: os.remove(ruta)
+        except OSError:
+            pass
+
+def _ejecutar(app, carpeta, estado):
+    definicion = _tipos[estado["tipo"]]
+    ultimo = [0.0]
+
+    def progreso(porcentaje, mensaje=None):
+        # Como mucho una escritura del estado por segundo
+        if time.monotonic() - ultimo[0] < 1 and porcentaje < 100: return
+        ultimo[0] = time.monotonic()
+        estado.update(progreso=int(porcentaje), mensaje=mensaje)
+        _guardar_estado(carpeta, estado)
+
+    with app.app_context():
+        from extensions import db
+        try:
+            estado.update(estado="ejecutando")
+            _guardar_estado(carpeta, estado)
+            contenido, nombre = definicion["funcion"](progreso, **estado["parametros"])
+            escribir_atomico(os.path.join(carpeta, f"trabajo_{estado['id']}.{definicion['extension']}"), contenido)
+            estado.update(estado="terminado", progreso=100, mensaje=None, nombre=nombre)
+        except Exception as e:
+            traceback.print_exc()
+            estado.update(estado="error", mensaje=str(e))
+        finally:
+            db.session.remove()
+        estado["terminado"] = datetime.now().isoformat(timespec="seconds")
+        _guardar_estado(carpeta, estado)
+
+def _guardar_estado(carpeta, estado):
+    escribir_atomico(os.path.join(carpeta, f"trabajo_{estado['id']}.json"), json.dumps(estado))
+
+def _obtener_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="trabajos")
+        return _pool
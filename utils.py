@@ -1,18 +1,86 @@
-from flask import jsonify, request
+from flask import jsonify, request, has_request_context
 from flask_login import current_user
 from functools import wraps
 from extensions import db
 from datetime import datetime
+from sqlalchemy import insert, event
+from sqlalchemy.orm import Session
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import atexit
+import glob
+import os
+import threading
+import time
+
+# Caché de parámetros (por proceso). Se vacía al editar parámetros; el TTL cubre
+# los cambios hechos desde otro proceso o worker.
+TTL_PARAMETROS = 60
+_cache_parametros = {}
 
 def get_param(clave, default=""):
     """Obtiene un parámetro del sistema por su clave."""
     from models import ParametroSistema
+    cacheado = _cache_parametros.get(clave)
+    if cacheado and cacheado[1] > time.monotonic():
+        return cacheado[0] if cacheado[0] is not None else default
     try:
         p = ParametroSistema.query.filter_by(clave=clave).first()
-        return p.valor if p else default
+        valor = p.valor if p else None
+        _cache_parametros[clave] = (valor, time.monotonic() + TTL_PARAMETROS)
+        return valor if valor is not None else default
     except:
         return default
 
+def invalidar_parametros():
+    _cache_parametros.clear()
+
+# --- ARCHIVOS EN DISCO Y POOL DE PROCESOS ---
+# Recibos, liquidaciones, miniaturas y trabajos guardan archivos en una carpeta
+# de instance/ y renderizan en paralelo con el mismo pool de procesos.
+MAX_PROCESOS = min(os.cpu_count() or 1, 4)
+_pool_procesos = None
+_lock_pool = threading.Lock()
+
+def directorio_instancia(nombre, clave_config):
+    """Carpeta configurada en `clave_config` o instance/<nombre>; se crea si no existe."""
+    from flask import current_app
+    ruta = current_app.config.get(clave_config) or os.path.join(current_app.instance_path, nombre)
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+def escribir_atomico(ruta, contenido):
+    """Escribe en un temporal y lo renombra: otros procesos o hilos nunca leen el archivo a medias."""
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if isinstance(contenido, str):
+        with open(temporal, "w", encoding="utf-8") as f: f.write(contenido)
+    else:
+        with open(temporal, "wb") as f: f.write(contenido)
+    os.replace(temporal, ruta)
+
+def borrar_versiones(patron, vigente):
+    """Borra los archivos que coinciden con `patron` salvo `vigente` (versiones anteriores de un archivo cacheado)."""
+    for viejo in glob.glob(patron):
+        if viejo != vigente:
+            try: os.remove(viejo)
+            except OSError: pass
+
+def mapear_en_procesos(funcion, elementos, min_paralelo, chunksize=1):
+    """map(funcion, elementos) en el pool de procesos si hay al menos `min_paralelo` elementos; si no, en el proceso actual.
+
+    El pool usa 'spawn' (los procesos no heredan conexiones a la BD ni el estado
+    de Flask): `funcion` debe estar definida a nivel de módulo y trabajar solo con
+    los datos planos que recibe.
+    """
+    elementos = list(elementos)
+    if len(elementos) < min_paralelo:
+        return list(map(funcion, elementos))
+    global _pool_procesos
+    with _lock_pool:
+        if _pool_procesos is None:
+            _pool_procesos = ProcessPoolExecutor(max_workers=MAX_PROCESOS, mp_context=get_context("spawn"))
+    return list(_pool_procesos.map(funcion, elementos, chunksize=chunksize))
+
 def clean(text):
     """Elimina caracteres no compatibles con Latin-1 para evitar errores en FPDF"""
     if not text: return ""
@@ -42,26 +110,98 @@ def admin_required(fn):
     return role_required('Admin')(fn)
 
 # --- FUNCIÓN DE AUDITORÍA ---
-def registrar_auditoria(accion, tabla, detalle):
-    """Registra un evento en la tabla de auditoría."""
+def registrar_auditoria(accion, tabla, detalle, diferido=False):
+    """Registra un evento en la tabla de auditoría.
+
+    Dentro de una petición el registro se agrega a la sesión y se guarda con el
+    próximo commit, junto con el cambio que audita (llamar antes del commit; si la
+    operación hace rollback, el registro también se descarta). Sin petición
+    (comandos CLI) o con `diferido=True` (login/logout, que no tienen transacción
+    propia) va al buffer de escritura por lotes.
+    """
     from models import AuditLog
-    try:
+    # Fuera de una petición (comandos CLI) no hay usuario ni IP
+    user_id = None
+    ip = '127.0.0.1'
+    if has_request_context():
         user_id = current_user.id if current_user.is_authenticated else None
         ip = request.remote_addr or '127.0.0.1'
-        
-        log = AuditLog(
-            usuario_id=user_id,
-            accion=accion,
-            tabla=tabla,
-            detalle=detalle,
-            ip_address=ip,
-            fecha=datetime.now()
-        )
-        
-        db.session.add(log)
-        db.session.commit() 
-        
-    except Exception as e:
-        # Imprimimos el error en la consola para depurar si falla
-        print(f"Error CRÍTICO al guardar auditoría: {e}")
-        db.session.rollback()
\ No newline at end of file
+    fila = dict(usuario_id=user_id, accion=accion, tabla=tabla, detalle=detalle, ip_address=ip, fecha=datetime.now())
+
+    if has_request_context() and not diferido:
+        db.session.add(AuditLog(**fila))
+    else:
+        buffer_auditoria.agregar(fila)
+
+def rescatar_auditoria_pendiente(exc=None, estado=None):
+    """Fin de la petición: los registros agregados después del último commit pasan al buffer.
+
+    Solo si la operación terminó bien: sin excepción, con una respuesta de estado
+    menor a 400 y sin rollback de la sesión. Un handler que captura el error y
+    devuelve 500 sin hacer rollback también llega aquí sin excepción; en ese caso
+    y en los demás los registros se descartan.
+    """
+    from models import AuditLog
+    try:
+        deshecha = db.session.info.pop("auditoria_deshecha", False)
+        exitosa = exc is None and estado is not None and estado < 400 and db.session.is_active and not deshecha
+        pendientes = [obj for obj in db.session.new if isinstance(obj, AuditLog)]
+    except Exception:
+        return
+    for obj in pendientes:
+        db.session.expunge(obj)
+        if exitosa:
+            buffer_auditoria.agregar(dict(usuario_id=obj.usuario_id, accion=obj.accion, tabla=obj.tabla,
+                                          detalle=obj.detalle, ip_address=obj.ip_address, fecha=obj.fecha))
+
+@event.listens_for(Session, "after_soft_rollback")
+def _al_deshacer(sesion, transaccion_previa):
+    sesion.info["auditoria_deshecha"] = True
+
+class BufferAuditoria:
+    """Acumula registros de auditoría y los inserta por lotes con una conexión propia.
+
+    Se vacía al llegar a `tam_lote` registros, `intervalo` segundos después del
+    primero pendiente, o al terminar el proceso. No usa la sesión de la petición:
+    nunca confirma cambios de negocio que estén pendientes.
+    """
+    def __init__(self, tam_lote=100, intervalo=5.0):
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._filas = []
+        self._app = None
+        self._timer = None
+
+    def agregar(self, fila):
+        from flask import current_app
+        with self._lock:
+            self._app = current_app._get_current_object()
+            self._filas.append(fila)
+            lleno = len(self._filas) >= self.tam_lote
+            if not lleno and self._timer is None:
+                self._timer = threading.Timer(self.intervalo, self.vaciar)
+                self._timer.daemon = True
+                self._timer.start()
+        if lleno:
+            self.vaciar()
+
+    def vaciar(self):
+        from models import AuditLog
+        with self._lock:
+            filas, self._filas = self._filas, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            app = self._app
+        if not filas or app is None:
+            return
+        try:
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(insert(AuditLog.__table__), filas)
+        except Exception as e:
+            print(f"Error CRÍTICO al guardar auditoría: {e} ({len(filas)} registros)")
+
+buffer_auditoria = BufferAuditoria()
+atexit.register(buffer_auditoria.vaciar)